@@ -0,0 +1,208 @@
+"""Regression check of the allocations of the package movement.
+
+The autopilot plays a game of every difficulty on the fixed-step clock and
+:mod:`tracemalloc` measures the bytes every call of
+:meth:`game.domain.game.Game.move_packages` leaves allocated when no package
+spawns, is picked up, starts falling or disappears. Those moves only rewrite
+the coordinates and stages of the packages in place, so each of them must
+leave exactly zero bytes allocated. The only moves left out are those
+changing which coordinates hold an int of their own: CPython shares the ints
+from -5 to 256, so a coordinate moving past 256 allocates an int and one
+moving back under it frees one, and the first move of a package leaves the
+int it shared with the start of its belt. The check fails, with exit status
+1, when any measured move allocates or frees bytes.
+
+Usage::
+
+    python -m game.allocations
+    python -m game.allocations --difficulty 3 --ticks 6000
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from typing import NamedTuple
+
+from game.domain.difficulty import Difficulty
+from game.domain.game import Game
+from game.headless import HeadlessGame
+
+# Ints CPython creates once and shares
+_SMALL_INTS = range(-5, 257)
+
+
+class MoveAllocations(NamedTuple):
+    """Allocations of the steady moves of a game.
+
+    Attributes:
+        difficulty (int): Difficulty of the game.
+        moves (int): Moves measured.
+        boxing (int): Steady moves left out for boxing or unboxing an int.
+        allocating (int): Measured moves that allocated or freed bytes.
+        net_bytes (int): Bytes left allocated by the moves, freed ones deducted.
+    """
+
+    difficulty: int
+    moves: int
+    boxing: int
+    allocating: int
+    net_bytes: int
+
+
+def _package_layout(game: Game) -> tuple:
+    """Returns where the packages of a game are, to spot the moves changing it.
+
+    :param game: Game, the game.
+    :return: tuple, the packages at play, the lives and the number of packages
+        on and falling from every conveyor.
+    """
+    return (
+        game.packages_at_play,
+        game.live_amount,
+        tuple(len(conveyor.packages) for conveyor in game.conveyors),
+        tuple(len(conveyor.falling_packages) for conveyor in game.conveyors),
+    )
+
+
+def _owned_coordinates(game: Game) -> tuple:
+    """Returns which package coordinates hold an int of their own.
+
+    A coordinate between -5 and 256 is a small int shared by CPython and the x
+    of a package at the start of its belt is the int of the start, so moving
+    either allocates an int without freeing one.
+
+    :param game: Game, the game.
+    :return: tuple, a pair of bools (x, y) for every package on a conveyor.
+    """
+    return tuple(
+        (
+            package.x not in _SMALL_INTS and package.x != conveyor.start_position[0],
+            package.y not in _SMALL_INTS,
+        )
+        for conveyor in game.conveyors
+        for package in (*conveyor.packages, *conveyor.falling_packages)
+    )
+
+
+def _nothing() -> None:
+    """Does nothing, to measure the cost of a measurement."""
+
+
+def _traced_bytes(function) -> int:
+    """Measures the bytes a call leaves allocated.
+
+    :param function: callable without arguments.
+    :return: int, traced bytes after the call minus those before it.
+    """
+    before = tracemalloc.get_traced_memory()[0]
+    function()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def measure_moves(
+    selected_difficulty: Difficulty,
+    warmup_ticks: int = 600,
+    ticks: int = 3000,
+    seed: int = 0,
+) -> MoveAllocations:
+    """Plays an autopilot game and measures the allocations of its steady moves.
+
+    The moves of the warm-up fill the caches of the game (step tables,
+    loading slots, list capacities) and are not measured. Automatic
+    collections are off while measuring.
+
+    :param selected_difficulty: Difficulty, difficulty of the game.
+    :param warmup_ticks: int, ticks played before measuring.
+    :param ticks: int, ticks measured, fewer if the game is lost before.
+    :param seed: int, seed of the game.
+    :return: MoveAllocations, the measured allocations.
+    """
+    headless = HeadlessGame(
+        selected_difficulty, seed=seed, autopilot=["mario", "luigi"]
+    )
+    game = headless.game
+    move_packages = game.move_packages
+    nets: list[int] = []
+    boxing = 0
+    overhead = 0
+    measuring = False
+
+    def measured_move() -> None:
+        nonlocal boxing
+        if not measuring:
+            move_packages()
+            return
+        layout = _package_layout(game)
+        owned = _owned_coordinates(game)
+        net = _traced_bytes(move_packages) - overhead
+        if _package_layout(game) != layout:
+            return
+        if _owned_coordinates(game) != owned:
+            boxing += 1
+        else:
+            nets.append(net)
+
+    # The session calls the game's method, so the measurement wraps it there
+    game.move_packages = measured_move  # type: ignore[method-assign]
+    was_enabled = gc.isenabled()
+    # Traced from the warm-up on, as freeing an int allocated before the
+    # tracing would count as keeping it
+    tracemalloc.start()
+    try:
+        while headless.ticks < warmup_ticks and headless.step():
+            pass
+        # Room for every measurement, so recording them allocates nothing
+        nets = [0] * ticks
+        nets.clear()
+        gc.disable()
+        # The int holding the bytes before the call is counted by every
+        # measurement
+        overhead = min(_traced_bytes(_nothing) for _ in range(10))
+        measuring = True
+        end = headless.ticks + ticks
+        while headless.ticks < end and headless.step():
+            pass
+    finally:
+        tracemalloc.stop()
+        if was_enabled:
+            gc.enable()
+    return MoveAllocations(
+        selected_difficulty.difficulty,
+        len(nets),
+        boxing,
+        sum(1 for net in nets if net != 0),
+        sum(nets),
+    )
+
+
+def main(argv: list[str]) -> None:
+    """Runs the check from the command line and exits with its outcome.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.allocations")
+    parser.add_argument("--difficulty", type=int, default=None, choices=range(4))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup-ticks", type=int, default=600)
+    parser.add_argument("--ticks", type=int, default=3000)
+    options = parser.parse_args(argv)
+
+    difficulties = range(4) if options.difficulty is None else [options.difficulty]
+    failed = False
+    for difficulty in difficulties:
+        result = measure_moves(
+            Difficulty(difficulty), options.warmup_ticks, options.ticks, options.seed
+        )
+        passed = 0 < result.moves and result.allocating == 0
+        failed = failed or not passed
+        print(
+            f"difficulty {result.difficulty}: {result.moves} moves "
+            f"({result.boxing} boxing left out), {result.allocating} allocating, "
+            f"net {result.net_bytes:+d} bytes {'ok' if passed else 'FAIL'}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,313 @@
+"""Batch simulation of seeded headless games for difficulty balancing.
+
+Games are played by a scripted player with a random reaction time and
+occasional mistakes, so every seed gives a different game. They run in a
+pool of worker processes; each finished game streams back a small result
+tuple through the pool pipes and the results are aggregated into
+distributions.
+
+Usage::
+
+    python -m game.batch --difficulty 1 --games 2000 --set increase=40
+"""
+
+import argparse
+import multiprocessing
+import random
+import statistics
+import sys
+from collections.abc import Iterator
+from time import perf_counter
+
+from game.domain.conveyor import MIN_VELOCITY
+from game.domain.difficulty import Difficulty
+from game.headless import HeadlessGame
+from game.presentation.controllers import Autopilot, MoveUpPlayer
+
+METRICS = ("points", "seconds_alive", "lives_lost", "deliveries")
+TUNABLE_VALUES = ("increase", "eliminates", "conveyor_speed")
+
+
+class TunedDifficulty(Difficulty):
+    """Difficulty whose gameplay constants can be overridden.
+
+    Attributes:
+        difficulty (int): Base difficulty level (0 to 3 inclusive).
+        overrides (dict): Values replacing those of the base difficulty.
+    """
+
+    def __init__(self, difficulty: int, overrides: dict | None = None) -> None:
+        """Initializes the difficulty.
+
+        :param difficulty: int, the base difficulty level.
+        :param overrides: dict | None, values of :meth:`difficulty_values` to replace.
+        :raises ValueError: if an override is not a tunable value.
+        """
+        super().__init__(difficulty)
+        overrides = overrides if overrides is not None else {}
+        for name in overrides:
+            if name not in TUNABLE_VALUES:
+                raise ValueError(f"{name} cannot be tuned")
+        self.overrides = overrides
+
+    def difficulty_values(self) -> dict:
+        """Returns the values of the base difficulty with the overrides applied.
+
+        :return: dict, mapping configuration names to their values.
+        """
+        values = super().difficulty_values()
+        values.update(self.overrides)
+        return values
+
+
+class ScriptedPlayer:
+    """Imperfect scripted policy for both players of a headless game.
+
+    Each player heads to the floor planned by an :class:`Autopilot`. After
+    every move it waits a random reaction time, and it sometimes heads to a
+    random floor instead.
+
+    Attributes:
+        headless (HeadlessGame): The game to play.
+        reaction_ticks (tuple[int, int]): Bounds of the reaction time in ticks.
+        mistake_rate (float): Probability of heading to a random floor.
+    """
+
+    def __init__(
+        self,
+        headless: HeadlessGame,
+        seed: int,
+        reaction_ticks: tuple[int, int] = (4, 16),
+        mistake_rate: float = 0.05,
+    ) -> None:
+        """Initializes the policy.
+
+        :param headless: HeadlessGame, the game to play.
+        :param seed: int, seed of the random decisions of the policy.
+        :param reaction_ticks: tuple[int, int], bounds of the reaction time in ticks.
+        :param mistake_rate: float, probability of heading to a random floor.
+        """
+        self.headless = headless
+        self.reaction_ticks = reaction_ticks
+        self.mistake_rate = mistake_rate
+        self._random = random.Random(seed)
+        game = headless.game
+        self._floors = [game.players_positions[player] for player in game.players]
+        # Bit of the controller moving each player up and down
+        self._bits = [
+            {
+                isinstance(controller, MoveUpPlayer): 1 << index
+                for index, controller in enumerate(headless.controllers)
+                if controller.player is player
+            }
+            for player in game.players
+        ]
+        # Plans the moves, the reaction time and the mistakes are added here
+        self._autopilots = [Autopilot(game, player) for player in game.players]
+        self._targets: list[int | None] = [None] * len(game.players)
+        self._next_decision = [0] * len(game.players)
+
+    def next_mask(self) -> int:
+        """Decides the controllers to press on the next tick.
+
+        :return: int, bit mask over the controllers of the game.
+        """
+        tick = self.headless.ticks
+        mask = 0
+        for index, player in enumerate(self.headless.game.players):
+            floors = self._floors[index]
+            if tick >= self._next_decision[index]:
+                self._next_decision[index] = tick + self._random.randint(
+                    *self.reaction_ticks
+                )
+                if self._random.random() < self.mistake_rate:
+                    self._targets[index] = self._random.randrange(len(floors))
+                else:
+                    self._targets[index] = self._autopilots[index].target_floor()
+            target = self._targets[index]
+            if target is None:
+                continue
+            current = next(
+                position
+                for position, floor in enumerate(floors)
+                if floor.player is player
+            )
+            if target != current:
+                mask |= self._bits[index][target > current]
+        return mask
+
+
+def play_game(job: tuple[int, int, dict, float]) -> tuple[int, int, int, int]:
+    """Plays one seeded game until it is lost or the time limit is reached.
+
+    :param job: tuple of the difficulty level, the seed, the difficulty
+        overrides and the limit of game time in seconds.
+    :return: tuple[int, int, int, int], the points, seconds alive, lives lost
+        and deliveries of the game.
+    """
+    difficulty, seed, overrides, max_seconds = job
+    headless = HeadlessGame(TunedDifficulty(difficulty, overrides), seed=seed)
+    player = ScriptedPlayer(headless, seed)
+    game = headless.game
+    session = headless.session
+    max_ticks = int(max_seconds * 60)
+    lives_lost = 0
+    deliveries = 0
+    was_taking_a_break = False
+    while headless.ticks < max_ticks:
+        lives = game.live_amount
+        if not headless.step(player.next_mask()):
+            break
+        if game.live_amount < lives:
+            lives_lost += lives - game.live_amount
+        if session.is_taking_a_break and not was_taking_a_break:
+            deliveries += 1
+        was_taking_a_break = session.is_taking_a_break
+    seconds_alive = (
+        session.seconds_alive if session.has_lost else int(headless.clock.now())
+    )
+    return game.points, seconds_alive, lives_lost, deliveries
+
+
+def run_batch(
+    difficulty: int,
+    games: int,
+    overrides: dict | None = None,
+    workers: int | None = None,
+    first_seed: int = 0,
+    max_seconds: float = 900.0,
+) -> Iterator[tuple[int, int, int, int]]:
+    """Plays seeded games in a process pool, yielding results as they finish.
+
+    :param difficulty: int, the base difficulty level.
+    :param games: int, number of games, seeded ``first_seed`` onwards.
+    :param overrides: dict | None, difficulty values to replace.
+    :param workers: int | None, number of processes, one per core if None.
+    :param first_seed: int, seed of the first game.
+    :param max_seconds: float, limit of game time per game in seconds.
+    :return: Iterator of ``(points, seconds_alive, lives_lost, deliveries)``.
+    """
+    overrides = overrides if overrides is not None else {}
+    # Validates the overrides before starting the pool
+    TunedDifficulty(difficulty, overrides)
+    jobs = (
+        (difficulty, seed, overrides, max_seconds)
+        for seed in range(first_seed, first_seed + games)
+    )
+    with multiprocessing.Pool(workers) as pool:
+        # Small chunks keep every worker busy until the end of the batch
+        chunksize = max(1, games // ((workers or multiprocessing.cpu_count()) * 8))
+        yield from pool.imap_unordered(play_game, jobs, chunksize=chunksize)
+
+
+def distribution(values: list[int]) -> dict[str, float]:
+    """Summarizes a list of results.
+
+    Percentiles are interpolated between the results, never past them.
+
+    :param values: list[int], the results of one metric, at least one.
+    :return: dict mapping mean, stdev, min, p10, p50, p90 and max to their values.
+    """
+    ordered = sorted(values)
+    deciles = (
+        statistics.quantiles(ordered, n=10, method="inclusive")
+        if len(ordered) > 1
+        else ordered * 9
+    )
+    return {
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.pstdev(ordered),
+        "min": ordered[0],
+        "p10": deciles[0],
+        "p50": statistics.median(ordered),
+        "p90": deciles[8],
+        "max": ordered[-1],
+    }
+
+
+def parse_override(text: str) -> tuple[str, object]:
+    """Parses a ``name=value`` override of the command line.
+
+    :param text: str, e.g. ``increase=40`` or ``conveyor_speed=0.75,1,1.5``.
+    :return: tuple of the value name and its value.
+    :raises argparse.ArgumentTypeError: if the text is not a valid override.
+    """
+    name, separator, value = text.partition("=")
+    if not separator or name not in TUNABLE_VALUES:
+        raise argparse.ArgumentTypeError(
+            f"expected one of {', '.join(TUNABLE_VALUES)} followed by =VALUE"
+        )
+    if name == "conveyor_speed":
+        speeds = tuple(float(speed) for speed in value.split(","))
+        if len(speeds) != 3:
+            raise argparse.ArgumentTypeError("conveyor_speed needs three speeds")
+        if min(speeds) < MIN_VELOCITY:
+            raise argparse.ArgumentTypeError(
+                f"conveyor speeds must be at least {MIN_VELOCITY}"
+            )
+        return name, speeds
+    number = int(value)
+    if name == "increase" and number < 1:
+        raise argparse.ArgumentTypeError("increase must be at least 1")
+    if name == "eliminates" and number < 0:
+        raise argparse.ArgumentTypeError("eliminates must be at least 0")
+    return name, number
+
+
+def _parse_games(text: str) -> int:
+    """Parses the number of games of the command line.
+
+    :param text: str, e.g. ``2000``.
+    :return: int, the number of games.
+    :raises argparse.ArgumentTypeError: if the text is not a positive integer.
+    """
+    try:
+        games = int(text)
+    except ValueError:
+        games = 0
+    if games < 1:
+        raise argparse.ArgumentTypeError("expected at least one game")
+    return games
+
+
+def main(argv: list[str]) -> None:
+    """Runs a batch from the command line and prints the distributions.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.batch")
+    parser.add_argument("--difficulty", type=int, default=0, choices=range(4))
+    parser.add_argument("--games", type=_parse_games, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=900.0)
+    parser.add_argument(
+        "--set", type=parse_override, action="append", default=[], metavar="NAME=VALUE"
+    )
+    options = parser.parse_args(argv)
+
+    results: dict[str, list[int]] = {metric: [] for metric in METRICS}
+    started_at = perf_counter()
+    for result in run_batch(
+        options.difficulty,
+        options.games,
+        dict(options.set),
+        options.workers,
+        options.seed,
+        options.max_seconds,
+    ):
+        for metric, value in zip(METRICS, result):
+            results[metric].append(value)
+    elapsed = perf_counter() - started_at
+
+    print(
+        f"{options.games} games in {elapsed:.1f} s ({options.games / elapsed:.1f} games/s)"
+    )
+    print(f"{'':14}" + "".join(f"{name:>9}" for name in distribution([0])))
+    for metric in METRICS:
+        summary = distribution(results[metric])
+        print(f"{metric:14}" + "".join(f"{value:9.1f}" for value in summary.values()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
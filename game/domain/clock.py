@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from time import perf_counter
+
+
+class Clock(ABC):
+    """Source of the game time used by every time-based rule.
+
+    The gameplay loop calls :meth:`advance` once per tick and reads the
+    current time with :meth:`now`.
+    """
+
+    @abstractmethod
+    def now(self) -> float:
+        """Returns the current game time.
+
+        :return: float, time in seconds.
+        """
+        raise NotImplementedError
+
+    def advance(self) -> None:
+        """Moves the clock forward by one tick (no-op by default)."""
+
+
+class WallClock(Clock):
+    """Clock that follows the real time through :func:`time.perf_counter`."""
+
+    def now(self) -> float:
+        """Returns the current wall time.
+
+        :return: float, value of :func:`time.perf_counter` in seconds.
+        """
+        return perf_counter()
+
+
+class FixedStepClock(Clock):
+    """Deterministic clock that advances by a fixed step on every tick.
+
+    The time is computed from the integer tick count, so it does not
+    accumulate rounding errors and is identical on every machine.
+
+    Attributes:
+        step (float): Seconds added on every tick. Must be > 0.
+        ticks (int): Number of ticks elapsed. Must be >= 0.
+    """
+
+    def __init__(self, step: float = 1 / 60, ticks: int = 0) -> None:
+        """Initializes the clock.
+
+        :param step: float, seconds per tick. Must be > 0.
+        :param ticks: int, initial number of elapsed ticks. Must be >= 0.
+        :raises TypeError: if step is not a number or ticks is not an int.
+        :raises ValueError: if step is not positive or ticks is negative.
+        """
+        if not isinstance(step, (int, float)):
+            raise TypeError("step must be a number (int or float)")
+        if step <= 0:
+            raise ValueError("step must be strictly greater than 0")
+        if not isinstance(ticks, int):
+            raise TypeError("ticks must be an int")
+        if ticks < 0:
+            raise ValueError("ticks cannot be negative")
+        self.step = float(step)
+        self.ticks = ticks
+
+    def now(self) -> float:
+        """Returns the time of the current tick.
+
+        :return: float, ``ticks * step`` in seconds.
+        """
+        return self.ticks * self.step
+
+    def advance(self) -> None:
+        """Moves the clock forward by one step."""
+        self.ticks += 1
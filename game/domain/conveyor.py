@@ -1,8 +1,13 @@
 from enum import Enum
 
 from game.domain.elements import Element
+from game.domain.fixed_point import step_table, to_fixed
 from game.domain.floor import Floor
-from game.domain.package import CanRecievePackage, Package, PackageState
+from game.domain.package import CanRecievePackage, FallDirection, Package, PackageState
+from game.domain.package_stages import FINAL_STAGE, ConveyorTable, compile_conveyor_table
+
+# Slowest velocity: packages move 4 * velocity pixels per move, at least one
+MIN_VELOCITY = 0.25
 
 
 class Direction(Enum):
@@ -25,13 +30,20 @@ class Conveyor(Element):
         length (int): Length of the conveyor in the x axis (positive).
         height (int): Height of the conveyor in the y axis (positive).
         direction (Direction): Direction in which the conveyor moves packages.
-        velocity (float): Speed at which the conveyor moves packages. Must be > 0.
+        velocity (float): Speed at which the conveyor moves packages. Must be
+            at least :data:`MIN_VELOCITY`.
+        steps (tuple[int, ...]): Pixels a package moves from each distance of
+            one period of its fixed-point trajectory, see
+            :func:`game.domain.fixed_point.step_table`.
         finish_floor (Floor): The floor where the conveyor ends.
         floor_y (int): The y coordinate where packages are considered to be invisible.
         next_step (CanRecievePackage | None): Next element that receives packages.
         start_position (tuple[int, int]): Initial position where packages are placed.
         packages (list[Package]): Packages currently on this conveyor.
         falling_packages (list[Package]): Packages that are currently falling.
+        final_stage (int): Last stage a package can reach. Must be >= 0.
+        table (ConveyorTable): Stage transitions and fall edges compiled from
+            the layout by :meth:`compile_table`.
 
     Raises:
         TypeError: If parameters have incorrect type.
@@ -49,6 +61,7 @@ class Conveyor(Element):
         finish_floor: Floor,
         floor_y: int,
         next_step: CanRecievePackage | None = None,
+        final_stage: int = FINAL_STAGE,
     ) -> None:
         """Initializes a new conveyor belt.
 
@@ -61,6 +74,7 @@ class Conveyor(Element):
         :param finish_floor: Floor, the floor where the conveyor ends.
         :param floor_y: int, y coordinate of the floor used for falling detection, must be >= 0.
         :param next_step: an object implementing `put_package` or None.
+        :param final_stage: int, last stage a package can reach, must be >= 0.
         :raises TypeError: if some parameter type is wrong.
         :raises ValueError: if some numeric parameter has an invalid value.
         """
@@ -95,6 +109,8 @@ class Conveyor(Element):
 
         # start_position is considered internal and not guarded by a property
         self.start_position: tuple[int, int] = start_position
+        self.final_stage = final_stage
+        self.compile_table()
 
     # conveyor_id
     @property
@@ -144,7 +160,7 @@ class Conveyor(Element):
     def velocity(self) -> float:
         """Returns the velocity of the conveyor.
 
-        :return: float, the velocity (must be strictly positive).
+        :return: float, the velocity (at least :data:`MIN_VELOCITY`).
         """
         return self.__velocity
 
@@ -152,17 +168,33 @@ class Conveyor(Element):
     def velocity(self, velocity: float) -> None:
         """Sets the velocity of the conveyor.
 
-        :param velocity: float, the new velocity. Must be > 0.
+        The packages move ``4 * velocity`` pixels per move in fixed point,
+        so the step table is looked up here rather than on every move.
+
+        :param velocity: float, the new velocity. Must be at least
+            :data:`MIN_VELOCITY`.
         :raises TypeError: if velocity is not a number.
-        :raises ValueError: if velocity is not strictly positive.
+        :raises ValueError: if velocity moves the packages less than one pixel
+            per move.
         """
         if not isinstance(velocity, (int, float)):
             raise TypeError("velocity must be a number (int or float)")
         velocity = float(velocity)
-        if velocity <= 0:
-            raise ValueError("velocity must be strictly greater than 0")
+        if velocity < MIN_VELOCITY:
+            raise ValueError(
+                f"velocity must be at least {MIN_VELOCITY} (one pixel per move)"
+            )
+        self.__steps = step_table(to_fixed(velocity * 4))
         self.__velocity = velocity
 
+    @property
+    def steps(self) -> tuple[int, ...]:
+        """Returns the step table of the current velocity.
+
+        :return: tuple[int, ...], the pixels moved from each distance of a period.
+        """
+        return self.__steps
+
     # finish_floor
     @property
     def finish_floor(self) -> Floor:
@@ -228,6 +260,45 @@ class Conveyor(Element):
             raise ValueError("floor_y cannot be negative")
         self.__floor_y = floor_y
 
+    # final_stage
+    @property
+    def final_stage(self) -> int:
+        """Returns the last stage a package can reach.
+
+        :return: int, the final stage (>= 0).
+        """
+        return self.__final_stage
+
+    @final_stage.setter
+    def final_stage(self, final_stage: int) -> None:
+        """Sets the last stage a package can reach.
+
+        Call :meth:`compile_table` afterwards to apply it.
+
+        :param final_stage: int, the final stage. Must be >= 0.
+        :raises TypeError: if final_stage is not an int.
+        :raises ValueError: if final_stage is negative.
+        """
+        if not isinstance(final_stage, int):
+            raise TypeError("final_stage must be an int")
+        if final_stage < 0:
+            raise ValueError("final_stage cannot be negative")
+        self.__final_stage = final_stage
+
+    def compile_table(self) -> None:
+        """Compiles the stage transitions and fall edges of the current layout.
+
+        Called on creation; call it again after changing the id, position,
+        length, direction or final stage of the conveyor.
+        """
+        self.table: ConveyorTable = compile_conveyor_table(
+            self.conveyor_id,
+            self.x,
+            self.length,
+            self.direction == Direction.RIGHT,
+            self.final_stage,
+        )
+
     def put_package(self, package: Package) -> None:
         """Places a package on the conveyor at the start position.
 
@@ -243,52 +314,68 @@ class Conveyor(Element):
         package.state = PackageState.ON_CONVEYOR
         self.packages.append(package)
 
-    def move_packages(self) -> None:
+    def move_packages(self) -> int:
         """Moves all packages on the conveyor according to its direction and velocity.
 
-        This method updates the stage of each package, changes their position
-        according to the conveyor direction and velocity, and handles the
-        logic for falling packages.
+        This method updates the stage of each package through the compiled
+        :attr:`table`, changes their position according to the conveyor
+        direction and velocity, and handles the logic for falling packages.
+        Packages advance by the :attr:`steps` of their distance from the
+        start position, so fractional velocities are neither lost nor
+        converted from float on every move.
+
+        :return: int, number of packages that started falling during this move.
         """
-        for package in list(self.packages):
-            if package.stage != 5 and self._package_changes_stage(package):
-                if package.stage == 0:
-                    package.stage = 1
-                    package.stage_to_be_changed_to = 1
-                elif package.stage == 1:
-                    package.stage = 2
-                    package.stage_to_be_changed_to = 2
-                elif package.stage == 2:
-                    package.stage = 3
-                    package.stage_to_be_changed_to = 3
-                elif package.stage == 3:
-                    package.stage = 4
-                    package.stage_to_be_changed_to = 4
-                elif package.stage == 4:
-                    package.stage = 5
-                    package.stage_to_be_changed_to = 5
+        # Packages staying on the belt or in the air are compacted in place,
+        # so a tick where none starts or stops falling allocates no list
+        dropped = 0
+        packages = self.packages
+        transitions, left_edge, right_edge = self.table
+        steps = self.__steps
+        period = len(steps)
+        origin = self.start_position[0]
+        sign = -1 if self.direction == Direction.LEFT else 1
+        kept = 0
+        for package in packages:
+            transition = transitions.get(package.stage)
+            if transition is not None and (
+                package.x + package.length >= transition.threshold
+                if transition.leading_edge
+                else package.x <= transition.threshold
+            ):
+                package.stage = transition.next_stage
+                package.stage_to_be_changed_to = transition.next_stage
 
             if package.state != PackageState.FALLING:
-                if self.direction == Direction.LEFT:
-                    package.move_x(package.x + self.velocity * -4)
-                else:
-                    package.move_x(package.x + self.velocity * 4)
+                x = package.x
+                package.move_x(x + sign * steps[(x - origin) * sign % period])
 
-            if not self._is_package_on_conveyor(package):
+            if left_edge <= package.x + (package.length // 2) + 1 <= right_edge:
+                packages[kept] = package
+                kept += 1
+            else:
                 self.falling_packages.append(package)
+                dropped += 1
                 package.state = PackageState.FALLING
-                if package.x < self.x:
-                    package.state_to_be_changed_to = 1
-                elif package.x + package.length > self.x + self.length:
-                    package.state_to_be_changed_to = 2
-                self.lift_package(package)
-
-        for package in list(self.falling_packages):
+                if package.x < left_edge:
+                    package.state_to_be_changed_to = FallDirection.LEFT
+                elif package.x + package.length > right_edge:
+                    package.state_to_be_changed_to = FallDirection.RIGHT
+        if kept < len(packages):
+            del packages[kept:]
+
+        falling_packages = self.falling_packages
+        kept = 0
+        for package in falling_packages:
             if package.y >= self.floor_y:
-                self.falling_packages.remove(package)
                 package.offscreen = True
             else:
                 package.move_y(package.y + 4)
+                falling_packages[kept] = package
+                kept += 1
+        if kept < len(falling_packages):
+            del falling_packages[kept:]
+        return dropped
 
     def lift_package(self, package: Package) -> None:
         """Removes a package from the conveyor.
@@ -303,34 +390,6 @@ class Conveyor(Element):
         except ValueError as error:
             raise ValueError("Package is not on this conveyor") from error
 
-    def _is_package_on_conveyor(self, package: Package) -> bool:
-        """Checks whether a package is still on top of the conveyor.
-
-        :param package: Package, the package to check.
-        :return: bool, True if the package is on the conveyor, False otherwise.
-        """
-        return self.x <= package.x + (package.length // 2) + 1 <= self.x + self.length
-
-    def _package_changes_stage(self, package: Package) -> bool:
-        """Checks whether the package needs to change its stage.
-
-        Stages depend on the conveyor id and the package position.
-
-        :param package: Package, the package whose stage is checked.
-        :return: bool, True if the stage must change, False otherwise.
-        :raises ValueError: if the conveyor id is not valid.
-        """
-        if self.conveyor_id % 2 != 0:
-            return self.conveyor_id - 1 == package.stage and package.x <= self.x + (
-                self.length // 2
-            )
-        if self.conveyor_id % 2 == 0:
-            return (
-                self.conveyor_id - 1 == package.stage
-                and package.x + package.length >= self.x + (self.length // 2)
-            )
-        raise ValueError("conveyor id is not valid")
-
     def package_about_to_fall(self, package: Package) -> bool:
         """Checks whether a package is about to fall from the conveyor.
 
@@ -341,22 +400,20 @@ class Conveyor(Element):
             self.x + self.length + 1
         ) <= (package.x + package.length):
             return True
-        if (
-            self.direction == Direction.LEFT
-            and package.x
-            + (self.velocity * -4)
-            + (package.length // 2)
-            + 1
-            < self.x
-        ):
+        middle = self.next_x(package.x) + (package.length // 2) + 1
+        if self.direction == Direction.LEFT and middle < self.x:
             return True
-        if (
-            self.direction == Direction.RIGHT
-            and package.x
-            + (self.velocity * 4)
-            + (package.length // 2)
-            + 1
-            > self.x + self.length
-        ):
+        if self.direction == Direction.RIGHT and middle > self.x + self.length:
             return True
         return False
+
+    def next_x(self, x: int) -> int:
+        """Computes where a package at x lands after its next move.
+
+        :param x: int, x coordinate of the package.
+        :return: int, its x coordinate after one move on this conveyor.
+        """
+        steps = self.__steps
+        if self.direction == Direction.LEFT:
+            return x - steps[(self.start_position[0] - x) % len(steps)]
+        return x + steps[(x - self.start_position[0]) % len(steps)]
@@ -11,6 +11,7 @@ class Door(Element):
         length (int): The width of the door (positive).
         height (int): The height of the door (positive).
         boss (Boss): The boss that uses this door to enter the scene.
+        is_open (bool): True while the boss is visiting the scene.
     """
 
     def __init__(
@@ -20,6 +21,7 @@ class Door(Element):
         length: int,
         height: int,
         boss: Boss,
+        is_open: bool = False,
     ) -> None:
         """Initializes the door and associates it with a boss.
 
@@ -28,11 +30,13 @@ class Door(Element):
         :param length: int, the width of the door. Must be > 0.
         :param height: int, the height of the door. Must be > 0.
         :param boss: Boss, the boss associated with this door.
-        :raises TypeError: if boss is not a Boss instance.
+        :param is_open: bool, True if the boss is currently visiting.
+        :raises TypeError: if boss is not a Boss instance or is_open is not a bool.
         :raises TypeError: or ValueError if x, y, length or height are invalid (from Element).
         """
         super().__init__(x, y, length, height)
         self.boss = boss
+        self.is_open = is_open
 
     @property
     def boss(self) -> Boss:
@@ -52,3 +56,22 @@ class Door(Element):
         if not isinstance(boss, Boss):
             raise TypeError("boss must be a Boss instance")
         self.__boss = boss
+
+    @property
+    def is_open(self) -> bool:
+        """Returns whether the door is open for a boss visit.
+
+        :return: bool, True if the boss is in the scene.
+        """
+        return self.__is_open
+
+    @is_open.setter
+    def is_open(self, is_open: bool) -> None:
+        """Sets whether the door is open for a boss visit.
+
+        :param is_open: bool, True if the boss is in the scene.
+        :raises TypeError: if is_open is not a bool.
+        """
+        if not isinstance(is_open, bool):
+            raise TypeError("is_open must be a bool")
+        self.__is_open = is_open
@@ -1,3 +1,19 @@
+from typing import Any, Protocol
+
+
+class ChangeObserver(Protocol):
+    """Observer notified around every change of a hashed field.
+
+    See :class:`game.domain.state_hash.StateHash`.
+    """
+
+    def remove(self, element: Any) -> None:
+        """Called before a field of the element changes."""
+
+    def add(self, element: Any) -> None:
+        """Called after a field of the element changed."""
+
+
 class Element:
     """Base class for all game elements.
 
@@ -5,12 +21,16 @@ class Element:
     in the game world.
 
     Attributes:
+        state_hash (ChangeObserver | None): Observer of the position changes,
+            None unless a state hash is attached.
         x (int): The x-coordinate of the element. It must be a non-negative integer.
         y (int): The y-coordinate of the element. It must be a non-negative integer.
         length (int): The length (width) of the element. It must be a positive integer.
         height (int): The height of the element. It must be a positive integer.
     """
 
+    state_hash: ChangeObserver | None = None
+
     def __init__(self, x: int, y: int, length: int, height: int) -> None:
         """Initializes the element with its position and size.
 
@@ -54,7 +74,12 @@ class Element:
         """
         if not isinstance(x, int):
             raise TypeError("The x coordinate must be an int")
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
         self.__x = x
+        if observer is not None:
+            observer.add(self)
 
     # y property
     @property
@@ -77,7 +102,12 @@ class Element:
             raise TypeError("The y coordinate must be an int")
         if y < 0:
             raise ValueError("The y coordinate cannot be negative")
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
         self.__y = y
+        if observer is not None:
+            observer.add(self)
 
     # length property
     @property
@@ -156,7 +186,7 @@ class MotionElement(Element):
         :param x: int, the new x-coordinate, must be >= 0.
         :raises TypeError: if x is not an int.
         """
-        self.move(x=x, y=self.y)
+        self.x = int(x)
 
     def move_y(self, y: int) -> None:
         """Moves the element vertically, keeping the x-coordinate.
@@ -165,4 +195,4 @@ class MotionElement(Element):
         :raises TypeError: if y is not an int.
         :raises ValueError: if y is negative.
         """
-        self.move(x=self.x, y=y)
+        self.y = int(y)
@@ -1,9 +1,14 @@
+from game.domain.clock import Clock, WallClock
 from game.domain.conveyor import Conveyor
+from game.domain.door import Door
+from game.domain.elements import ChangeObserver
 from game.domain.exceptions import DomainError
 from game.domain.floor import Floor
 from game.domain.package import Package
 from game.domain.package_factory import PackageFactory
 from game.domain.player import Player
+from game.domain.rules import GameEvent, RulesEngine
+from game.domain.spawn_scheduler import SpawnScheduler
 from game.domain.truck import Truck
 from game.presentation.gui import PointsCounter
 
@@ -22,12 +27,21 @@ class Game:
         factories (list[PackageFactory]): The list of factories generating packages.
         truck (Truck): The truck where packages are finally delivered.
         point_counter (PointsCounter | None): GUI element to show points, if any.
+        door (Door | None): The door the boss uses to visit, if any.
+        clock (Clock): Source of the game time.
+        state_hash (ChangeObserver | None): Observer of the points and lives
+            changes, None unless a state hash is attached.
+        spawn_scheduler (SpawnScheduler | None): Scheduler told when the packages
+            at play, their minimum or the first move change, if any.
+        rules (RulesEngine | None): Engine told about the score, delivery, life
+            and truck events, if any.
 
         live_amount (int): Number of lives remaining. Must be >= 0.
         points (int): Current score. Must be >= 0.
         stored_deliveries (int): Number of deliveries not used for healing. Must be >= 0.
         minimum_number_packages (int): Minimum number of packages in play. Must be >= 0.
         packages_at_play (int): Number of packages currently in play. Must be >= 0.
+        first_package_moved (bool): True once a package went past the first conveyor.
 
         Other bool flags used only for indicating UI updates and special events.
     """
@@ -39,6 +53,8 @@ class Game:
         conveyors: list[Conveyor] | None = None,
         factories: list[PackageFactory] | None = None,
         point_counter: PointsCounter | None = None,
+        door: Door | None = None,
+        clock: Clock | None = None,
     ) -> None:
         """Initializes the game, checking coherence of players and floors.
 
@@ -47,9 +63,14 @@ class Game:
         :param conveyors: optional list of Conveyor instances.
         :param factories: optional list of PackageFactory instances.
         :param point_counter: optional GUI points counter.
+        :param door: optional Door used by the boss.
+        :param clock: optional Clock, defaults to the wall clock.
         :raises DomainError: if a player is not located on one of the entered floors.
         """
         self.newly_created_packages: list[Package] = []
+        self.state_hash: ChangeObserver | None = None
+        self.spawn_scheduler: SpawnScheduler | None = None
+        self.rules: RulesEngine | None = None
 
         self.live_amount = 3
         self.points = 0
@@ -72,6 +93,8 @@ class Game:
         self.original_truck_x = truck.x
         self.first_package_moved = False
         self.point_counter = point_counter
+        self.door = door
+        self.clock = clock if clock is not None else WallClock()
         self.points_to_be_updated = False
         self.lives_to_be_updated = False
         self.deliveries_to_be_updated = False
@@ -100,7 +123,15 @@ class Game:
             raise TypeError("live_amount must be an int")
         if value < 0:
             raise ValueError("live_amount cannot be negative")
-        self.__live_amount = value
+        rules = self.rules
+        if rules is not None and value != self.__live_amount:
+            rules.notify(GameEvent.LIVES)
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
+        self.__live_amount: int = value
+        if observer is not None:
+            observer.add(self)
 
     # points
     @property
@@ -123,7 +154,15 @@ class Game:
             raise TypeError("points must be an int")
         if value < 0:
             raise ValueError("points cannot be negative")
-        self.__points = value
+        rules = self.rules
+        if rules is not None and value != self.__points:
+            rules.notify(GameEvent.SCORE)
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
+        self.__points: int = value
+        if observer is not None:
+            observer.add(self)
 
     # stored_deliveries
     @property
@@ -146,7 +185,10 @@ class Game:
             raise TypeError("stored_deliveries must be an int")
         if value < 0:
             raise ValueError("stored_deliveries cannot be negative")
-        self.__stored_deliveries = value
+        rules = self.rules
+        if rules is not None and value != self.__stored_deliveries:
+            rules.notify(GameEvent.DELIVERIES)
+        self.__stored_deliveries: int = value
 
     # minimum_number_packages
     @property
@@ -169,7 +211,10 @@ class Game:
             raise TypeError("minimum_number_packages must be an int")
         if value < 0:
             raise ValueError("minimum_number_packages cannot be negative")
-        self.__minimum_number_packages = value
+        scheduler = self.spawn_scheduler
+        if scheduler is not None and value != self.__minimum_number_packages:
+            scheduler.inputs_changed()
+        self.__minimum_number_packages: int = value
 
     # packages_at_play
     @property
@@ -192,7 +237,33 @@ class Game:
             raise TypeError("packages_at_play must be an int")
         if value < 0:
             raise ValueError("packages_at_play cannot be negative")
-        self.__packages_at_play = value
+        scheduler = self.spawn_scheduler
+        if scheduler is not None and value != self.__packages_at_play:
+            scheduler.inputs_changed()
+        self.__packages_at_play: int = value
+
+    # first_package_moved
+    @property
+    def first_package_moved(self) -> bool:
+        """Returns whether a package went past the first conveyor.
+
+        :return: bool, True once the first package moved.
+        """
+        return self.__first_package_moved
+
+    @first_package_moved.setter
+    def first_package_moved(self, value: bool) -> None:
+        """Sets whether a package went past the first conveyor.
+
+        :param value: bool, True once the first package moved.
+        :raises TypeError: if value is not a bool.
+        """
+        if not isinstance(value, bool):
+            raise TypeError("first_package_moved must be a bool")
+        scheduler = self.spawn_scheduler
+        if scheduler is not None and value != self.__first_package_moved:
+            scheduler.inputs_changed()
+        self.__first_package_moved: bool = value
 
     def move_packages(self) -> None:
         """Moves packages across conveyors and handles pickups by players.
@@ -200,25 +271,40 @@ class Game:
         This method:
           * checks if packages are about to fall and lets players pick them up,
           * moves all packages on each conveyor,
+          * takes a life for every package that starts falling,
           * updates flags to indicate changes in conveyor or truck.
         :raises DomainError: if a conveyor has no defined next_step.
         """
         for conveyor in self.conveyors:
-            for package in list(conveyor.packages):
+            # Walks the list by index instead of copying it: a picked package
+            # is deleted in place and the next one takes its index
+            packages = conveyor.packages
+            index = 0
+            while index < len(packages):
+                package = packages[index]
                 if conveyor.package_about_to_fall(package):
                     if conveyor.finish_floor.player is not None:
                         if conveyor.next_step is None:
                             raise DomainError(
                                 "next step is not defined for the conveyor"
                             )
-                        if conveyor.finish_floor.player.pick_package(package):
+                        if conveyor.finish_floor.player.pick_package(
+                            package, self.clock.now()
+                        ):
                             conveyor.finish_floor.player.sprite_to_be_changed = True
-                            conveyor.packages.remove(package)
+                            del packages[index]
                             if conveyor.next_step != self.truck:
                                 self.package_changes_conveyor = True
+                            continue
+                index += 1
 
         for conveyor in self.conveyors:
-            conveyor.move_packages()
+            dropped = conveyor.move_packages()
+            if dropped:
+                self.packages_at_play -= dropped
+                self.live_amount = max(self.live_amount - dropped, 0)
+                self.lives_to_be_updated = True
+                self.boss_comes_in = True
 
     def player_put_down_package(self, player: Player) -> None:
         """Places the package carried by a player on the corresponding conveyor/truck.
@@ -242,6 +328,8 @@ class Game:
                     self.packages_at_play -= 1
                     self.points += 2
                     self.package_put_in_truck = True
+                    if self.rules is not None:
+                        self.rules.notify(GameEvent.TRUCK)
                 else:
                     self.first_package_moved = True
                     self.points += 1
@@ -279,10 +367,16 @@ class Game:
     def create_package(self) -> None:
         """Creates new packages using all factories.
 
-        Newly created packages are appended to the `newly_created_packages` list.
+        Newly created packages are appended to the `newly_created_packages` list
+        and counted in `packages_at_play`.
         """
         for factory in self.factories:
-            self.newly_created_packages.append(factory.create_package())
+            package = factory.create_package()
+            if self.state_hash is not None:
+                package.state_hash = self.state_hash
+                self.state_hash.add(package)
+            self.newly_created_packages.append(package)
+            self.packages_at_play += 1
 
     def move_player_down(self, player: Player) -> None:
         """Moves a player one floor down if possible.
@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from enum import Enum
+from enum import Enum, IntEnum
 from typing import Protocol
 
 from game.domain.elements import MotionElement
@@ -21,6 +21,23 @@ class PackageState(Enum):
     ON_TRUCK = "truck"
 
 
+class FallDirection(IntEnum):
+    """Side a :class:`Package` falls from its conveyor, as a pending change.
+
+    The value is also the number of sprite columns the fallen package is
+    drawn away from the one on the belt.
+
+    Attributes:
+        NONE: No pending change.
+        LEFT: Package fell from the left end of its conveyor.
+        RIGHT: Package fell from the right end of its conveyor.
+    """
+
+    NONE = 0
+    LEFT = 1
+    RIGHT = 2
+
+
 class Package(MotionElement):
     """The movable package in the game world.
 
@@ -34,9 +51,10 @@ class Package(MotionElement):
         length (int): Width of the package (positive).
         height (int): Height of the package (positive).
         state (PackageState): Current state of the package.
-        stage (int): Stage of the package in the pipeline, between 0 and 5 inclusive.
+        stage (int): Stage of the package in the pipeline (>= 0), bounded by
+            the final stage of the conveyors.
         stage_to_be_changed_to (int): Pending stage change (0 means no change).
-        state_to_be_changed_to (int): Pending state change (0 = none, 1 = falls left, 2 = falls right).
+        state_to_be_changed_to (int): Pending state change, a :class:`FallDirection`.
         offscreen (bool): True if the package is outside the visible area.
     """
 
@@ -56,15 +74,15 @@ class Package(MotionElement):
         :param length: int, width of the package, must be > 0.
         :param height: int, height of the package, must be > 0.
         :param state: PackageState, initial life-cycle state of the package.
-        :param stage: int, initial stage (0 to 5 inclusive).
+        :param stage: int, initial stage (>= 0).
         :raises TypeError: if state is not a PackageState or stage has wrong type.
-        :raises ValueError: if stage is not between 0 and 5.
+        :raises ValueError: if stage is negative.
         """
         super().__init__(x, y, length, height)
         self.state = state
         self.stage = stage
         self.stage_to_be_changed_to = 0
-        self.state_to_be_changed_to = 0
+        self.state_to_be_changed_to = FallDirection.NONE
         self.offscreen = False
 
     # state
@@ -85,14 +103,19 @@ class Package(MotionElement):
         """
         if not isinstance(state, PackageState):
             raise TypeError("state must be an instance of PackageState")
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
         self.__state = state
+        if observer is not None:
+            observer.add(self)
 
     # stage
     @property
     def stage(self) -> int:
         """Returns the current stage of the package.
 
-        :return: int, the stage number between 0 and 5 inclusive.
+        :return: int, the stage number (>= 0).
         """
         return self.__stage
 
@@ -100,22 +123,27 @@ class Package(MotionElement):
     def stage(self, stage: int) -> None:
         """Sets the current stage of the package.
 
-        :param stage: int, the new stage, must be between 0 and 5 inclusive.
+        :param stage: int, the new stage, must be >= 0.
         :raises TypeError: if stage is not an int.
-        :raises ValueError: if stage is not in range 0..5.
+        :raises ValueError: if stage is negative.
         """
         if not isinstance(stage, int):
             raise TypeError("stage must be an int")
-        if not 0 <= stage <= 5:
-            raise ValueError("stage must be between 0 and 5 inclusive")
+        if stage < 0:
+            raise ValueError("stage cannot be negative")
+        observer = self.state_hash
+        if observer is not None:
+            observer.remove(self)
         self.__stage = stage
+        if observer is not None:
+            observer.add(self)
 
     # stage_to_be_changed_to
     @property
     def stage_to_be_changed_to(self) -> int:
         """Returns the pending stage change.
 
-        :return: int, 0 means no change; otherwise the new stage (0..5).
+        :return: int, 0 means no change; otherwise the new stage.
         """
         return self.__stage_to_be_changed_to
 
@@ -123,14 +151,14 @@ class Package(MotionElement):
     def stage_to_be_changed_to(self, stage: int) -> None:
         """Sets the pending stage change.
 
-        :param stage: int, 0 means no change; otherwise new stage (0..5).
+        :param stage: int, 0 means no change; otherwise new stage (>= 0).
         :raises TypeError: if stage is not an int.
-        :raises ValueError: if stage is not between 0 and 5 inclusive.
+        :raises ValueError: if stage is negative.
         """
         if not isinstance(stage, int):
             raise TypeError("stage_to_be_changed_to must be an int")
-        if not 0 <= stage <= 5:
-            raise ValueError("stage_to_be_changed_to must be between 0 and 5 inclusive")
+        if stage < 0:
+            raise ValueError("stage_to_be_changed_to cannot be negative")
         self.__stage_to_be_changed_to = stage
 
     # state_to_be_changed_to
@@ -138,7 +166,7 @@ class Package(MotionElement):
     def state_to_be_changed_to(self) -> int:
         """Returns the pending state change flag.
 
-        :return: int, 0 = no change, 1 = falls to the left, 2 = falls to the right.
+        :return: int, a :class:`FallDirection`, NONE for no change.
         """
         return self.__state_to_be_changed_to
 
@@ -146,7 +174,7 @@ class Package(MotionElement):
     def state_to_be_changed_to(self, value: int) -> None:
         """Sets the pending state change flag.
 
-        :param value: int, 0 = none, 1 = falls to the left, 2 = falls to the right.
+        :param value: int, a :class:`FallDirection` value.
         :raises TypeError: if value is not an int.
         :raises ValueError: if value is not 0, 1 or 2.
         """
@@ -174,6 +202,10 @@ class Package(MotionElement):
         """
         if not isinstance(offscreen, bool):
             raise TypeError("offscreen must be a bool")
+        # Packages leaving the scene leave the state hash too
+        if offscreen and self.state_hash is not None:
+            self.state_hash.remove(self)
+            self.state_hash = None
         self.__offscreen = offscreen
 
 
@@ -0,0 +1,85 @@
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from game.domain.conveyor import Conveyor
+
+# Last stage drawn by the sprite sheet
+FINAL_STAGE = 5
+
+
+class StageTransition(NamedTuple):
+    """Stage change of the packages crossing the middle of a conveyor.
+
+    Attributes:
+        next_stage (int): Stage of a package once it crossed.
+        threshold (int): x coordinate to cross.
+        leading_edge (bool): True if the right edge of the package has to
+            reach the threshold (belt moving right), False if its left edge
+            has to go back to it (belt moving left).
+    """
+
+    next_stage: int
+    threshold: int
+    leading_edge: bool
+
+
+class ConveyorTable(NamedTuple):
+    """Rules of the packages moving on a conveyor, compiled from its layout.
+
+    Attributes:
+        transitions (dict[int, StageTransition]): Stage changes keyed by the
+            stage a package has before crossing.
+        left_edge (int): x coordinate of the left end of the belt.
+        right_edge (int): x coordinate of the right end of the belt.
+    """
+
+    transitions: dict[int, StageTransition]
+    left_edge: int
+    right_edge: int
+
+
+def compile_conveyor_table(
+    conveyor_id: int,
+    x: int,
+    length: int,
+    moving_right: bool,
+    final_stage: int = FINAL_STAGE,
+) -> ConveyorTable:
+    """Compiles the stage transitions and the fall edges of a conveyor.
+
+    Conveyor ``k`` of the pipeline turns the packages of stage ``k - 1``
+    into stage ``k`` when they reach its middle, up to ``final_stage``; the
+    factory conveyor (id 0) changes no stage.
+
+    :param conveyor_id: int, identifier of the conveyor.
+    :param x: int, x coordinate of the conveyor.
+    :param length: int, length of the conveyor.
+    :param moving_right: bool, whether the belt moves packages to the right.
+    :param final_stage: int, last stage a package can reach.
+    :return: ConveyorTable, the compiled rules.
+    """
+    transitions = {}
+    if 1 <= conveyor_id <= final_stage:
+        transitions[conveyor_id - 1] = StageTransition(
+            next_stage=conveyor_id,
+            threshold=x + length // 2,
+            leading_edge=moving_right,
+        )
+    return ConveyorTable(transitions, x, x + length)
+
+
+def stage_table(
+    conveyors: Iterable["Conveyor"],
+) -> dict[tuple[int, int], StageTransition]:
+    """Gathers the stage transitions of conveyors.
+
+    :param conveyors: Iterable[Conveyor], the conveyors of a game.
+    :return: dict[tuple[int, int], StageTransition], the transitions keyed by
+        conveyor id and stage before crossing.
+    """
+    return {
+        (conveyor.conveyor_id, stage): transition
+        for conveyor in conveyors
+        for stage, transition in conveyor.table.transitions.items()
+    }
@@ -182,13 +182,15 @@ class Player(MotionElement):
             raise TypeError("is_resting must be a bool")
         self.__is_resting = is_resting
 
-    def pick_package(self, package: Package) -> bool:
+    def pick_package(self, package: Package, picked_up_at: float | None = None) -> bool:
         """Makes the player pick up a package if none is currently held.
 
         The package is centered inside the player's bounding box and its state
         is set to :class:`PackageState.PICKED`.
 
         :param package: Package, the package to be picked up.
+        :param picked_up_at: float | None, game time of the pickup, or None to
+            use :func:`time.perf_counter`.
         :return: bool, True if the package was picked up, False if the player already had one.
         """
         if self.package is not None:
@@ -199,7 +201,9 @@ class Player(MotionElement):
         package.y = self.y + ((self.height - package.height) // 2)
         self.package = package
         self.is_moving_package = True
-        self.package_picked_up_at = perf_counter()
+        self.package_picked_up_at = (
+            perf_counter() if picked_up_at is None else picked_up_at
+        )
         return True
 
     def put_package(self) -> None:
@@ -0,0 +1,115 @@
+from collections.abc import Callable
+from enum import IntFlag
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from game.domain.game import Game
+
+# Lives a regeneration can restore up to
+MAX_LIVES = 3
+
+
+class GameEvent(IntFlag):
+    """Changes of the game the rules react to."""
+
+    NONE = 0
+    SCORE = 1
+    DELIVERIES = 2
+    LIVES = 4
+    TRUCK = 8
+    ALL = SCORE | DELIVERIES | LIVES | TRUCK
+
+
+class Rule(NamedTuple):
+    """Action run when one of its events happened.
+
+    Attributes:
+        events (GameEvent): Events the rule reacts to.
+        action (Callable[[], None]): Checks the rule and applies it.
+    """
+
+    events: GameEvent
+    action: Callable[[], None]
+
+
+class RulesEngine:
+    """Runs the rules of a game when the events they react to happened.
+
+    The game calls :meth:`notify` when its points, stored deliveries, lives
+    or truck load change. :meth:`apply` then runs, in the order they were
+    added, the rules reacting to the pending events it is asked about, so a
+    tick without such events checks no rule.
+
+    Attributes:
+        rules (list[Rule]): Rules in the order they are run.
+        pending (GameEvent): Events that happened since their rules last ran.
+    """
+
+    def __init__(self) -> None:
+        """Initializes an engine without rules, every event pending."""
+        self.rules: list[Rule] = []
+        self.pending = GameEvent.ALL
+
+    def add(self, events: GameEvent, action: Callable[[], None]) -> Rule:
+        """Adds a rule run after the existing ones.
+
+        :param events: GameEvent, events the rule reacts to.
+        :param action: Callable[[], None], checks the rule and applies it.
+        :return: Rule, the new rule.
+        """
+        rule = Rule(events, action)
+        self.rules.append(rule)
+        return rule
+
+    def notify(self, events: GameEvent) -> None:
+        """Notes that events happened.
+
+        :param events: GameEvent, the events.
+        """
+        self.pending |= events
+
+    def apply(self, events: GameEvent) -> None:
+        """Runs the rules reacting to the pending events among some events.
+
+        Events raised by the rules themselves are pending for the next call.
+
+        :param events: GameEvent, events to handle now.
+        """
+        due = self.pending & events
+        if not due:
+            return
+        self.pending &= ~due
+        for rule in self.rules:
+            if rule.events & due:
+                rule.action()
+
+
+def ramp_up_packages(game: "Game", increase: int) -> None:
+    """Raises the minimum number of packages at every multiple of increase points.
+
+    :param game: Game, the game to update.
+    :param increase: int, points between two raises, must be > 0.
+    """
+    if game.points % increase == 0:
+        game.minimum_number_packages = 1 + game.points // increase
+
+
+def regenerate_life(game: "Game", eliminates: int) -> bool:
+    """Trades stored deliveries for a life when the players lost one.
+
+    :param game: Game, the game to update.
+    :param eliminates: int, deliveries a life costs, 0 if lives never regenerate.
+    :return: bool, True if a life was regenerated.
+    """
+    if (
+        eliminates != 0
+        and game.stored_deliveries >= eliminates
+        and game.stored_deliveries % eliminates == 0
+        and game.live_amount < MAX_LIVES
+    ):
+        game.live_amount += 1
+        game.stored_deliveries -= eliminates
+        game.deliveries_to_be_updated = True
+        game.lives_to_be_updated = True
+        return True
+    return False
@@ -0,0 +1,461 @@
+from functools import partial
+
+from game.domain.clock import Clock, FixedStepClock
+from game.domain.difficulty import Difficulty
+from game.domain.game import Game
+from game.domain.rules import GameEvent, RulesEngine, ramp_up_packages, regenerate_life
+from game.domain.spawn_scheduler import SpawnProfile, SpawnScheduler, spread_curve
+from game.domain.timer_wheel import Timer, TimerWheel
+
+
+class GameSession:
+    """Time-based rules of a running game, independent of any renderer.
+
+    The session advances a :class:`Game` once per tick: it throttles package
+    and truck movement, spawns packages, handles truck breaks, boss visits,
+    life regeneration and the end of the game. The presentation layer reads
+    its flags to update sprites and play sounds, so the same session can
+    be driven by Pyxel or by a headless loop.
+
+    Every deadline (end of the truck break, boss visit, game over, package
+    put down, the package, truck and creation ticks) is a timer of a
+    :class:`TimerWheel` advanced once per update, so an update only looks
+    at the rules whose time came. Timers that must act at a given point of
+    the update only mark their rule as due. Packages are created by a
+    :class:`SpawnScheduler` sharing the wheel, and the score, life and truck
+    rules run in a :class:`RulesEngine` when the game raised their events.
+
+    Attributes:
+        game (Game): The domain game object.
+        selected_difficulty (Difficulty): Difficulty configuration.
+        tick_second (float): Time unit used for scaling ticks.
+        move_package_tick (float): Tick factor for package movement.
+        move_truck_tick (float): Tick factor for truck movement.
+        create_package_tick (float): Tick factor for package creation, the
+            current period of the spawn scheduler.
+        spawn_scheduler (SpawnScheduler): Creates the packages when they are due.
+        rules (RulesEngine): Raises the minimum number of packages with the
+            score, regenerates lives and unloads the full truck.
+        has_lost (bool): True once the players ran out of lives.
+        life_regenerated (bool): True when a life was regenerated (UI flag).
+        truck_unloaded (bool): True when the full truck was emptied (UI flag).
+    """
+
+    def __init__(
+        self,
+        game: Game,
+        selected_difficulty: Difficulty,
+        tick_second: float,
+        move_package_tick: float,
+        move_truck_tick: float,
+        create_package_tick: float,
+        spawn_profile: SpawnProfile | None = None,
+    ) -> None:
+        """Initializes the session, starting the timers at the current game time.
+
+        :param game: Game, the domain game object.
+        :param selected_difficulty: Difficulty, the selected difficulty configuration.
+        :param tick_second: float, base tick duration in seconds.
+        :param move_package_tick: float, multiplier for package movement ticks.
+        :param move_truck_tick: float, multiplier for truck movement ticks.
+        :param create_package_tick: float, multiplier for package creation ticks.
+        :param spawn_profile: SpawnProfile | None, pace of the package creation,
+            by default ``create_package_tick`` until the first package moved
+            and then :func:`spread_curve` over the belts of the difficulty.
+        """
+        self.game = game
+        self.selected_difficulty = selected_difficulty
+        self.tick_second = float(tick_second)
+        self.move_package_tick = float(move_package_tick)
+        self.move_truck_tick = float(move_truck_tick)
+        # Difficulty values are constant during a game, reading them once is enough
+        self._difficulty_values = selected_difficulty.difficulty_values()
+
+        now = self.clock.now()
+        if spawn_profile is None:
+            spawn_profile = SpawnProfile(
+                create_package_tick,
+                spread_curve(self.move_package_tick, self._difficulty_values["belts"]),
+            )
+        self.spawn_scheduler = SpawnScheduler(
+            game, spawn_profile, self.tick_second, now
+        )
+        self.create_package_tick = float(create_package_tick)
+        game.spawn_scheduler = self.spawn_scheduler
+        self.rules = RulesEngine()
+        self.rules.add(
+            GameEvent.SCORE,
+            partial(ramp_up_packages, game, self._difficulty_values["increase"]),
+        )
+        self.rules.add(GameEvent.DELIVERIES | GameEvent.LIVES, self._regenerate_life)
+        self.rules.add(GameEvent.TRUCK, self._unload_full_truck)
+        game.rules = self.rules
+        self._game_starts_at = now
+        self._taking_a_break_until = now
+        self._last_move_package_time = now
+        self._last_move_truck_time = now
+        self._has_lost_at = now
+        self.has_lost = False
+        self.life_regenerated = False
+        self.truck_unloaded = False
+        self.reschedule_timers()
+
+    @property
+    def clock(self) -> Clock:
+        """Returns the clock of the game.
+
+        :return: Clock, the source of the game time.
+        """
+        return self.game.clock
+
+    @property
+    def create_package_tick(self) -> float:
+        """Returns the tick factor of the package creation.
+
+        :return: float, the current period of the spawn scheduler.
+        """
+        return self.spawn_scheduler.period
+
+    @create_package_tick.setter
+    def create_package_tick(self, create_package_tick: float) -> None:
+        """Sets the tick factor of the package creation.
+
+        Call :meth:`reschedule_timers` afterwards to apply it.
+
+        :param create_package_tick: float, the new period of the spawn scheduler.
+        """
+        self.spawn_scheduler.period = float(create_package_tick)
+
+    @property
+    def timers(self) -> tuple[float, ...]:
+        """Returns the game times the rules are measured from.
+
+        :return: tuple[float, ...], start of the game, end of the break, last
+            package creation, last package move, last truck move and the
+            moment the game was lost.
+        """
+        return (
+            self._game_starts_at,
+            self._taking_a_break_until,
+            self.spawn_scheduler.last_spawn_time,
+            self._last_move_package_time,
+            self._last_move_truck_time,
+            self._has_lost_at,
+        )
+
+    @timers.setter
+    def timers(self, timers: tuple[float, ...]) -> None:
+        """Sets the game times the rules are measured from.
+
+        Call :meth:`reschedule_timers` once the rest of the game is restored.
+
+        :param timers: tuple[float, ...], six times in the order of the getter.
+        :raises ValueError: if there are not exactly six times.
+        """
+        if len(timers) != 6:
+            raise ValueError("timers must contain six times")
+        (
+            self._game_starts_at,
+            self._taking_a_break_until,
+            self.spawn_scheduler.last_spawn_time,
+            self._last_move_package_time,
+            self._last_move_truck_time,
+            self._has_lost_at,
+        ) = (float(timer) for timer in timers)
+
+    @property
+    def is_taking_a_break(self) -> bool:
+        """Returns whether the players rest while the truck is away.
+
+        :return: bool, True during the break.
+        """
+        return self._taking_a_break_until > self.clock.now()
+
+    @property
+    def accepts_input(self) -> bool:
+        """Returns whether the players can currently be moved.
+
+        :return: bool, True when not on a break and not lost.
+        """
+        return self._taking_a_break_until < self.clock.now() and not self.has_lost
+
+    @property
+    def is_over(self) -> bool:
+        """Returns whether the game over screen should be shown.
+
+        :return: bool, True a moment after the players lost.
+        """
+        return self.has_lost and self._is_over
+
+    @property
+    def seconds_alive(self) -> int:
+        """Returns how long the players survived.
+
+        :return: int, seconds from the start until the game was lost.
+        """
+        return int(self.clock.now() - self._game_starts_at - 1.6)
+
+    def reschedule_timers(self) -> None:
+        """Schedules the timers of every pending deadline from scratch.
+
+        Called when the session starts and after its times or the game were
+        restored, e.g. from a snapshot.
+        """
+        game = self.game
+        clock = self.clock
+        now = clock.now()
+        self._timer_wheel = TimerWheel(
+            now, clock.step if isinstance(clock, FixedStepClock) else 1 / 60
+        )
+        self._boss_leaving_timer: Timer | None = None
+        self._boss_leaving_due = False
+        self._put_down_timers: list[Timer | None] = [None] * len(game.players)
+        self._put_down_due = [False] * len(game.players)
+        self._move_packages_due = False
+        self._move_truck_due = False
+        self._is_over = self.has_lost and self._has_lost_at + 1.6 < now
+
+        if self._taking_a_break_until > now or any(
+            player.is_resting for player in game.players
+        ):
+            self._schedule_break(now)
+        if game.door is not None and game.door.is_open:
+            self._schedule_boss_leaving()
+        if self.has_lost and not self._is_over:
+            self._timer_wheel.schedule(self._has_lost_at + 1.6, self._end_game)
+        for index, player in enumerate(game.players):
+            if player.is_moving_package:
+                self._schedule_put_down(index)
+        self._schedule_package_move()
+        self._schedule_truck_move()
+        self.spawn_scheduler.reschedule(self._timer_wheel, now)
+        # The restored game may meet any rule
+        self.rules.notify(GameEvent.ALL)
+
+    def update(self) -> None:
+        """Runs one tick of the game rules at the current clock time."""
+        game = self.game
+        now = self.clock.now()
+        rules = self.rules
+
+        # Packages of the previous tick were already picked up by the renderer
+        game.newly_created_packages.clear()
+
+        # Increases the minimum number of packages at play and regenerates lives
+        if rules.pending:
+            rules.apply(GameEvent.SCORE | GameEvent.DELIVERIES | GameEvent.LIVES)
+
+        # Fires the timers: players rest during the truck break and the boss
+        # checks on them afterwards, the other rules are marked as due
+        self._timer_wheel.advance(now)
+
+        # Boss visits
+        if game.door is not None:
+            boss = game.door.boss
+            if game.boss_comes_in:
+                game.door.is_open = True
+                boss.comes_in_time = now
+                game.boss_comes_in = False
+                self._schedule_boss_leaving()
+            if self._boss_leaving_due:
+                self._boss_leaving_due = False
+                if game.door.is_open and boss.comes_in_time + 1.5 < now:
+                    game.door.is_open = False
+                    boss.has_to_leave = True
+                elif game.door.is_open:
+                    self._schedule_boss_leaving()
+
+        # Checks if the Truck is full
+        if rules.pending & GameEvent.TRUCK:
+            rules.apply(GameEvent.TRUCK)
+
+        # Marks the game as lost
+        if game.live_amount <= 0 and not self.has_lost:
+            self._has_lost_at = now
+            self.has_lost = True
+            self._timer_wheel.schedule(self._has_lost_at + 1.6, self._end_game)
+
+        # Only works while the game is not taking a break
+        if self._taking_a_break_until < now and not self.has_lost:
+            # Player puts down a package
+            for index, player in enumerate(game.players):
+                if self._put_down_due[index]:
+                    self._put_down_due[index] = False
+                    if (
+                        player.is_moving_package
+                        and player.package_picked_up_at + self.move_package_tick * 3
+                        <= now
+                    ):
+                        player.is_moving_package = False
+                        player.sprite_to_be_changed = True
+                        game.player_put_down_package(player)
+                    elif player.is_moving_package:
+                        self._schedule_put_down(index)
+
+            # Moves all packages
+            if self._move_packages_due:
+                self._move_packages_due = False
+                if (
+                    now - self._last_move_package_time
+                    >= self.tick_second * self.move_package_tick
+                ):
+                    self._last_move_package_time = now
+                    game.move_packages()
+                    for index, player in enumerate(game.players):
+                        if (
+                            player.is_moving_package
+                            and self._put_down_timers[index] is None
+                            and not self._put_down_due[index]
+                        ):
+                            self._schedule_put_down(index)
+                self._schedule_package_move()
+
+            # Creates packages, only looked at when they may be due
+            if self.spawn_scheduler.pending:
+                self.spawn_scheduler.update(now)
+
+        # Moves the Truck
+        elif self._move_truck_due and not game.truck.has_returned and not self.has_lost:
+            self._move_truck_due = False
+            if (
+                now - self._last_move_truck_time
+                >= self.tick_second * self.move_truck_tick
+            ):
+                self._last_move_truck_time = now
+                game.truck.truck_in_movement(game.original_truck_x)
+            self._schedule_truck_move()
+
+    def _regenerate_life(self) -> None:
+        """Regenerates a life for stored deliveries, see :func:`regenerate_life`."""
+        if regenerate_life(self.game, self._difficulty_values["eliminates"]):
+            self.life_regenerated = True
+
+    def _unload_full_truck(self) -> None:
+        """Sends the full truck away, rewards the players and gives them a break."""
+        game = self.game
+        if not game.truck.is_full():
+            return
+        now = self.clock.now()
+        game.package_put_in_truck = False
+        game.truck.has_returned = False
+        game.truck.sprite_to_be_changed_back = True
+        for package in game.truck.packages:
+            package.offscreen = True
+        game.truck.packages = []
+        self.truck_unloaded = True
+        self._taking_a_break_until = now + 8
+        self._schedule_break(now)
+        self.spawn_scheduler.postpone(8, now)
+        game.points += 10
+        if game.stored_deliveries < 9 and self._difficulty_values["eliminates"] != 0:
+            game.stored_deliveries += 1
+            game.deliveries_to_be_updated = True
+        game.points_to_be_updated = True
+
+    def _schedule_break(self, now: float) -> None:
+        """Schedules the start of the rest on the next tick and its end.
+
+        :param now: float, the current game time.
+        """
+        self._timer_wheel.schedule(now, self._start_resting)
+        self._timer_wheel.schedule(self._taking_a_break_until, self._end_break)
+
+    def _start_resting(self, now: float) -> None:
+        """Makes the players rest while the truck is away.
+
+        :param now: float, the current game time.
+        """
+        if self._taking_a_break_until > now:
+            for player in self.game.players:
+                if not player.is_resting:
+                    player.is_resting = True
+
+    def _end_break(self, now: float) -> None:
+        """Wakes the players up at the end of the break and calls the boss.
+
+        :param now: float, the current game time.
+        """
+        if not self._taking_a_break_until < now:
+            self._timer_wheel.schedule(self._taking_a_break_until, self._end_break)
+            return
+        for player in self.game.players:
+            if player.is_resting:
+                player.is_resting = False
+                self.game.boss_comes_in = True
+
+    def _schedule_boss_leaving(self) -> None:
+        """Schedules the boss to leave 1.5 seconds after coming in."""
+        door = self.game.door
+        if door is None:
+            return
+        self._timer_wheel.cancel(self._boss_leaving_timer)
+        self._boss_leaving_due = False
+        self._boss_leaving_timer = self._timer_wheel.schedule(
+            door.boss.comes_in_time + 1.5, self._boss_leaving_is_due
+        )
+
+    def _boss_leaving_is_due(self, now: float) -> None:
+        """Marks the boss as due to leave.
+
+        :param now: float, the current game time.
+        """
+        self._boss_leaving_timer = None
+        self._boss_leaving_due = True
+
+    def _end_game(self, now: float) -> None:
+        """Shows the game over screen a moment after the players lost.
+
+        :param now: float, the current game time.
+        """
+        if self._has_lost_at + 1.6 < now:
+            self._is_over = True
+        else:
+            self._timer_wheel.schedule(self._has_lost_at + 1.6, self._end_game)
+
+    def _schedule_put_down(self, index: int) -> None:
+        """Schedules a player to put down the package they carry.
+
+        :param index: int, index of the player in the game.
+        """
+        player = self.game.players[index]
+        self._put_down_timers[index] = self._timer_wheel.schedule(
+            player.package_picked_up_at + self.move_package_tick * 3,
+            partial(self._put_down_is_due, index),
+        )
+
+    def _put_down_is_due(self, index: int, now: float) -> None:
+        """Marks a player as due to put down their package.
+
+        :param index: int, index of the player in the game.
+        :param now: float, the current game time.
+        """
+        self._put_down_timers[index] = None
+        self._put_down_due[index] = True
+
+    def _schedule_package_move(self) -> None:
+        """Schedules the next move of the packages."""
+        self._timer_wheel.schedule(
+            self._last_move_package_time + self.tick_second * self.move_package_tick,
+            self._package_move_is_due,
+        )
+
+    def _package_move_is_due(self, now: float) -> None:
+        """Marks the packages as due to move.
+
+        :param now: float, the current game time.
+        """
+        self._move_packages_due = True
+
+    def _schedule_truck_move(self) -> None:
+        """Schedules the next move of the truck."""
+        self._timer_wheel.schedule(
+            self._last_move_truck_time + self.tick_second * self.move_truck_tick,
+            self._truck_move_is_due,
+        )
+
+    def _truck_move_is_due(self, now: float) -> None:
+        """Marks the truck as due to move.
+
+        :param now: float, the current game time.
+        """
+        self._move_truck_due = True
@@ -0,0 +1,402 @@
+"""Compact, versioned binary snapshots of a running game.
+
+A snapshot stores the dynamic state of a :class:`Game` (packages with their
+stage and state, conveyors, players and their floors, the truck and its
+load, the boss and the door, counters and flags) and, optionally, the
+timers of its :class:`GameSession`. The static layout (floors, conveyor
+geometry, wiring) is not stored: a snapshot is restored into a freshly
+built game of the same difficulty, which keeps it small and fast to load.
+
+Times are stored together with the clock time of the snapshot and shifted
+by the difference with the clock of the restored game, so a snapshot can
+resume on a wall clock as well as on a fixed-step clock.
+"""
+
+import struct
+
+from game.domain.clock import FixedStepClock
+from game.domain.game import Game
+from game.domain.package import Package, PackageState
+from game.domain.session import GameSession
+
+MAGIC = b"MBSN"
+VERSION = 1
+NO_DIFFICULTY = 0xFF
+NO_PACKAGE = 0xFFFF
+
+_HEADER = struct.Struct("<4sBBBBBdQ")
+_GAME = struct.Struct("<BIHIHhB")
+_SESSION = struct.Struct("<7dB")
+_PACKAGE = struct.Struct("<hhHHBBBBB")
+_CONVEYOR = struct.Struct("<dHH")
+_PLAYER = struct.Struct("<BHdB")
+_TRUCK = struct.Struct("<hdB")
+_DOOR = struct.Struct("<dB")
+_COUNT = struct.Struct("<H")
+
+_STATES = tuple(PackageState)
+_STATE_CODES = {state: code for code, state in enumerate(_STATES)}
+
+
+def _flags(*values: bool) -> int:
+    """Packs booleans into a bit field, the first value being bit 0.
+
+    :param values: bool, the flags to pack.
+    :return: int, the bit field.
+    """
+    bits = 0
+    for index, value in enumerate(values):
+        if value:
+            bits |= 1 << index
+    return bits
+
+
+def _flag(bits: int, index: int) -> bool:
+    """Reads one flag of a bit field.
+
+    :param bits: int, the bit field.
+    :param index: int, the bit to read.
+    :return: bool, the value of the flag.
+    """
+    return bool(bits >> index & 1)
+
+
+def packages_of(game: Game) -> list[Package]:
+    """Lists every package still referenced by the game, without duplicates.
+
+    :param game: Game, the game to inspect.
+    :return: list[Package], packages in a stable order.
+    """
+    packages: list[Package] = []
+    indices: set[int] = set()
+
+    def add(package: Package | None) -> None:
+        if package is not None and id(package) not in indices:
+            indices.add(id(package))
+            packages.append(package)
+
+    for conveyor in game.conveyors:
+        for package in conveyor.packages:
+            add(package)
+        for package in conveyor.falling_packages:
+            add(package)
+    for player in game.players:
+        add(player.package)
+    for package in game.truck.packages:
+        add(package)
+    for package in game.newly_created_packages:
+        add(package)
+    return packages
+
+
+def _pack_indices(
+    buffer: bytearray, packages: list[Package], index_of: dict[int, int]
+) -> None:
+    """Appends a count followed by the indices of the given packages.
+
+    :param buffer: bytearray, the destination buffer.
+    :param packages: list[Package], the referenced packages.
+    :param index_of: dict mapping ``id(package)`` to its index in the table.
+    """
+    buffer += _COUNT.pack(len(packages))
+    buffer += struct.pack(
+        f"<{len(packages)}H", *(index_of[id(package)] for package in packages)
+    )
+
+
+def _unpack_indices(
+    data: bytes | memoryview, offset: int, packages: list[Package]
+) -> tuple[list[Package], int]:
+    """Reads a list written by :func:`_pack_indices`.
+
+    :param data: bytes | memoryview, the snapshot.
+    :param offset: int, position of the count.
+    :param packages: list[Package], the restored package table.
+    :return: tuple of the referenced packages and the offset after them.
+    """
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    indices = struct.unpack_from(f"<{count}H", data, offset)
+    return [packages[index] for index in indices], offset + 2 * count
+
+
+def take_snapshot(game: Game, session: GameSession | None = None) -> bytes:
+    """Encodes the dynamic state of a game and, optionally, of its session.
+
+    :param game: Game, the game to encode.
+    :param session: GameSession | None, the session running the game, if any.
+    :return: bytes, the snapshot.
+    """
+    clock = game.clock
+    now = clock.now()
+    ticks = clock.ticks if isinstance(clock, FixedStepClock) else 0
+    difficulty = (
+        session.selected_difficulty.difficulty if session is not None else NO_DIFFICULTY
+    )
+    buffer = bytearray(
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            difficulty,
+            len(game.conveyors),
+            len(game.players),
+            _flags(session is not None, game.door is not None),
+            now,
+            ticks,
+        )
+    )
+    buffer += _GAME.pack(
+        game.live_amount,
+        game.points,
+        game.stored_deliveries,
+        game.minimum_number_packages,
+        game.packages_at_play,
+        game.original_truck_x,
+        _flags(
+            game.first_package_moved,
+            game.points_to_be_updated,
+            game.lives_to_be_updated,
+            game.deliveries_to_be_updated,
+            game.boss_comes_in,
+            game.package_changes_conveyor,
+            game.package_put_in_truck,
+        ),
+    )
+    if session is not None:
+        buffer += _SESSION.pack(
+            *session.timers,
+            session.create_package_tick,
+            _flags(session.has_lost, session.life_regenerated, session.truck_unloaded),
+        )
+
+    packages = packages_of(game)
+    index_of = {id(package): index for index, package in enumerate(packages)}
+    buffer += _COUNT.pack(len(packages))
+    for package in packages:
+        buffer += _PACKAGE.pack(
+            package.x,
+            package.y,
+            package.length,
+            package.height,
+            _STATE_CODES[package.state],
+            package.stage,
+            package.stage_to_be_changed_to,
+            package.state_to_be_changed_to,
+            package.offscreen,
+        )
+
+    for conveyor in game.conveyors:
+        buffer += _CONVEYOR.pack(
+            conveyor.velocity,
+            len(conveyor.packages),
+            len(conveyor.falling_packages),
+        )
+        buffer += struct.pack(
+            f"<{len(conveyor.packages) + len(conveyor.falling_packages)}H",
+            *(
+                index_of[id(package)]
+                for package in (*conveyor.packages, *conveyor.falling_packages)
+            ),
+        )
+
+    for player in game.players:
+        floors = game.players_positions[player]
+        floor_index = next(
+            index for index, floor in enumerate(floors) if floor.player is player
+        )
+        buffer += _PLAYER.pack(
+            floor_index,
+            index_of[id(player.package)] if player.package is not None else NO_PACKAGE,
+            player.package_picked_up_at,
+            _flags(
+                player.is_moving_package,
+                player.sprite_to_be_changed,
+                player.on_the_factory_level,
+                player.is_resting,
+            ),
+        )
+
+    truck = game.truck
+    buffer += _TRUCK.pack(
+        truck.x,
+        truck.velocity,
+        _flags(truck.sprite_to_be_changed_back, truck.has_returned, truck.has_turned),
+    )
+    _pack_indices(buffer, truck.packages, index_of)
+
+    if game.door is not None:
+        buffer += _DOOR.pack(
+            game.door.boss.comes_in_time,
+            _flags(game.door.is_open, game.door.boss.has_to_leave),
+        )
+
+    _pack_indices(buffer, game.newly_created_packages, index_of)
+    return bytes(buffer)
+
+
+def snapshot_difficulty(data: bytes | memoryview) -> int | None:
+    """Reads the difficulty of the game stored in a snapshot.
+
+    :param data: bytes | memoryview, the snapshot.
+    :return: int | None, the difficulty level, or None if no session was stored.
+    :raises ValueError: if the data is not a snapshot of a known version.
+    """
+    difficulty = _read_header(data)[2]
+    return None if difficulty == NO_DIFFICULTY else difficulty
+
+
+def snapshot_ticks(data: bytes | memoryview) -> int:
+    """Reads the fixed-step clock tick at which a snapshot was taken.
+
+    :param data: bytes | memoryview, the snapshot.
+    :return: int, the tick, 0 if the game did not run on a fixed-step clock.
+    :raises ValueError: if the data is not a snapshot of a known version.
+    """
+    return _read_header(data)[7]
+
+
+def _read_header(data: bytes | memoryview) -> tuple:
+    """Decodes and checks the header of a snapshot.
+
+    :param data: bytes | memoryview, the snapshot.
+    :return: tuple, the header fields.
+    :raises ValueError: if the data is not a snapshot of a known version.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("data is too short to be a game snapshot")
+    header = _HEADER.unpack_from(data)
+    if header[0] != MAGIC:
+        raise ValueError("data is not a game snapshot")
+    if header[1] != VERSION:
+        raise ValueError(f"unsupported game snapshot version {header[1]}")
+    return header
+
+
+def restore_snapshot(
+    data: bytes | memoryview, game: Game, session: GameSession | None = None
+) -> None:
+    """Restores a snapshot into a game built with the same layout.
+
+    A fixed-step clock is moved to the tick of the snapshot. Stored times
+    are shifted by the difference between the clock of the game and the
+    clock time of the snapshot.
+
+    :param data: bytes | memoryview, a snapshot made by :func:`take_snapshot`.
+    :param game: Game, a game of the same difficulty as the snapshot.
+    :param session: GameSession | None, the session of the game; its timers are
+        restored when the snapshot contains them.
+    :raises ValueError: if the data is not a snapshot or the layout differs.
+    """
+    (
+        _,
+        _,
+        _,
+        conveyor_count,
+        player_count,
+        contents,
+        saved_now,
+        ticks,
+    ) = _read_header(data)
+    if conveyor_count != len(game.conveyors) or player_count != len(game.players):
+        raise ValueError("snapshot does not match the layout of the game")
+    if _flag(contents, 1) != (game.door is not None):
+        raise ValueError("snapshot does not match the layout of the game")
+    offset = _HEADER.size
+
+    clock = game.clock
+    if isinstance(clock, FixedStepClock):
+        clock.ticks = ticks
+    shift = clock.now() - saved_now
+
+    (
+        game.live_amount,
+        game.points,
+        game.stored_deliveries,
+        game.minimum_number_packages,
+        game.packages_at_play,
+        game.original_truck_x,
+        bits,
+    ) = _GAME.unpack_from(data, offset)
+    offset += _GAME.size
+    game.first_package_moved = _flag(bits, 0)
+    game.points_to_be_updated = _flag(bits, 1)
+    game.lives_to_be_updated = _flag(bits, 2)
+    game.deliveries_to_be_updated = _flag(bits, 3)
+    game.boss_comes_in = _flag(bits, 4)
+    game.package_changes_conveyor = _flag(bits, 5)
+    game.package_put_in_truck = _flag(bits, 6)
+
+    if _flag(contents, 0):
+        values = _SESSION.unpack_from(data, offset)
+        offset += _SESSION.size
+        if session is not None:
+            session.timers = tuple(value + shift for value in values[:6])
+            session.create_package_tick = values[6]
+            session.has_lost = _flag(values[7], 0)
+            session.life_regenerated = _flag(values[7], 1)
+            session.truck_unloaded = _flag(values[7], 2)
+
+    (package_count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    packages = []
+    for _ in range(package_count):
+        x, y, length, height, state, stage, stage_to, state_to, offscreen = (
+            _PACKAGE.unpack_from(data, offset)
+        )
+        offset += _PACKAGE.size
+        package = Package(x, y, length, height, _STATES[state], stage)
+        package.stage_to_be_changed_to = stage_to
+        package.state_to_be_changed_to = state_to
+        package.offscreen = bool(offscreen)
+        packages.append(package)
+
+    for conveyor in game.conveyors:
+        velocity, on_belt, falling = _CONVEYOR.unpack_from(data, offset)
+        offset += _CONVEYOR.size
+        conveyor.velocity = velocity
+        indices = struct.unpack_from(f"<{on_belt + falling}H", data, offset)
+        offset += 2 * (on_belt + falling)
+        conveyor.packages = [packages[index] for index in indices[:on_belt]]
+        conveyor.falling_packages = [packages[index] for index in indices[on_belt:]]
+
+    for player in game.players:
+        floor_index, package_index, picked_up_at, bits = _PLAYER.unpack_from(
+            data, offset
+        )
+        offset += _PLAYER.size
+        floors = game.players_positions[player]
+        for floor in floors:
+            if floor.player is player:
+                floor.player = None
+        floors[floor_index].player = player
+        player.package = None
+        player.move(floors[floor_index].x, floors[floor_index].y)
+        player.package = (
+            packages[package_index] if package_index != NO_PACKAGE else None
+        )
+        player.package_picked_up_at = picked_up_at + shift
+        player.is_moving_package = _flag(bits, 0)
+        player.sprite_to_be_changed = _flag(bits, 1)
+        player.on_the_factory_level = _flag(bits, 2)
+        player.is_resting = _flag(bits, 3)
+
+    truck = game.truck
+    truck.x, truck.velocity, bits = _TRUCK.unpack_from(data, offset)
+    offset += _TRUCK.size
+    truck.sprite_to_be_changed_back = _flag(bits, 0)
+    truck.has_returned = _flag(bits, 1)
+    truck.has_turned = _flag(bits, 2)
+    truck.packages, offset = _unpack_indices(data, offset, packages)
+
+    if game.door is not None:
+        comes_in_time, bits = _DOOR.unpack_from(data, offset)
+        offset += _DOOR.size
+        game.door.boss.comes_in_time = max(comes_in_time + shift, 0.0)
+        game.door.is_open = _flag(bits, 0)
+        game.door.boss.has_to_leave = _flag(bits, 1)
+
+    game.newly_created_packages, offset = _unpack_indices(data, offset, packages)
+
+    # The deadlines of the session depend on the whole restored game
+    if session is not None:
+        session.reschedule_timers()
@@ -0,0 +1,302 @@
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING
+
+from game.domain.timer_wheel import Timer, TimerWheel
+
+if TYPE_CHECKING:
+    from game.domain.game import Game
+
+
+def spread_curve(move_package_tick: float, belts: int) -> Callable[[int], float]:
+    """Builds the default rate curve of the package creation.
+
+    The time a package needs to cross every belt is shared between the
+    packages that must be at play, so the creations speed up as the minimum
+    number of packages grows.
+
+    :param move_package_tick: float, tick factor of the package movement.
+    :param belts: int, number of belts a package crosses.
+    :return: Callable[[int], float], the ticks between creations for a
+        minimum number of packages.
+    """
+
+    def period(minimum_number_packages: int) -> float:
+        return (move_package_tick * 100) * (belts / (minimum_number_packages + 1))
+
+    return period
+
+
+def interpolated_curve(points: Sequence[tuple[int, float]]) -> Callable[[int], float]:
+    """Builds a rate curve through given points.
+
+    The periods between two points are interpolated linearly, and the first
+    and last periods hold before and after the points.
+
+    :param points: Sequence[tuple[int, float]], minimum number of packages
+        and ticks between creations at that minimum.
+    :return: Callable[[int], float], the ticks between creations for a
+        minimum number of packages.
+    :raises ValueError: if there are no points or a period is not positive.
+    """
+    if not points:
+        raise ValueError("a rate curve needs at least one point")
+    if any(period <= 0 for _, period in points):
+        raise ValueError("periods must be strictly greater than 0")
+    ordered = sorted(points)
+
+    def period(minimum_number_packages: int) -> float:
+        if minimum_number_packages <= ordered[0][0]:
+            return ordered[0][1]
+        for (left, left_period), (right, right_period) in zip(ordered, ordered[1:]):
+            if minimum_number_packages <= right:
+                share = (minimum_number_packages - left) / (right - left)
+                return left_period + (right_period - left_period) * share
+        return ordered[-1][1]
+
+    return period
+
+
+class SpawnProfile:
+    """Pace of the package creation.
+
+    Periods are read from the curve once per minimum number of packages and
+    kept, so a curve may be as costly as needed.
+
+    Attributes:
+        opening_period (float): Ticks between creations until the first
+            package moved to another conveyor. Must be > 0.
+        curve (Callable[[int], float]): Ticks between creations for a minimum
+            number of packages, e.g. :func:`spread_curve`.
+        burst (int): Packages created in a row at every creation. Must be > 0.
+        burst_gap (float): Ticks between the packages of a burst. Must be > 0.
+    """
+
+    def __init__(
+        self,
+        opening_period: float,
+        curve: Callable[[int], float],
+        burst: int = 1,
+        burst_gap: float = 0.5,
+    ) -> None:
+        """Initializes a profile.
+
+        :param opening_period: float, ticks between the first creations, must be > 0.
+        :param curve: Callable[[int], float], ticks between creations for a
+            minimum number of packages.
+        :param burst: int, packages created in a row at every creation, must be > 0.
+        :param burst_gap: float, ticks between the packages of a burst, must be > 0.
+        :raises TypeError: if burst is not an int.
+        :raises ValueError: if opening_period, burst or burst_gap is not positive.
+        """
+        self.opening_period = opening_period
+        self.curve = curve
+        self.burst = burst
+        self.burst_gap = burst_gap
+        self.__periods: dict[int, float] = {}
+
+    @property
+    def opening_period(self) -> float:
+        """Returns the ticks between creations before the first package moved.
+
+        :return: float, the opening period (> 0).
+        """
+        return self.__opening_period
+
+    @opening_period.setter
+    def opening_period(self, opening_period: float) -> None:
+        """Sets the ticks between creations before the first package moved.
+
+        :param opening_period: float, the opening period. Must be > 0.
+        :raises ValueError: if opening_period is not strictly positive.
+        """
+        if opening_period <= 0:
+            raise ValueError("opening_period must be strictly greater than 0")
+        self.__opening_period = float(opening_period)
+
+    @property
+    def burst(self) -> int:
+        """Returns the packages created in a row at every creation.
+
+        :return: int, the burst size (> 0).
+        """
+        return self.__burst
+
+    @burst.setter
+    def burst(self, burst: int) -> None:
+        """Sets the packages created in a row at every creation.
+
+        :param burst: int, the burst size. Must be > 0.
+        :raises TypeError: if burst is not an int.
+        :raises ValueError: if burst is not strictly positive.
+        """
+        if not isinstance(burst, int):
+            raise TypeError("burst must be an int")
+        if burst <= 0:
+            raise ValueError("burst must be strictly greater than 0")
+        self.__burst = burst
+
+    @property
+    def burst_gap(self) -> float:
+        """Returns the ticks between the packages of a burst.
+
+        :return: float, the gap (> 0).
+        """
+        return self.__burst_gap
+
+    @burst_gap.setter
+    def burst_gap(self, burst_gap: float) -> None:
+        """Sets the ticks between the packages of a burst.
+
+        :param burst_gap: float, the gap. Must be > 0.
+        :raises ValueError: if burst_gap is not strictly positive.
+        """
+        if burst_gap <= 0:
+            raise ValueError("burst_gap must be strictly greater than 0")
+        self.__burst_gap = float(burst_gap)
+
+    def period(self, minimum_number_packages: int) -> float:
+        """Returns the ticks between creations for a minimum number of packages.
+
+        :param minimum_number_packages: int, the minimum number of packages at play.
+        :return: float, the period read from the curve.
+        """
+        period = self.__periods.get(minimum_number_packages)
+        if period is None:
+            period = self.curve(minimum_number_packages)
+            self.__periods[minimum_number_packages] = period
+        return period
+
+
+class SpawnScheduler:
+    """Creates the packages of a game when they are due.
+
+    A creation is due once ``period`` ticks passed since the last one while
+    fewer than ``minimum_number_packages + 1`` packages are at play, or right
+    away when fewer than ``minimum_number_packages`` are at play after the
+    first package moved. The next ``burst - 1`` creations of the profile
+    follow every ``burst_gap`` ticks whatever the number of packages at play.
+
+    The game notifies :meth:`inputs_changed` when its packages at play, their
+    minimum or the first move change, and a timer of the wheel fires when the
+    period elapsed; :meth:`update` returns at once on every other tick. The
+    progress of a burst is not part of the snapshots.
+
+    Attributes:
+        game (Game): The game the packages are created in.
+        profile (SpawnProfile): Pace of the creations.
+        tick_second (float): Seconds per tick of the period.
+        period (float): Current ticks between creations.
+        last_spawn_time (float): Game time of the last creation.
+        pending (bool): True when :meth:`update` has something to check.
+    """
+
+    def __init__(
+        self,
+        game: "Game",
+        profile: SpawnProfile,
+        tick_second: float,
+        now: float,
+    ) -> None:
+        """Initializes a scheduler whose first creation is one opening period away.
+
+        Call :meth:`reschedule` with the timer wheel of the session before
+        the first update.
+
+        :param game: Game, the game the packages are created in.
+        :param profile: SpawnProfile, pace of the creations.
+        :param tick_second: float, seconds per tick of the period.
+        :param now: float, the current game time.
+        """
+        self.game = game
+        self.profile = profile
+        self.tick_second = float(tick_second)
+        self.period = profile.opening_period
+        self.last_spawn_time = now
+        self.pending = True
+        self._timer_wheel: TimerWheel | None = None
+        self._timer: Timer | None = None
+        self._due = False
+        self._burst_left = 0
+
+    def reschedule(self, timer_wheel: TimerWheel, now: float) -> None:
+        """Schedules the next creation on a new timer wheel.
+
+        :param timer_wheel: TimerWheel, the wheel of the session.
+        :param now: float, the current game time.
+        """
+        self._timer_wheel = timer_wheel
+        self._timer = None
+        self._schedule(now)
+        self.pending = True
+
+    def postpone(self, seconds: float, now: float) -> None:
+        """Delays the next creation, e.g. during a break.
+
+        :param seconds: float, the delay in seconds.
+        :param now: float, the current game time.
+        """
+        self.last_spawn_time += seconds
+        self._schedule(now)
+
+    def inputs_changed(self) -> None:
+        """Notes that the packages at play, the minimum or the first move changed."""
+        self.pending = True
+
+    def update(self, now: float) -> bool:
+        """Creates the packages that are due.
+
+        :param now: float, the current game time.
+        :return: bool, True if packages were created.
+        """
+        if not self.pending:
+            return False
+        self.pending = False
+        game = self.game
+        minimum = game.minimum_number_packages
+        if game.first_package_moved:
+            period = self.profile.period(minimum)
+            if period != self.period:
+                self.period = period
+                self._schedule(now)
+        packages_at_play = game.packages_at_play
+        if (
+            (packages_at_play < minimum + 1 and self._due)
+            or (packages_at_play < minimum and game.first_package_moved)
+            or (self._burst_left and self._due)
+        ):
+            self.last_spawn_time = now
+            game.create_package()
+            if self._burst_left:
+                self._burst_left -= 1
+            else:
+                self._burst_left = self.profile.burst - 1
+            self._schedule(now)
+            return True
+        return False
+
+    def _schedule(self, now: float) -> None:
+        """Schedules the next creation, e.g. after its timing changed.
+
+        :param now: float, the current game time.
+        """
+        timer_wheel = self._timer_wheel
+        if timer_wheel is None:
+            return
+        timer_wheel.cancel(self._timer)
+        self._timer = None
+        period = self.profile.burst_gap if self._burst_left else self.period
+        deadline = self.last_spawn_time + self.tick_second * period
+        # Already due when the new timing makes the creation late
+        self._due = now - self.last_spawn_time >= self.tick_second * period
+        if self._due:
+            self.pending = True
+        else:
+            self._timer = timer_wheel.schedule(deadline, self._creation_is_due)
+
+    def _creation_is_due(self, now: float) -> None:
+        """Marks a creation as due, if its time really came.
+
+        :param now: float, the current game time.
+        """
+        self._timer = None
+        self._schedule(now)
@@ -0,0 +1,187 @@
+import struct
+from collections.abc import Sequence
+
+from game.domain.elements import Element
+from game.domain.game import Game
+from game.domain.package import Package, PackageState
+from game.domain.player import Player
+from game.domain.snapshot import packages_of
+from game.domain.truck import Truck
+
+_MASK = (1 << 64) - 1
+_STATE_CODES = {state: code for code, state in enumerate(PackageState)}
+
+# Kinds of contributions
+_PACKAGE = 1
+_PLAYER = 2
+_TRUCK = 3
+_GAME = 4
+
+_HEADER = struct.Struct("<4sII")
+_MAGIC = b"MBSH"
+
+
+def _mix(*values: int) -> int:
+    """Hashes integers into 64 bits with the SplitMix64 finalizer.
+
+    :param values: int, the values, in order.
+    :return: int, the 64-bit hash.
+    """
+    result = 0
+    for value in values:
+        result = (result + (value & _MASK) + 0x9E3779B97F4A7C15) & _MASK
+        result = ((result ^ (result >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+        result = ((result ^ (result >> 27)) * 0x94D049BB133111EB) & _MASK
+        result ^= result >> 31
+    return result
+
+
+def _contribution(element: Element | Game, player_indices: dict[int, int]) -> int:
+    """Returns the part of the hash of one object.
+
+    :param element: Element | Game, a package, player, truck or game.
+    :param player_indices: dict mapping ``id(player)`` to its index in the game.
+    :return: int, its contribution.
+    :raises TypeError: if the object is not hashed.
+    """
+    if isinstance(element, Package):
+        return _mix(
+            _PACKAGE, element.x, element.y, element.stage, _STATE_CODES[element.state]
+        )
+    if isinstance(element, Player):
+        return _mix(_PLAYER, player_indices[id(element)], element.x, element.y)
+    if isinstance(element, Truck):
+        return _mix(_TRUCK, element.x)
+    if isinstance(element, Game):
+        return _mix(_GAME, element.points, element.live_amount)
+    raise TypeError(f"{type(element).__name__} is not part of the state hash")
+
+
+def _hashed_elements(game: Game) -> list[Element | Game]:
+    """Lists the objects whose fields are hashed.
+
+    :param game: Game, the hashed game.
+    :return: list of the game, its players, its truck and its packages.
+    """
+    return [game, *game.players, game.truck, *packages_of(game)]
+
+
+class StateHash:
+    """64-bit hash of a game, updated whenever a hashed field changes.
+
+    The hash covers the positions, stages and states of the packages in
+    play (including the ones in the truck), the positions of the players
+    (hence their floors), the truck position, the points and the lives.
+    It is the sum modulo 2**64 of one contribution per package, player,
+    truck and game: attaching sets ``state_hash`` on those objects, whose
+    setters then subtract the old contribution of the object and add the
+    new one. Sums do not depend on the order of the packages, so two games
+    in the same state have the same hash whatever their history, and
+    :func:`state_hash_of` computes the same value from scratch.
+
+    Packages created by the game are tracked by :meth:`Game.create_package`
+    and leave the hash when they are marked offscreen.
+
+    Attributes:
+        game (Game): The hashed game.
+        value (int): The current hash.
+    """
+
+    def __init__(self, game: Game) -> None:
+        """Attaches the hash to a game and all of its packages.
+
+        :param game: Game, the game to hash.
+        """
+        self.game = game
+        self._player_indices = {
+            id(player): index for index, player in enumerate(game.players)
+        }
+        self.value = 0
+        self.rebuild()
+
+    def add(self, element: Element | Game) -> None:
+        """Adds the contribution of an object, after it changed.
+
+        :param element: Element | Game, a package, player, truck or game.
+        """
+        contribution = _contribution(element, self._player_indices)
+        self.value = (self.value + contribution) & _MASK
+
+    def remove(self, element: Element | Game) -> None:
+        """Removes the contribution of an object, before it changes.
+
+        :param element: Element | Game, a package, player, truck or game.
+        """
+        contribution = _contribution(element, self._player_indices)
+        self.value = (self.value - contribution) & _MASK
+
+    def rebuild(self) -> None:
+        """Recomputes the hash from scratch, e.g. after restoring a snapshot."""
+        self.value = 0
+        for element in _hashed_elements(self.game):
+            element.state_hash = self
+            self.add(element)
+
+    def detach(self) -> None:
+        """Stops updating the hash."""
+        for element in _hashed_elements(self.game):
+            element.state_hash = None
+
+
+def state_hash_of(game: Game) -> int:
+    """Computes the hash of a game from scratch, without attaching to it.
+
+    :param game: Game, the game to hash.
+    :return: int, the value a :class:`StateHash` of the game would have.
+    """
+    player_indices = {id(player): index for index, player in enumerate(game.players)}
+    total = 0
+    for element in _hashed_elements(game):
+        total += _contribution(element, player_indices)
+    return total & _MASK
+
+
+def first_divergence(
+    expected: Sequence[int], actual: Sequence[int], first_tick: int = 1
+) -> int | None:
+    """Finds the first tick where two runs stopped matching.
+
+    :param expected: Sequence[int], the hashes of the reference run.
+    :param actual: Sequence[int], the hashes of the compared run.
+    :param first_tick: int, tick of the first hash of both sequences.
+    :return: int | None, the first tick with different hashes, or the first
+        tick missing from one of the runs, None if they are identical.
+    """
+    for index, (left, right) in enumerate(zip(expected, actual)):
+        if left != right:
+            return first_tick + index
+    if len(expected) != len(actual):
+        return first_tick + min(len(expected), len(actual))
+    return None
+
+
+def encode_hashes(first_tick: int, hashes: Sequence[int]) -> bytes:
+    """Encodes per-tick hashes to be compared with another run later.
+
+    :param first_tick: int, tick of the first hash.
+    :param hashes: Sequence[int], one hash per tick.
+    :return: bytes, a header followed by the hashes as 64-bit integers.
+    """
+    return _HEADER.pack(_MAGIC, first_tick, len(hashes)) + struct.pack(
+        f"<{len(hashes)}Q", *hashes
+    )
+
+
+def decode_hashes(data: bytes) -> tuple[int, list[int]]:
+    """Decodes hashes encoded by :func:`encode_hashes`.
+
+    :param data: bytes, the encoded hashes.
+    :return: tuple of the tick of the first hash and the hashes.
+    :raises ValueError: if the data does not hold hashes.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("data is too short to hold state hashes")
+    magic, first_tick, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or len(data) != _HEADER.size + 8 * count:
+        raise ValueError("data does not hold state hashes")
+    return first_tick, list(struct.unpack_from(f"<{count}Q", data, _HEADER.size))
@@ -0,0 +1,196 @@
+from collections.abc import Callable
+
+
+class Timer:
+    """Deadline registered in a :class:`TimerWheel`.
+
+    Attributes:
+        deadline (float): Game time when the callback is due, in seconds.
+        callback (Callable[[float], None]): Called with the game time once
+            the deadline is reached.
+        active (bool): False once the timer fired or was cancelled.
+    """
+
+    __slots__ = ("deadline", "callback", "active", "tick")
+
+    def __init__(self, deadline: float, callback: Callable[[float], None]) -> None:
+        """Initializes a timer that is not scheduled yet.
+
+        :param deadline: float, game time when the callback is due.
+        :param callback: Callable, called with the game time when it fires.
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.active = True
+        self.tick = 0
+
+
+class TimerWheel:
+    """Hierarchical timer wheel firing callbacks on the game clock.
+
+    Game time is cut into ticks of ``resolution`` seconds. The first level
+    has one slot per tick for the next ``slots`` ticks, and every further
+    level has slots spanning a whole turn of the level below; deadlines
+    beyond the last level wait in an overflow list. Advancing the wheel by
+    one tick empties one slot of the first level, and, once per turn, moves
+    the timers of one slot of a higher level down. The cost of a tick is
+    therefore independent of the number of pending timers, and scheduling
+    or cancelling a timer is O(1).
+
+    A timer is placed in the tick of a time slightly before its deadline, so
+    the rounding of the game time never makes it fire late: callbacks
+    compare the game time with the exact deadline themselves and schedule
+    again in the rare case they fired a tick early.
+
+    Attributes:
+        origin (float): Game time of tick 0.
+        resolution (float): Seconds per tick. Must be > 0.
+        slots (int): Slots per level. Must be >= 2.
+        levels (int): Number of levels. Must be >= 1.
+        tick (int): Last tick processed.
+    """
+
+    def __init__(
+        self,
+        origin: float,
+        resolution: float = 1 / 60,
+        slots: int = 64,
+        levels: int = 4,
+    ) -> None:
+        """Initializes an empty wheel starting at a game time.
+
+        :param origin: float, current game time.
+        :param resolution: float, seconds per tick. Must be > 0.
+        :param slots: int, slots per level. Must be >= 2.
+        :param levels: int, number of levels. Must be >= 1.
+        :raises ValueError: if a parameter is out of range.
+        """
+        if resolution <= 0:
+            raise ValueError("resolution must be strictly greater than 0")
+        if slots < 2:
+            raise ValueError("slots must be at least 2")
+        if levels < 1:
+            raise ValueError("levels must be at least 1")
+        self.origin = origin
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self.tick = 0
+        self._spans = [slots**level for level in range(levels + 1)]
+        self._wheels: list[list[list[Timer]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._overflow: list[Timer] = []
+        self._pending = 0
+
+    def __len__(self) -> int:
+        """Returns the number of timers that did not fire nor were cancelled.
+
+        :return: int, the pending timers.
+        """
+        return self._pending
+
+    def schedule(self, deadline: float, callback: Callable[[float], None]) -> Timer:
+        """Registers a callback due at a game time.
+
+        A deadline that already passed fires on the next tick.
+
+        :param deadline: float, game time when the callback is due.
+        :param callback: Callable, called with the game time when it fires.
+        :return: Timer, the handle used to cancel it.
+        """
+        timer = Timer(deadline, callback)
+        timer.tick = max(
+            self._tick_of(deadline - self.resolution / 1000), self.tick + 1
+        )
+        self._insert(timer)
+        self._pending += 1
+        return timer
+
+    def cancel(self, timer: Timer | None) -> None:
+        """Cancels a timer; cancelling a fired or cancelled timer does nothing.
+
+        :param timer: Timer | None, the timer, or None for no timer.
+        """
+        if timer is not None and timer.active:
+            # The timer stays in its slot until the slot is emptied
+            timer.active = False
+            self._pending -= 1
+
+    def advance(self, now: float) -> int:
+        """Fires the callbacks of every tick up to a game time, in order.
+
+        :param now: float, current game time, passed to the callbacks.
+        :return: int, number of callbacks fired.
+        """
+        # Inlined _tick_of: this runs on every tick of the game
+        target = int((now - self.origin) / self.resolution + 1e-6)
+        tick = self.tick
+        if target <= tick:
+            return 0
+        if not self._pending:
+            self.tick = target
+            return 0
+        fired = 0
+        slots = self.slots
+        first_level = self._wheels[0]
+        while tick < target:
+            tick += 1
+            self.tick = tick
+            index = tick % slots
+            if index == 0:
+                self._cascade(tick)
+            bucket = first_level[index]
+            if bucket:
+                first_level[index] = []
+                for timer in bucket:
+                    if timer.active:
+                        timer.active = False
+                        self._pending -= 1
+                        fired += 1
+                        timer.callback(now)
+        return fired
+
+    def _cascade(self, tick: int) -> None:
+        """Moves down the timers of the higher levels whose turn starts.
+
+        :param tick: int, a tick starting a turn of the first level.
+        """
+        level = 1
+        while level < self.levels and tick % self._spans[level] == 0:
+            level += 1
+        if level == self.levels and tick % self._spans[level] == 0:
+            overflow, self._overflow = self._overflow, []
+            for timer in overflow:
+                if timer.active:
+                    self._insert(timer)
+        for higher in range(level - 1, 0, -1):
+            index = (tick // self._spans[higher]) % self.slots
+            bucket = self._wheels[higher][index]
+            self._wheels[higher][index] = []
+            for timer in bucket:
+                if timer.active:
+                    self._insert(timer)
+
+    def _tick_of(self, time: float) -> int:
+        """Returns the tick containing a game time.
+
+        :param time: float, a game time, not before the origin.
+        :return: int, the tick number.
+        """
+        # The tolerance keeps a time that is a whole number of ticks in its
+        # own tick despite the rounding of the division
+        return int((time - self.origin) / self.resolution + 1e-6)
+
+    def _insert(self, timer: Timer) -> None:
+        """Puts a timer in the slot of the lowest level that can hold it.
+
+        :param timer: Timer, a timer due after the current tick.
+        """
+        delta = timer.tick - self.tick
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                index = (timer.tick // self._spans[level]) % self.slots
+                self._wheels[level][index].append(timer)
+                return
+        self._overflow.append(timer)
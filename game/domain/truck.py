@@ -1,6 +1,78 @@
+from functools import lru_cache
+from typing import NamedTuple
+
 from game.domain.elements import MotionElement
 from game.domain.package import Package, PackageState
 
+# Packages the truck takes before leaving
+CAPACITY = 8
+
+
+class TruckStep(NamedTuple):
+    """Point of the trip of the truck reached after one move.
+
+    Attributes:
+        x (int): x coordinate of the truck.
+        velocity (float): Velocity the truck moved with.
+        has_turned (bool): True once the truck turned around off-screen.
+    """
+
+    x: int
+    velocity: float
+    has_turned: bool
+
+
+def compile_trajectory(original_x: int, length: int) -> tuple[TruckStep, ...]:
+    """Computes every move of the truck leaving the screen and returning.
+
+    The truck drives left 4 pixels per move until it is 5 pixels past the
+    left edge of the screen, turns around and drives back 2 pixels per move,
+    stopping at ``original_x``.
+
+    :param original_x: int, x coordinate the truck leaves from and returns to.
+    :param length: int, width of the truck.
+    :return: tuple[TruckStep, ...], the points after each move, the last one
+        back at ``original_x``.
+    """
+    trajectory = []
+    x = original_x
+    velocity = -1.0
+    has_turned = False
+    while True:
+        if x + length + 5 <= 0:
+            velocity = 0.5
+            has_turned = True
+        elif not has_turned:
+            velocity = -1.0
+        step = int(4 * velocity)
+        if x + step <= original_x:
+            x += step
+        else:
+            x = original_x
+        if x == original_x:
+            trajectory.append(TruckStep(x, velocity, False))
+            return tuple(trajectory)
+        trajectory.append(TruckStep(x, velocity, has_turned))
+
+
+@lru_cache(maxsize=8)
+def loading_slots(
+    package_length: int, package_height: int
+) -> tuple[tuple[int, int], ...]:
+    """Computes where the packages sit on the truck bed.
+
+    Packages are stacked in columns of three from the front of the bed.
+
+    :param package_length: int, width of the packages.
+    :param package_height: int, height of the packages.
+    :return: tuple[tuple[int, int], ...], the offset from the truck of every
+        slot, in loading order.
+    """
+    return tuple(
+        (13 + package_length * (slot // 3), 14 - package_height * (slot % 3))
+        for slot in range(CAPACITY)
+    )
+
 
 class Truck(MotionElement):
     """Movable delivery truck that accepts completed packages.
@@ -17,6 +89,8 @@ class Truck(MotionElement):
         sprite_to_be_changed_back (bool): Flag to change the truck sprite.
         has_returned (bool): True if the truck has returned to its original position.
         has_turned (bool): True if the truck has turned around off-screen.
+        trajectory (tuple[TruckStep, ...]): Moves of a trip from the original
+            x coordinate given to :meth:`compile_trajectory`.
     """
 
     def __init__(self, x: int, y: int, length: int, height: int) -> None:
@@ -33,6 +107,7 @@ class Truck(MotionElement):
         self.sprite_to_be_changed_back = False
         self.has_returned = False
         self.has_turned = False
+        self.compile_trajectory(x)
 
     @property
     def velocity(self) -> float:
@@ -114,17 +189,23 @@ class Truck(MotionElement):
         """Loads a package onto the truck bed and marks it delivered.
 
         The package's state is set to :class:`PackageState.ON_TRUCK` and its
-        position is updated to the next free slot on the truck.
+        position is updated to the next free slot on the truck, read from
+        :func:`loading_slots`.
 
         :param package: Package, the package to load.
         :raises TypeError: if package is not a Package instance.
+        :raises ValueError: if every slot of the truck is taken.
         """
         if not isinstance(package, Package):
             raise TypeError("package must be a Package instance")
+        slots = loading_slots(package.length, package.height)
+        if len(self.packages) >= len(slots):
+            raise ValueError("the truck has no free slot")
 
         package.state = PackageState.ON_TRUCK
-        package.x = self.x + 13 + (package.length * (len(self.packages) // 3))
-        package.y = self.y + 14 - (package.height * (len(self.packages) % 3))
+        offset_x, offset_y = slots[len(self.packages)]
+        package.x = self.x + offset_x
+        package.y = self.y + offset_y
         self.packages.append(package)
 
     def is_full(self) -> bool:
@@ -132,24 +213,69 @@ class Truck(MotionElement):
 
         :return: bool, True when the truck has received all required packages.
         """
-        return len(self.packages) >= 8
+        return len(self.packages) >= CAPACITY
+
+    def compile_trajectory(self, original_x: int) -> None:
+        """Precomputes the trip of the truck from an original x coordinate.
 
-    def truck_in_movement(self, original_x: int) -> None:
+        Called on creation and by :meth:`truck_in_movement` when the
+        original x coordinate changes; call it again after changing the
+        length of the truck.
+
+        :param original_x: int, x coordinate the truck leaves from and returns to.
+        """
+        self.trajectory = compile_trajectory(original_x, self.length)
+        self.__original_x = original_x
+        # Moves done on reaching each point, the start of a trip being 0
+        self.__moves_done = {
+            (point.x, point.has_turned): moves
+            for moves, point in enumerate(self.trajectory, start=1)
+        }
+        self.__moves_done[(original_x, False)] = 0
+
+    def moves_left(self, original_x: int) -> int:
+        """Counts the moves left before the truck is back.
+
+        :param original_x: int, original x position to which the truck must return.
+        :return: int, the moves to the end of the trip, 0 if it has returned.
+        :raises ValueError: if the truck is not on its trajectory.
+        """
+        if self.has_returned:
+            return 0
+        return len(self.trajectory) - self._moves_done(original_x)
+
+    def truck_in_movement(self, original_x: int, moves: int = 1) -> None:
         """Animates the truck leaving the screen and returning.
 
+        The truck jumps to the point of its precomputed :attr:`trajectory`
+        reached after ``moves`` more moves, so a whole trip can be
+        fast-forwarded with ``moves=truck.moves_left(original_x)``.
+
         :param original_x: int, original x position to which the truck must return.
+        :param moves: int, number of moves to make, must be > 0.
+        :raises ValueError: if moves is not positive or the truck is not on
+            its trajectory.
         """
-        if not self.has_returned and self.x + self.length + 5 <= 0:
-            self.velocity = 0.5
-            self.has_turned = True
-        elif not self.has_returned and not self.has_turned:
-            self.velocity = -1
-
-        if self.x + int(4 * self.velocity) <= original_x:
-            self.x += int(4 * self.velocity)
-        elif self.x != original_x and self.x + int(4 * self.velocity) > original_x:
-            self.x = original_x
-
-        if original_x == self.x:
+        if moves <= 0:
+            raise ValueError("moves must be greater than 0")
+        done = min(self._moves_done(original_x) + moves, len(self.trajectory))
+        point = self.trajectory[done - 1]
+        self.x = point.x
+        self.velocity = point.velocity
+        self.has_turned = point.has_turned
+        if done == len(self.trajectory):
             self.has_returned = True
-            self.has_turned = False
+
+    def _moves_done(self, original_x: int) -> int:
+        """Finds how far in its trip the truck is.
+
+        :param original_x: int, original x position to which the truck must return.
+        :return: int, the moves done since the truck left.
+        :raises ValueError: if the truck is not on its trajectory.
+        """
+        if original_x != self.__original_x:
+            self.compile_trajectory(original_x)
+        done = self.__moves_done.get((self.x, self.has_turned))
+        if done is None:
+            raise ValueError("the truck is not on its trajectory")
+        return done
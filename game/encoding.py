@@ -0,0 +1,31 @@
+"""Small binary encoding helpers shared by the replay and rewind formats."""
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    """Appends an unsigned LEB128 integer to the buffer.
+
+    :param buffer: bytearray, the destination buffer.
+    :param value: int, the value to encode. Must be >= 0.
+    """
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes | memoryview, offset: int) -> tuple[int, int]:
+    """Reads an unsigned LEB128 integer.
+
+    :param data: bytes | memoryview, the encoded data.
+    :param offset: int, position of the first byte.
+    :return: tuple[int, int], the value and the offset after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
@@ -1,19 +1,29 @@
 import pyxel
 
+from game.domain.clock import Clock
 from game.domain.elements import Element
-from game.domain.conveyor import Conveyor
 from game.domain.difficulty import Difficulty
-from game.domain.floor import Floor
-from game.domain.game import Game
-from game.domain.package_factory import PackageFactory
-from game.domain.player import Player
-from game.domain.truck import Truck
-from game.domain.boss import Boss
-from game.domain.door import Door
-from game.presentation.gui import PointsCounter, LivesCounter, DeliveriesCounter
+from game.domain.session import GameSession
+from game.headless import (
+    create_autopilots,
+    create_controllers,
+    create_game,
+    create_session,
+)
+from game.network import (
+    DOWN_KEY,
+    SPECTATOR,
+    UP_KEY,
+    NetworkClient,
+    RemoteController,
+    RemoteSession,
+)
+from game.presentation.controllers import Controller
+from game.presentation.gui import LivesCounter, DeliveriesCounter
 from game.presentation.window import Window
 from game.presentation.game_app import GameApp
-from game.presentation.controllers import MoveDownPlayer, MoveUpPlayer
+from game.presentation.hud import Hud
+from game.presentation.inputs import InputSource
 from game.presentation.pyxel_elements import (
     Frame,
     Grid,
@@ -22,79 +32,52 @@ from game.presentation.pyxel_elements import (
 )
 
 
-def create_game_app(selected_difficulty: Difficulty, app) -> GameApp:
+def create_game_app(
+    selected_difficulty: Difficulty,
+    app,
+    clock: Clock | None = None,
+    input_source: InputSource | None = None,
+    autopilot: list[str] | None = None,
+    remote: NetworkClient | None = None,
+    threaded: bool = False,
+    turbo: int = 1,
+) -> GameApp:
     """Factory that wires together the domain and presentation layers.
 
     This function:
-      * builds the window for the selected difficulty,
-      * creates players, floors, conveyors, truck, factory and GUI elements,
-      * connects conveyors and factory,
+      * builds the domain game for the selected difficulty,
+      * creates the GUI elements and the sprites of every game element,
       * assembles controller mappings,
       * returns a fully configured :class:`GameApp` ready to run.
 
     :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
     :param app: the root application used by :class:`GameApp` to change screens.
+    :param clock: Clock | None, source of the game time, wall clock if None.
+    :param input_source: InputSource | None, source of the button presses,
+        the keyboard if None.
+    :param autopilot: list[str] | None, names of the players driven by an
+        autopilot instead of the keyboard.
+    :param remote: NetworkClient | None, connection to a match server or a
+        spectator feed. The game then mirrors the server's game, only the
+        keys of the player of the connection are bound, none for a
+        spectator, and the network measurements are drawn.
+    :param threaded: bool, whether the ticks run on a simulation thread
+        while Pyxel only draws their snapshots.
+    :param turbo: int, ticks run per frame. Above 1, ``clock`` must be a
+        :class:`FixedStepClock` and a soak monitor is drawn.
     :return: GameApp, the configured game screen.
     """
+    # The game is built first: the random conveyor speeds must be drawn
+    # right after seeding so that recordings replay identically headless
+    game = create_game(selected_difficulty, clock)
     running_window = Window(difficulty=selected_difficulty)
-
-    # Players
-    mario = Player(
-        (running_window.width - 96),
-        (running_window.height - 150),
-        16,
-        16,
-        "Mario",
-    )
-    luigi = Player(75, (running_window.height - 150), 16, 16, "Luigi")
-
-    # Floors for each player
-    floors_mario = [
-        Floor(x=mario.x, y=(running_window.height - 100 - i * 50), player=None)
-        for i in range(selected_difficulty.difficulty_values()["belts"] - 1)
-    ]
-    floors_luigi = [
-        Floor(x=luigi.x, y=(running_window.height - 100 - i * 50), player=None)
-        for i in range(selected_difficulty.difficulty_values()["belts"])
-    ]
-    floors_luigi[1].player = luigi
-    floors_mario[1].player = mario
-    floors = [floors_luigi, floors_mario]
-
-    # Conveyors
-    speed = selected_difficulty.difficulty_values()["conveyor_speed"]
-    conveyors = [
-        Conveyor(
-            conveyor_id=i + 1,
-            x=100,
-            y=(running_window.height - 75 - i * 50),
-            length=(running_window.width - 200),
-            height=8,
-            speed=speed,
-            finish_floor=floors[i % 2][i],
-            floor_y=running_window.height,
-        )
-        for i in range(selected_difficulty.difficulty_values()["belts"])
-    ]
-
-    factory_conveyor = Conveyor(
-        conveyor_id=0,
-        x=running_window.width - 75,
-        y=running_window.height - 75,
-        length=60,
-        height=8,
-        speed=speed,
-        finish_floor=floors_mario[0],
-        floor_y=running_window.height,
-    )
-
-    # Truck
-    truck = Truck(
-        x=conveyors[-1].x - 80,
-        y=conveyors[-1].y - 30,
-        length=45,
-        height=30,
-    )
+    mario, luigi = game.players
+    factory_conveyor, *conveyors = game.conveyors
+    package_factory = game.factories[0]
+    truck = game.truck
+    door = game.door
+    if door is None:
+        raise ValueError("the game has no door")
 
     # GUI elements: score, deliveries, lives
     point_counter_background = Element(
@@ -103,12 +86,7 @@ def create_game_app(selected_difficulty: Difficulty, app) -> GameApp:
         length=47,
         height=21,
     )
-    point_counter = PointsCounter(
-        x=(point_counter_background.x + 4),
-        y=25,
-        length=39,
-        height=11,
-    )
+    point_counter = game.point_counter
     deliveries_counter_background = Element(
         x=point_counter_background.x,
         y=(point_counter_background.y + point_counter_background.height) + 4,
@@ -141,67 +119,47 @@ def create_game_app(selected_difficulty: Difficulty, app) -> GameApp:
         length=lives_counter.length,
         height=5,
     )
+    # Deliveries a life costs, or a plate over the counter without regeneration
+    eliminates = selected_difficulty.difficulty_values()["eliminates"]
     eliminates_deliveries_amount = Element(
         x=deliveries_counter_background.x + 3,
         y=deliveries_counter.y,
-        length=6,
+        length=41 if eliminates == 0 else 6,
         height=11,
     )
+    if eliminates == 0:
+        eliminates_frame = Frame(0, 99, 195, 41, 11, 11)
+    else:
+        eliminates_frame = Frame(0, 53, 18 + 16 * eliminates, 6, 11, 11)
     rendered_eliminates_deliveries_amount = PyxelElement(
-        eliminates_deliveries_amount,
-        Frame(0, 53, 18, 6, 11, 11),
+        eliminates_deliveries_amount, eliminates_frame
     )
-
-    # Door and its pet boss lmao
-    boss = Boss(57, running_window.height - 29, 12, 14)
-    door = Door(57, running_window.height - 35, 10, 15, boss=boss)
-
-    # Wiring conveyors and factory
-    for i in range(selected_difficulty.difficulty_values()["belts"]):
-        if i != (selected_difficulty.difficulty_values()["belts"] - 1):
-            conveyors[i].next_step = conveyors[i + 1]
-        else:
-            conveyors[i].next_step = truck
-    factory_conveyor.next_step = conveyors[0]
-
-    package_factory = PackageFactory(
-        running_window.width - 113 + factory_conveyor.length - 20,
-        running_window.height - 113,
-        60,
-        40,
-        12,
-        8,
-        conveyor=factory_conveyor,
-    )
-
-    # Domain game object
-    game = Game(
-        players={
-            mario: floors_mario,
-            luigi: floors_luigi,
-        },
-        conveyors=[factory_conveyor, *conveyors],
-        factories=[package_factory],
-        truck=truck,
-        point_counter=point_counter,
+    if point_counter is None:
+        raise ValueError("the game has no points counter")
+    hud = Hud(
+        PyxelElement(point_counter_background, Frame(0, 96, 139, 47, 21, colkey=0)),
+        PyxelElement(
+            point_counter,
+            Frame(0, 53, 18, 6, 11, 11),
+            Frame(0, 53, 18, 6, 11, 11),
+            Frame(0, 53, 18, 6, 11, 11),
+            Frame(0, 53, 18, 6, 11, 11),
+            grid=Grid.ROW,
+        ),
+        PyxelElement(lives_counter_hanger, Frame(0, 64, 139, 32, 5, colkey=0)),
+        PyxelElement(lives_counter, Frame(0, 64, 144, 32, 16)),
+        PyxelElement(deliveries_counter_hanger, Frame(0, 96, 139, 47, 4, colkey=0)),
+        PyxelElement(deliveries_counter_background, Frame(0, 96, 176, 47, 17)),
+        PyxelElement(deliveries_counter, Frame(0, 53, 18, 5, 11, 11)),
+        rendered_eliminates_deliveries_amount,
+        points_counter=point_counter,
+        lives_counter=lives_counter,
+        deliveries_counter=deliveries_counter if eliminates != 0 else None,
     )
 
     # Controllers
-    move_up_mario = MoveUpPlayer(
-        game=game,
-        player=mario,
-    )
-    move_down_mario = MoveDownPlayer(
-        game=game,
-        player=mario,
-    )
-    move_up_luigi = MoveUpPlayer(
-        game=game,
-        player=luigi,
-    )
-    move_down_luigi = MoveDownPlayer(
-        game=game,
-        player=luigi,
+    move_mario_up_key, move_mario_down_key, move_luigi_up_key, move_luigi_down_key = (
+        create_controllers(game, selected_difficulty)
     )
 
     conveyor_middle_frames = [Frame(1, 16, 88, 16, 8, colkey=0) for _ in range(35)]
@@ -283,6 +241,32 @@ def create_game_app(selected_difficulty: Difficulty, app) -> GameApp:
     ]
     static_ladders_platforms_for_ladders.pop(-1)
 
+    buttons: dict[int, Controller] = {
+        pyxel.KEY_UP: move_mario_up_key,
+        pyxel.KEY_DOWN: move_mario_down_key,
+        pyxel.KEY_W: move_luigi_up_key,
+        pyxel.KEY_S: move_luigi_down_key,
+    }
+    session: GameSession
+    if remote is not None:
+        # The server applies the presses, each client only has its own keys
+        session = RemoteSession(game, selected_difficulty, remote)
+        buttons = {}
+        if remote.player != SPECTATOR:
+            up_key, down_key = (
+                (pyxel.KEY_UP, pyxel.KEY_DOWN)
+                if remote.player == 0
+                else (pyxel.KEY_W, pyxel.KEY_S)
+            )
+            player = game.players[remote.player]
+            buttons = {
+                up_key: RemoteController(player, remote, UP_KEY),
+                down_key: RemoteController(player, remote, DOWN_KEY),
+            }
+        autopilot = None
+    else:
+        session = create_session(game, selected_difficulty)
+
     # Create and return the GameApp
     game_app = GameApp(
         # Static Elements
@@ -311,44 +295,18 @@ def create_game_app(selected_difficulty: Difficulty, app) -> GameApp:
             grid=Grid.ROW,
         ),
         PyxelElement(truck, Frame(0, 131, 1, 45, 30, colkey=11)),
-        PyxelElement(point_counter_background, Frame(0, 96, 139, 47, 21, colkey=0)),
-        PyxelElement(
-            point_counter,
-            Frame(0, 53, 18, 6, 11, 11),
-            Frame(0, 53, 18, 6, 11, 11),
-            Frame(0, 53, 18, 6, 11, 11),
-            Frame(0, 53, 18, 6, 11, 11),
-            grid=Grid.ROW,
-        ),
-        PyxelElement(lives_counter_hanger, Frame(0, 64, 139, 32, 5, colkey=0)),
-        PyxelElement(lives_counter, Frame(0, 64, 144, 32, 16)),
-        PyxelElement(deliveries_counter_hanger, Frame(0, 96, 139, 47, 4, colkey=0)),
-        PyxelElement(deliveries_counter_background, Frame(0, 96, 176, 47, 17)),
-        PyxelElement(deliveries_counter, Frame(0, 53, 18, 5, 11, 11)),
-        rendered_eliminates_deliveries_amount,
         PyxelElement(door, Frame(1, 19, 1, 10, 15, colkey=0, scale=3)),
         *static_conveyor_frames,
-        buttons={
-            pyxel.KEY_UP: move_up_mario
-            if not selected_difficulty.difficulty_values()["reversed_controls"]
-            else move_down_mario,
-            pyxel.KEY_DOWN: move_down_mario
-            if not selected_difficulty.difficulty_values()["reversed_controls"]
-            else move_up_mario,
-            pyxel.KEY_W: move_up_luigi
-            if not selected_difficulty.difficulty_values()["reversed_controls"]
-            else move_down_luigi,
-            pyxel.KEY_S: move_down_luigi
-            if not selected_difficulty.difficulty_values()["reversed_controls"]
-            else move_up_luigi,
-        },
-        game=game,
-        tick_second=1,
-        move_truck_tick=0.07,
-        move_package_tick=0.09,
-        create_package_tick=5,
+        buttons=buttons,
+        hud=hud,
+        session=session,
         selected_difficulty=selected_difficulty,
         app=app,
+        input_source=input_source,
+        autopilots=create_autopilots(game, autopilot or []),
+        overlay=remote.debug_lines if remote is not None else None,
+        threaded=threaded,
+        turbo=turbo,
     )
 
     return game_app
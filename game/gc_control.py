@@ -0,0 +1,237 @@
+"""Garbage collector control used by the ``--gc-report`` mode of :mod:`game.main`.
+
+Once the game screen is built, its long-lived objects (sprites, frames,
+controllers, domain elements) are moved to the permanent generation with
+:func:`gc.freeze` and the automatic collections are turned off. Collections
+then run only while the players take a break after a truck left, when a
+pause cannot be noticed, or when too many objects are pending, which keeps
+memory bounded if no break comes.
+
+Every frame the controller measures the allocations of the tick: the net
+number of container objects (what triggers the collector), the net number
+of memory blocks and, with :mod:`tracemalloc`, the bytes allocated at the
+peak of the frame. The duration of every collection is measured with a
+:data:`gc.callbacks` hook. The report is written when the game screen ends.
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+GC_REPORT_ENV = "MARIO_BROS_GC_REPORT"
+
+_active_controller: "GcController | None" = None
+
+
+class FrameStats:
+    """Sum and maximum of a per-frame measurement.
+
+    Attributes:
+        total (int): Sum over the frames.
+        maximum (int): Largest value of one frame.
+    """
+
+    def __init__(self) -> None:
+        """Initializes empty statistics."""
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, value: int) -> None:
+        """Adds the value of one frame.
+
+        :param value: int, the measurement.
+        """
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+
+class GcController:
+    """Freezes the scene, defers collections to breaks and measures frames.
+
+    Attributes:
+        report_path (Path): File where the report is written.
+        max_pending (int): Container allocations after which a collection
+            runs even outside a break.
+        trace_allocations (bool): Whether :mod:`tracemalloc` measures bytes.
+        frames (int): Frames measured.
+        containers (FrameStats): Net container allocations per frame.
+        blocks (FrameStats): Net memory blocks per frame.
+        peak_bytes (FrameStats): Bytes allocated at the peak of each frame.
+        pauses (list[tuple[int, float, bool]]): Generation, duration in
+            seconds and whether it ran during a break, for each collection.
+        frozen (int): Objects moved to the permanent generation.
+    """
+
+    def __init__(
+        self,
+        report_path: Path,
+        max_pending: int | None = None,
+        trace_allocations: bool = True,
+    ) -> None:
+        """Initializes a controller that has not started yet.
+
+        :param report_path: Path, file for the report.
+        :param max_pending: int | None, container allocations forcing a
+            collection outside breaks, 20 times the first threshold if None.
+        :param trace_allocations: bool, whether to trace the bytes allocated.
+        :raises ValueError: if max_pending is not strictly positive.
+        """
+        if max_pending is None:
+            max_pending = 20 * gc.get_threshold()[0]
+        if max_pending <= 0:
+            raise ValueError("max_pending must be strictly greater than 0")
+        self.report_path = report_path
+        self.max_pending = max_pending
+        self.trace_allocations = trace_allocations
+        self.frames = 0
+        self.containers = FrameStats()
+        self.blocks = FrameStats()
+        self.peak_bytes = FrameStats()
+        self.pauses: list[tuple[int, float, bool]] = []
+        self.frozen = 0
+        self._in_break = False
+        self._collection_started_at = 0.0
+        self._pending = 0
+        self._blocks = 0
+        self._traced = 0
+        self._baseline: tracemalloc.Snapshot | None = None
+        self._running = False
+
+    def start(self) -> None:
+        """Freezes the objects alive now and turns the automatic collections off."""
+        gc.collect()
+        gc.freeze()
+        self.frozen = gc.get_freeze_count()
+        gc.disable()
+        gc.callbacks.append(self._on_collection)
+        if self.trace_allocations:
+            tracemalloc.start()
+            self._baseline = tracemalloc.take_snapshot()
+            self._traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._pending = gc.get_count()[0]
+        self._blocks = sys.getallocatedblocks()
+        self._running = True
+
+    def frame(self, taking_a_break: bool) -> None:
+        """Measures the frame that just ran and collects if it is the time.
+
+        :param taking_a_break: bool, whether the players are taking a break.
+        """
+        # No locals hold large integers: freeing them after the baselines
+        # are taken would show up in the next frame
+        self.blocks.add(sys.getallocatedblocks() - self._blocks)
+        self.containers.add(gc.get_count()[0] - self._pending)
+        if self.trace_allocations:
+            self.peak_bytes.add(tracemalloc.get_traced_memory()[1] - self._traced)
+        self.frames += 1
+
+        starts_break = taking_a_break and not self._in_break
+        self._in_break = taking_a_break
+        if starts_break:
+            gc.collect()
+        elif gc.get_count()[0] > self.max_pending or (
+            taking_a_break and gc.get_count()[0] > gc.get_threshold()[0]
+        ):
+            gc.collect(0)
+
+        # The next frame starts after the collection and the measurements
+        if self.trace_allocations:
+            self._traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._pending = gc.get_count()[0]
+        self._blocks = sys.getallocatedblocks()
+
+    def stop(self) -> None:
+        """Restores the collector and writes the report.
+
+        Calling this method more than once has no effect.
+        """
+        if not self._running:
+            return
+        self._running = False
+        growth = []
+        if self._baseline is not None:
+            growth = tracemalloc.take_snapshot().compare_to(self._baseline, "lineno")
+            tracemalloc.stop()
+        gc.callbacks.remove(self._on_collection)
+        gc.unfreeze()
+        gc.enable()
+
+        lines = self.report()
+        if growth:
+            lines.append("largest growth since the scene was frozen:")
+            lines.extend(f"  {statistic}" for statistic in growth[:10])
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.report_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def report(self) -> list[str]:
+        """Summarizes the measurements.
+
+        :return: list[str], the lines of the report.
+        """
+        frames = max(self.frames, 1)
+        in_breaks = [duration for _, duration, in_break in self.pauses if in_break]
+        outside = [duration for _, duration, in_break in self.pauses if not in_break]
+        lines = [
+            f"frames: {self.frames}, frozen objects: {self.frozen}",
+            f"containers per frame: mean {self.containers.total / frames:.1f}"
+            f" max {self.containers.maximum}",
+            f"blocks per frame: mean {self.blocks.total / frames:.1f}"
+            f" max {self.blocks.maximum}",
+        ]
+        if self.trace_allocations:
+            lines.append(
+                f"peak bytes per frame: mean {self.peak_bytes.total / frames:.0f}"
+                f" max {self.peak_bytes.maximum}"
+            )
+        for label, durations in (("in breaks", in_breaks), ("outside", outside)):
+            lines.append(
+                f"collections {label}: {len(durations)},"
+                f" total {sum(durations) * 1000:.2f} ms,"
+                f" max {max(durations, default=0.0) * 1000:.2f} ms"
+            )
+        return lines
+
+    def _on_collection(self, phase: str, info: dict[str, int]) -> None:
+        """Times the collections, called by the collector.
+
+        :param phase: str, "start" or "stop".
+        :param info: dict, the generation and the collected objects.
+        """
+        if phase == "start":
+            self._collection_started_at = perf_counter()
+        else:
+            duration = perf_counter() - self._collection_started_at
+            self.pauses.append((info["generation"], duration, self._in_break))
+
+
+def start_from_environment() -> GcController | None:
+    """Starts a controller if the environment asks for one.
+
+    :return: GcController | None, the running controller or None.
+    """
+    global _active_controller
+    report_path = os.environ.get(GC_REPORT_ENV)
+    if not report_path:
+        return None
+    _active_controller = GcController(Path(report_path))
+    _active_controller.start()
+    return _active_controller
+
+
+def active_controller() -> GcController | None:
+    """Returns the controller running in this process, if any.
+
+    :return: GcController | None, the active controller.
+    """
+    return _active_controller
+
+
+def stop_active_controller() -> None:
+    """Stops the active controller, writing its report."""
+    if _active_controller is not None:
+        _active_controller.stop()
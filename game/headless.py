@@ -0,0 +1,346 @@
+"""Pyxel-free construction and execution of a game.
+
+Everything in this module only depends on the domain layer and the
+controllers, so it can run without a window, e.g. to replay recorded
+sessions as fast as the CPU allows.
+"""
+
+import os
+import random
+from collections.abc import Iterable
+
+from game.domain.boss import Boss
+from game.domain.clock import Clock, FixedStepClock
+from game.domain.conveyor import Conveyor
+from game.domain.difficulty import Difficulty
+from game.domain.door import Door
+from game.domain.floor import Floor
+from game.domain.game import Game
+from game.domain.package_factory import PackageFactory
+from game.domain.player import Player
+from game.domain.session import GameSession
+from game.domain.snapshot import restore_snapshot, snapshot_difficulty, take_snapshot
+from game.domain.state_hash import StateHash
+from game.domain.truck import Truck
+from game.presentation.controllers import (
+    Autopilot,
+    Controller,
+    MoveDownPlayer,
+    MoveUpPlayer,
+)
+from game.presentation.gui import PointsCounter
+from game.presentation.window import Window
+from game.rewind import RewindBuffer
+
+AUTOPILOT_ENV = "MARIO_BROS_AUTOPILOT"
+
+
+def create_game(selected_difficulty: Difficulty, clock: Clock | None = None) -> Game:
+    """Builds the domain objects of a game for the selected difficulty.
+
+    This function creates players, floors, conveyors, the truck, the
+    factory, the points counter and the door with its boss, and wires the
+    conveyors together.
+
+    :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
+    :param clock: Clock | None, source of the game time, wall clock if None.
+    :return: Game, the configured game. ``players`` is ``(mario, luigi)`` and
+        the factory conveyor is the first of ``conveyors``.
+    """
+    running_window = Window(difficulty=selected_difficulty)
+    belts = selected_difficulty.difficulty_values()["belts"]
+
+    # Players
+    mario = Player(
+        (running_window.width - 96),
+        (running_window.height - 150),
+        16,
+        16,
+        "Mario",
+    )
+    luigi = Player(75, (running_window.height - 150), 16, 16, "Luigi")
+
+    # Floors for each player
+    floors_mario = [
+        Floor(x=mario.x, y=(running_window.height - 100 - i * 50), player=None)
+        for i in range(belts - 1)
+    ]
+    floors_luigi = [
+        Floor(x=luigi.x, y=(running_window.height - 100 - i * 50), player=None)
+        for i in range(belts)
+    ]
+    floors_luigi[1].player = luigi
+    floors_mario[1].player = mario
+    floors = [floors_luigi, floors_mario]
+
+    # Conveyors
+    speed = selected_difficulty.difficulty_values()["conveyor_speed"]
+    conveyors = [
+        Conveyor(
+            conveyor_id=i + 1,
+            x=100,
+            y=(running_window.height - 75 - i * 50),
+            length=(running_window.width - 200),
+            height=8,
+            speed=speed,
+            finish_floor=floors[i % 2][i],
+            floor_y=running_window.height,
+        )
+        for i in range(belts)
+    ]
+
+    factory_conveyor = Conveyor(
+        conveyor_id=0,
+        x=running_window.width - 75,
+        y=running_window.height - 75,
+        length=60,
+        height=8,
+        speed=speed,
+        finish_floor=floors_mario[0],
+        floor_y=running_window.height,
+    )
+
+    # Truck
+    truck = Truck(
+        x=conveyors[-1].x - 80,
+        y=conveyors[-1].y - 30,
+        length=45,
+        height=30,
+    )
+
+    # Score shown inside the points panel of the HUD
+    point_counter = PointsCounter(
+        x=running_window.width - 71,
+        y=25,
+        length=39,
+        height=11,
+    )
+
+    # Door and its pet boss lmao
+    boss = Boss(57, running_window.height - 29, 12, 14)
+    door = Door(57, running_window.height - 35, 10, 15, boss=boss)
+
+    # Wiring conveyors and factory
+    for i in range(belts):
+        if i != (belts - 1):
+            conveyors[i].next_step = conveyors[i + 1]
+        else:
+            conveyors[i].next_step = truck
+    factory_conveyor.next_step = conveyors[0]
+
+    package_factory = PackageFactory(
+        running_window.width - 113 + factory_conveyor.length - 20,
+        running_window.height - 113,
+        60,
+        40,
+        12,
+        8,
+        conveyor=factory_conveyor,
+    )
+
+    return Game(
+        players={
+            mario: floors_mario,
+            luigi: floors_luigi,
+        },
+        conveyors=[factory_conveyor, *conveyors],
+        factories=[package_factory],
+        truck=truck,
+        point_counter=point_counter,
+        door=door,
+        clock=clock,
+    )
+
+
+def create_session(game: Game, selected_difficulty: Difficulty) -> GameSession:
+    """Creates the session that runs the game rules with the default timings.
+
+    :param game: Game, the game built by :func:`create_game`.
+    :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
+    :return: GameSession, the session ready to be updated every tick.
+    """
+    return GameSession(
+        game,
+        selected_difficulty,
+        tick_second=1,
+        move_package_tick=0.09,
+        move_truck_tick=0.07,
+        create_package_tick=5,
+    )
+
+
+def create_controllers(game: Game, selected_difficulty: Difficulty) -> list[Controller]:
+    """Creates the player controllers in key binding order.
+
+    The order is: Mario up key, Mario down key, Luigi up key, Luigi down key.
+    On difficulties with reversed controls the up keys move down and the other
+    way around.
+
+    :param game: Game, the game built by :func:`create_game`.
+    :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
+    :return: list[Controller], the four controllers.
+    """
+    mario, luigi = game.players
+    controllers: list[Controller] = [
+        MoveUpPlayer(game=game, player=mario),
+        MoveDownPlayer(game=game, player=mario),
+        MoveUpPlayer(game=game, player=luigi),
+        MoveDownPlayer(game=game, player=luigi),
+    ]
+    if selected_difficulty.difficulty_values()["reversed_controls"]:
+        controllers[0], controllers[1] = controllers[1], controllers[0]
+        controllers[2], controllers[3] = controllers[3], controllers[2]
+    return controllers
+
+
+def create_autopilots(game: Game, names: Iterable[str]) -> list[Autopilot]:
+    """Creates autopilots for the players with the given names.
+
+    :param game: Game, the game built by :func:`create_game`.
+    :param names: Iterable[str], player names, case insensitive, e.g. ``mario``.
+    :return: list[Autopilot], one autopilot per name.
+    :raises ValueError: if no player has one of the names.
+    """
+    players = {player.name.lower(): player for player in game.players}
+    autopilots = []
+    for name in names:
+        if name.lower() not in players:
+            raise ValueError(f"there is no player called {name}")
+        autopilots.append(Autopilot(game, players[name.lower()]))
+    return autopilots
+
+
+def autopilot_from_environment() -> list[str]:
+    """Returns the names of the players the environment asks to autopilot.
+
+    :return: list[str], the player names, empty if none.
+    """
+    value = os.environ.get(AUTOPILOT_ENV, "")
+    return [name for name in value.split(",") if name]
+
+
+class HeadlessGame:
+    """Game driven tick by tick without Pyxel, on a deterministic clock.
+
+    Inputs are given as bit masks over the controllers returned by
+    :func:`create_controllers` (bit ``i`` presses controller ``i``).
+    Players with an autopilot are also moved by it on every tick.
+
+    Attributes:
+        selected_difficulty (Difficulty): Difficulty configuration.
+        clock (FixedStepClock): Clock advanced once per tick.
+        game (Game): The domain game object.
+        session (GameSession): The rules driving the game.
+        controllers (list[Controller]): Controllers in key binding order.
+        autopilots (list[Autopilot]): Autopilots run after the pressed controllers.
+        ticks (int): Number of ticks run so far.
+        rewind (RewindBuffer | None): Recent states, when rewinding is enabled.
+        state_hash (StateHash | None): Hash of the game, when hashing is enabled.
+        state_hashes (list[int]): Hash of the game after every tick since
+            hashing was enabled.
+        first_hashed_tick (int): Tick of the first of ``state_hashes``.
+    """
+
+    def __init__(
+        self,
+        selected_difficulty: Difficulty,
+        seed: int | None = None,
+        fps: int = 60,
+        rewind_seconds: float = 0.0,
+        autopilot: Iterable[str] = (),
+    ) -> None:
+        """Builds a new game.
+
+        :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
+        :param seed: int | None, seed of the random generator used by the
+            difficulty presets, or None to leave it untouched.
+        :param fps: int, ticks per second of game time.
+        :param rewind_seconds: float, length of the rewind window, 0 to disable it.
+        :param autopilot: Iterable[str], names of the players driven by an autopilot.
+        :raises ValueError: if no player has one of the autopilot names.
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.selected_difficulty = selected_difficulty
+        self.clock = FixedStepClock(1 / fps)
+        self.game = create_game(selected_difficulty, self.clock)
+        self.session = create_session(self.game, selected_difficulty)
+        self.controllers = create_controllers(self.game, selected_difficulty)
+        self.autopilots = create_autopilots(self.game, autopilot)
+        self.ticks = 0
+        self.rewind = RewindBuffer(rewind_seconds, fps) if rewind_seconds > 0 else None
+        self.state_hash: StateHash | None = None
+        self.state_hashes: list[int] = []
+        self.first_hashed_tick = 1
+
+    def hash_states(self) -> None:
+        """Records the hash of the game after every following tick."""
+        if self.state_hash is None:
+            self.state_hash = StateHash(self.game)
+        self.state_hashes = []
+        self.first_hashed_tick = self.ticks + 1
+
+    def step(self, pressed: int = 0) -> bool:
+        """Runs one tick, applying the pressed controllers first.
+
+        :param pressed: int, bit mask of the controllers pressed this tick.
+        :return: bool, False once the game is over.
+        """
+        self.clock.advance()
+        self.ticks += 1
+        if pressed and self.session.accepts_input:
+            for index, controller in enumerate(self.controllers):
+                if pressed & (1 << index) and not controller.player.is_moving_package:
+                    controller.execute()
+        if self.autopilots and self.session.accepts_input:
+            for autopilot in self.autopilots:
+                autopilot.execute()
+        self.session.update()
+        if self.state_hash is not None:
+            self.state_hashes.append(self.state_hash.value)
+        if self.rewind is not None:
+            self.rewind.record(self.ticks, self.snapshot())
+        return not self.session.is_over
+
+    def rewind_to(self, tick: int) -> None:
+        """Restores the state of a tick of the rewind window.
+
+        Stepping afterwards continues from that tick and drops the later ones.
+
+        :param tick: int, a tick between ``rewind.first_tick`` and ``rewind.last_tick``.
+        :raises ValueError: if rewinding is disabled or the tick is not in the window.
+        """
+        if self.rewind is None:
+            raise ValueError("rewinding is not enabled")
+        restore_snapshot(self.rewind.snapshot_at(tick), self.game, self.session)
+        self.ticks = self.clock.ticks
+        if self.state_hash is not None:
+            self.state_hash.rebuild()
+            del self.state_hashes[max(self.ticks - self.first_hashed_tick + 1, 0) :]
+
+    def snapshot(self) -> bytes:
+        """Encodes the current state of the game and its session.
+
+        :return: bytes, a snapshot accepted by :meth:`from_snapshot`.
+        """
+        return take_snapshot(self.game, self.session)
+
+    @classmethod
+    def from_snapshot(
+        cls, data: bytes | memoryview, fps: int = 60, rewind_seconds: float = 0.0
+    ) -> "HeadlessGame":
+        """Builds a game and resumes it from a snapshot.
+
+        :param data: bytes | memoryview, a snapshot taken by :meth:`snapshot`.
+        :param fps: int, ticks per second of game time.
+        :param rewind_seconds: float, length of the rewind window, 0 to disable it.
+        :return: HeadlessGame, the resumed game.
+        :raises ValueError: if the snapshot does not come from a game session.
+        """
+        difficulty = snapshot_difficulty(data)
+        if difficulty is None:
+            raise ValueError("snapshot does not contain a game session")
+        headless = cls(Difficulty(difficulty), fps=fps, rewind_seconds=rewind_seconds)
+        restore_snapshot(data, headless.game, headless.session)
+        headless.ticks = headless.clock.ticks
+        return headless
@@ -0,0 +1,390 @@
+"""Live object counts and leak alarms used by the ``--leak-report`` mode.
+
+Every simulated minute the detector counts the live objects of every class
+of the game (the classes of :mod:`game.domain` and
+:mod:`game.presentation`, found with :func:`gc.get_objects`) and the
+sprites of the scene by the type of their element, e.g.
+``PyxelElement[Package]``. After the warm-up, a count whose least-squares
+trend grows faster than allowed and whose lowest value keeps rising raises
+an alarm: a count that only swings with the number of packages in play
+does not. Optionally the referrers of the newest objects of an alarming
+type are dumped, to find the list that keeps them alive. The report is
+written when the game screen, or the soak run, ends.
+
+Within a single game the number of packages in play rises with the score,
+so a short run may flag ``Package`` and its sprites; soak runs play many
+games and only flag counts that keep rising from game to game.
+
+Objects frozen by the ``--gc-report`` mode are not seen by
+:func:`gc.get_objects`, but the objects allocated afterwards are, so leaks
+are still found.
+"""
+
+import gc
+import os
+import sys
+import types
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+
+LEAK_REPORT_ENV = "MARIO_BROS_LEAK_REPORT"
+LEAK_REFERRERS_ENV = "MARIO_BROS_LEAK_REFERRERS"
+TRACKED_MODULES = ("game.domain", "game.presentation")
+
+_active_detector: "LeakDetector | None" = None
+
+
+def live_counts(modules: tuple[str, ...] = TRACKED_MODULES) -> dict[str, int]:
+    """Counts the live objects of the classes defined in some packages.
+
+    :param modules: tuple[str, ...], prefixes of the modules of the classes.
+    :return: dict[str, int], mapping class names to their live instances.
+    """
+    counts: dict[str, int] = {}
+    for instance in gc.get_objects():
+        cls = type(instance)
+        if cls.__module__.startswith(modules):
+            counts[cls.__qualname__] = counts.get(cls.__qualname__, 0) + 1
+    return counts
+
+
+def scene_counts(sprites: Iterable[object]) -> dict[str, int]:
+    """Counts the sprites of a scene by their type and the type of their element.
+
+    :param sprites: Iterable[object], the sprites, e.g. ``GameApp.elements``.
+    :return: dict[str, int], mapping names such as ``PyxelElement[Package]``
+        to their number.
+    """
+    counts: dict[str, int] = {}
+    for sprite in sprites:
+        name = _sprite_name(sprite)
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def _sprite_name(sprite: object) -> str:
+    """Returns the name a sprite is counted under.
+
+    :param sprite: object, a sprite.
+    :return: str, its type followed by the type of its element in brackets.
+    """
+    element = getattr(sprite, "element", None)
+    return f"{type(sprite).__name__}[{type(element).__name__}]"
+
+
+class LeakDetector:
+    """Samples live object counts and raises alarms on upward trends.
+
+    Attributes:
+        report_path (Path | None): File where the report is written, if any.
+        interval (float): Game seconds between samples. Must be > 0.
+        warmup (float): Game seconds before trends are checked.
+        min_samples (int): Samples after the warm-up needed to check a trend.
+        max_growth (float): Allowed growth of a count per game hour.
+        dump_referrers (bool): Whether the referrers of leaking objects are
+            dumped when their alarm is raised.
+        history (dict[str, list[tuple[float, int]]]): Game time and count of
+            every sample, per class or sprite name.
+        alarms (dict[str, float]): Growth per game hour of every count that
+            raised an alarm, when it was raised.
+        referrers (list[str]): Lines of the dumped referrers.
+    """
+
+    def __init__(
+        self,
+        report_path: Path | None = None,
+        interval: float = 60.0,
+        warmup: float = 300.0,
+        min_samples: int = 6,
+        max_growth: float = 30.0,
+        dump_referrers: bool = False,
+    ) -> None:
+        """Initializes a detector without samples.
+
+        :param report_path: Path | None, file where :meth:`stop` writes the
+            report, none if None.
+        :param interval: float, game seconds between samples. Must be > 0.
+        :param warmup: float, game seconds before trends are checked.
+        :param min_samples: int, samples after the warm-up needed to check a
+            trend. Must be >= 2.
+        :param max_growth: float, allowed growth of a count per game hour.
+        :param dump_referrers: bool, whether to dump the referrers of the
+            newest objects of a count when it raises an alarm.
+        :raises ValueError: if the interval or the minimum samples are out of range.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be strictly greater than 0")
+        if min_samples < 2:
+            raise ValueError("min_samples must be at least 2")
+        self.report_path = report_path
+        self.interval = interval
+        self.warmup = warmup
+        self.min_samples = min_samples
+        self.max_growth = max_growth
+        self.dump_referrers = dump_referrers
+        self.history: dict[str, list[tuple[float, int]]] = {}
+        self.alarms: dict[str, float] = {}
+        self.referrers: list[str] = []
+        self._origin: float | None = None
+        self._next_sample = 0.0
+        self._running = True
+        # Identities of the tracked objects, kept to dump referrers
+        self._baseline_ids: set[int] | None = None
+        self._recent_ids: deque[set[int]] = deque(maxlen=max(min_samples // 2, 1))
+
+    def due(self, now: float) -> bool:
+        """Returns whether a sample is due, the first call starting the run.
+
+        :param now: float, current game time.
+        :return: bool, True once every ``interval`` seconds of game time.
+        """
+        if self._origin is None:
+            self._origin = now
+            self._next_sample = now + self.interval
+        return now >= self._next_sample
+
+    def sample(self, now: float, sprites: Iterable[object] = ()) -> list[str]:
+        """Counts the live objects and the sprites, then checks the trends.
+
+        :param now: float, current game time.
+        :param sprites: Iterable[object], the sprites of the scene, if any.
+        :return: list[str], names of the counts raising an alarm this time.
+        """
+        if self._origin is None:
+            self._origin = now
+        self._next_sample = now + self.interval
+        # Garbage cycles waiting for the collector are not live
+        gc.collect()
+        counts = live_counts()
+        counts.update(scene_counts(sprites))
+        seconds = now - self._origin
+        for name in self.history.keys() - counts.keys():
+            counts[name] = 0
+        for name, count in counts.items():
+            self.history.setdefault(name, []).append((seconds, count))
+        if self.dump_referrers:
+            live = {
+                id(instance)
+                for instance in gc.get_objects()
+                if type(instance).__module__.startswith(TRACKED_MODULES)
+            }
+            if self._baseline_ids is None and seconds > self.warmup:
+                self._baseline_ids = live
+            self._recent_ids.append(live)
+
+        raised = []
+        for name in counts:
+            if name in self.alarms or not self.rising(name):
+                continue
+            self.alarms[name] = self.growth(name)
+            raised.append(name)
+            print(
+                f"leak: {name} grows by {self.alarms[name]:.0f}/hour, "
+                f"{counts[name]} alive at {seconds / 60:.0f} min",
+                file=sys.stderr,
+            )
+            if self.dump_referrers:
+                self.referrers.extend(self.referrers_of(name))
+        return raised
+
+    def growth(self, name: str) -> float:
+        """Returns the trend of a count after the warm-up.
+
+        :param name: str, a class or sprite name.
+        :return: float, least-squares slope per game hour, 0 with fewer than
+            ``min_samples`` samples after the warm-up.
+        """
+        points = self._after_warmup(name)
+        if len(points) < self.min_samples:
+            return 0.0
+        hours = [seconds / 3600 for seconds, _ in points]
+        mean_x = sum(hours) / len(points)
+        mean_y = sum(count for _, count in points) / len(points)
+        spread = sum((x - mean_x) ** 2 for x in hours)
+        if not spread:
+            return 0.0
+        return (
+            sum((x - mean_x) * (count - mean_y) for x, (_, count) in zip(hours, points))
+            / spread
+        )
+
+    def rising(self, name: str) -> bool:
+        """Returns whether a count trends upward.
+
+        The count has to grow faster than ``max_growth`` and its lowest value
+        over the second half of the samples has to exceed the lowest value
+        over the first half, so a count swinging with the game is not taken
+        for a leak.
+
+        :param name: str, a class or sprite name.
+        :return: bool, True if the count leaks.
+        """
+        points = self._after_warmup(name)
+        if len(points) < self.min_samples:
+            return False
+        half = len(points) // 2
+        return self.growth(name) > self.max_growth and min(
+            count for _, count in points[half:]
+        ) > min(count for _, count in points[:half])
+
+    def referrers_of(self, name: str, limit: int = 3) -> list[str]:
+        """Describes what holds the objects counted under a name.
+
+        The objects described are those alive at each of the last half of
+        ``min_samples`` samples but not at the end of the warm-up: objects
+        in play come and go, leaked ones stay. The newest objects are
+        described when no object qualifies.
+
+        :param name: str, a class or sprite name.
+        :param limit: int, number of objects described.
+        :return: list[str], lines naming every object and its referrers.
+        """
+        alive = [
+            instance
+            for instance in gc.get_objects()
+            if type(instance).__module__.startswith(TRACKED_MODULES)
+            and (
+                _sprite_name(instance) == name
+                if "[" in name
+                else type(instance).__qualname__ == name
+            )
+        ]
+        baseline = self._baseline_ids if self._baseline_ids is not None else set()
+        survivors = [
+            instance
+            for instance in alive
+            if id(instance) not in baseline
+            and all(id(instance) in ids for ids in self._recent_ids)
+        ]
+        described = survivors[:limit] if survivors else alive[-limit:]
+        lines = [
+            f"referrers of {name} ({len(alive)} alive, "
+            f"{len(survivors)} kept since the warm-up):"
+        ]
+        for instance in described:
+            lines.append(f"  {name} at {id(instance):#x}")
+            for referrer in gc.get_referrers(instance):
+                if (
+                    referrer is alive
+                    or referrer is survivors
+                    or referrer is described
+                    or isinstance(referrer, types.FrameType)
+                ):
+                    continue
+                lines.append(f"    held by {_describe(referrer, instance)}")
+        del alive, survivors, described
+        return lines
+
+    def report(self) -> list[str]:
+        """Summarizes the samples.
+
+        :return: list[str], the lines of the report.
+        """
+        lines = [f"samples: {max(map(len, self.history.values()), default=0)}"]
+        for name in sorted(self.history):
+            points = self.history[name]
+            marker = "  LEAK" if name in self.alarms else ""
+            lines.append(
+                f"{name}: first {points[0][1]}, last {points[-1][1]}, "
+                f"max {max(count for _, count in points)}, "
+                f"trend {self.growth(name):+.1f}/hour{marker}"
+            )
+        lines.extend(self.referrers)
+        return lines
+
+    def stop(self) -> None:
+        """Writes the report, if there is a report path.
+
+        Calling this method more than once has no effect.
+        """
+        if not self._running:
+            return
+        self._running = False
+        if self.report_path is None:
+            return
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.report_path.write_text("\n".join(self.report()) + "\n", encoding="utf-8")
+
+    def _after_warmup(self, name: str) -> list[tuple[float, int]]:
+        """Returns the samples of a count taken after the warm-up.
+
+        :param name: str, a class or sprite name.
+        :return: list[tuple[float, int]], the game times and counts.
+        """
+        return [point for point in self.history.get(name, []) if point[0] > self.warmup]
+
+
+def _describe(referrer: object, target: object) -> str:
+    """Names a referrer, following containers up to the attribute holding them.
+
+    :param referrer: object, an object referring to the target.
+    :param target: object, the referred object.
+    :return: str, e.g. ``GameApp.elements[42]`` or ``Truck.packages[3]``.
+    """
+    if isinstance(referrer, (list, tuple, set, frozenset)):
+        index = next(
+            (index for index, value in enumerate(referrer) if value is target), "?"
+        )
+        # A plain loop: a comprehension would hold the container in a cell
+        holders = []
+        for holder in gc.get_referrers(referrer):
+            if not isinstance(holder, (types.FrameType, list, tuple, set, frozenset)):
+                holders.append(f"{_describe(holder, referrer)}[{index}]")
+        return " and ".join(holders) or f"{type(referrer).__name__}[{index}]"
+    namespace = referrer if isinstance(referrer, dict) else _vars_of(referrer)
+    if namespace is not None:
+        key = next((key for key, value in namespace.items() if value is target), None)
+        if key is not None:
+            owner = type(referrer).__qualname__ if namespace is not referrer else None
+            if owner is None:
+                owner = next(
+                    (
+                        type(holder).__qualname__
+                        for holder in gc.get_referrers(namespace)
+                        if _vars_of(holder) is namespace
+                    ),
+                    "dict",
+                )
+            return f"{owner}.{key}"
+    return type(referrer).__qualname__
+
+
+def _vars_of(instance: object) -> dict | None:
+    """Returns the instance dictionary of an object.
+
+    :param instance: object, any object.
+    :return: dict | None, its attributes, or None if it has no dictionary.
+    """
+    namespace = getattr(instance, "__dict__", None)
+    return namespace if isinstance(namespace, dict) else None
+
+
+def start_from_environment() -> LeakDetector | None:
+    """Starts a detector if the environment asks for one.
+
+    :return: LeakDetector | None, the running detector or None.
+    """
+    global _active_detector
+    report_path = os.environ.get(LEAK_REPORT_ENV)
+    if not report_path:
+        return None
+    _active_detector = LeakDetector(
+        Path(report_path),
+        dump_referrers=bool(os.environ.get(LEAK_REFERRERS_ENV)),
+    )
+    return _active_detector
+
+
+def active_detector() -> LeakDetector | None:
+    """Returns the detector running in this process, if any.
+
+    :return: LeakDetector | None, the active detector.
+    """
+    return _active_detector
+
+
+def stop_active_detector() -> None:
+    """Stops the active detector, writing its report."""
+    if _active_detector is not None:
+        _active_detector.stop()
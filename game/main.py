@@ -1,8 +1,16 @@
 """Command line entry point for the Mario Bros Pyxel application."""
 
+import os
 import sys
+from pathlib import Path
+from time import perf_counter
 
-from game.presentation.main_app import App
+from game import gc_control, leaks, network, profiling, recording, soak
+from game.domain.difficulty import Difficulty
+from game.domain.state_hash import decode_hashes, encode_hashes, first_divergence
+from game.headless import AUTOPILOT_ENV, HeadlessGame
+from game.presentation.simulation import THREADED_ENV
+from game.presentation.window import Window
 
 
 def main(
@@ -23,6 +31,18 @@ def main(
     :param points: int | None, final score used when resuming at game over.
     :param seconds_alive: int | None, time survived used when resuming at game over.
     """
+    # Profiling is configured through the environment so relaunches keep it on
+    if new_difficulty_value is None:
+        label = "selector"
+    elif new_difficulty_value == -1:
+        label = "game_over"
+    else:
+        label = "game"
+    profiling.start_from_environment(label)
+
+    # Imported here so headless replays never load Pyxel
+    from game.presentation.main_app import App
+
     App(
         new_width=new_width,
         new_height=new_height,
@@ -32,12 +52,255 @@ def main(
     )
 
 
+def replay_headless(
+    path: Path,
+    rewind_seconds: float = 0.0,
+    start_tick: int = 0,
+    seekable_path: Path | None = None,
+    save_hashes_path: Path | None = None,
+    check_hashes_path: Path | None = None,
+) -> None:
+    """Replays a recorded game without a window and prints the outcome.
+
+    :param path: Path, the input log or seekable replay to replay.
+    :param rewind_seconds: float, length of the rewind window to keep and
+        report on, 0 for none.
+    :param start_tick: int, tick to seek to before replaying the rest.
+    :param seekable_path: Path | None, where to write a seekable copy of the
+        recording, if any.
+    :param save_hashes_path: Path | None, where to write the state hash of
+        every replayed tick, if anywhere.
+    :param check_hashes_path: Path | None, state hashes of another run to
+        compare the replay with, if any.
+    """
+    log: recording.InputLog | recording.SeekableReplay
+    if recording.is_seekable_replay(path):
+        log = recording.SeekableReplay(path)
+    else:
+        log = recording.InputLog.load(path)
+    try:
+        if seekable_path is not None:
+            input_log = log if isinstance(log, recording.InputLog) else log.input_log()
+            recording.SeekableReplay.write(seekable_path, input_log)
+            print(f"seekable replay written to {seekable_path}")
+
+        profiler = profiling.start_from_environment("headless")
+        started_at = perf_counter()
+        # Seeked once here, so the time printed is that of the replayed game
+        headless = log.seek(start_tick, rewind_seconds)
+        if start_tick:
+            seek = perf_counter() - started_at
+            print(f"seek to tick {start_tick}: {seek * 1000:.2f} ms")
+            started_at = perf_counter()
+        headless = recording.replay_headless(
+            log,
+            on_tick=profiler.frame if profiler is not None else None,
+            rewind_seconds=rewind_seconds,
+            start_tick=start_tick,
+            hash_states=save_hashes_path is not None or check_hashes_path is not None,
+            headless=headless,
+        )
+        elapsed = perf_counter() - started_at
+        profiling.stop_active_session()
+
+        matches = (
+            headless.ticks == log.ticks and headless.game.points == log.final_points
+        )
+        print(f"ticks: {headless.ticks}/{log.ticks}")
+        print(f"points: {headless.game.points} (recorded {log.final_points})")
+        print(f"lives: {headless.game.live_amount}")
+        print(f"matches recording: {'yes' if matches else 'no'}")
+        replayed = headless.ticks - start_tick
+        print(f"speed: {replayed / elapsed if elapsed else 0:.0f} ticks/s")
+    finally:
+        if isinstance(log, recording.SeekableReplay):
+            log.close()
+    if save_hashes_path is not None:
+        save_hashes_path.write_bytes(
+            encode_hashes(headless.first_hashed_tick, headless.state_hashes)
+        )
+        print(
+            f"{len(headless.state_hashes)} state hashes written to {save_hashes_path}"
+        )
+    if check_hashes_path is not None:
+        first_tick, expected = decode_hashes(check_hashes_path.read_bytes())
+        # Both runs are compared from the later of their first ticks
+        skip = headless.first_hashed_tick - first_tick
+        actual = headless.state_hashes
+        if skip > 0:
+            expected = expected[skip:]
+        elif skip < 0:
+            actual = actual[-skip:]
+        divergence = first_divergence(
+            expected, actual, max(first_tick, headless.first_hashed_tick)
+        )
+        if divergence is None:
+            print(f"state hashes: {len(actual)} ticks match {check_hashes_path}")
+        else:
+            print(f"state hashes: first divergence at tick {divergence}")
+    if headless.rewind is not None and len(headless.rewind):
+        rewind = headless.rewind
+        seek_started_at = perf_counter()
+        headless.rewind_to(rewind.first_tick)
+        rewind_seek = perf_counter() - seek_started_at
+        print(
+            f"rewind: ticks {rewind.first_tick}-{rewind.last_tick}, "
+            f"{rewind.memory_bytes / 1024:.1f} KiB "
+            f"({rewind.memory_per_minute / 1024:.1f} KiB/min), "
+            f"seek {rewind_seek * 1000:.2f} ms"
+        )
+
+
+def autopilot_headless(names: list[str], difficulty: int, max_seconds: float) -> None:
+    """Plays a game on autopilot without a window and prints the decision times.
+
+    :param names: list[str], names of the players driven by an autopilot.
+    :param difficulty: int, the difficulty level.
+    :param max_seconds: float, limit of game time in seconds.
+    """
+    headless = HeadlessGame(Difficulty(difficulty), autopilot=names)
+    max_ticks = int(max_seconds * 60)
+    started_at = perf_counter()
+    while headless.ticks < max_ticks and headless.step():
+        pass
+    elapsed = perf_counter() - started_at
+
+    print(f"ticks: {headless.ticks}")
+    print(f"points: {headless.game.points}")
+    print(f"lives: {headless.game.live_amount}")
+    print(f"speed: {headless.ticks / elapsed if elapsed else 0:.0f} ticks/s")
+    for autopilot in headless.autopilots:
+        print(
+            f"{autopilot.player.name} autopilot: "
+            f"mean {autopilot.mean_decision_time * 1e6:.1f} us, "
+            f"p99 {autopilot.decision_time_percentile(99) * 1e6:.0f} us, "
+            f"max {autopilot.max_decision_time * 1e6:.1f} us "
+            f"over {autopilot.decisions} decisions"
+        )
+
+
+def _pop_option(arguments: list[str], name: str) -> str | None:
+    """Removes an option and its value from the arguments.
+
+    :param arguments: list[str], the command line arguments, modified in place.
+    :param name: str, the option, e.g. ``--seek``.
+    :return: str | None, the value of the option, or None if it is absent.
+    """
+    if name not in arguments:
+        return None
+    index = arguments.index(name)
+    if index + 1 >= len(arguments):
+        sys.exit(f"{name} expects a value")
+    value = arguments[index + 1]
+    del arguments[index : index + 2]
+    return value
+
+
 if __name__ == "__main__":
+    # Options such as --profile are removed first, the rest is positional.
+    arguments = profiling.configure_from_argv(sys.argv[1:])
+    arguments = recording.configure_from_argv(arguments)
+    headless = "--headless" in arguments
+    if headless:
+        arguments.remove("--headless")
+    rewind_option = _pop_option(arguments, "--rewind")
+    seek_option = _pop_option(arguments, "--seek")
+    seekable_option = _pop_option(arguments, "--save-seekable")
+    save_hashes_option = _pop_option(arguments, "--save-hashes")
+    check_hashes_option = _pop_option(arguments, "--check-hashes")
+    autopilot_option = _pop_option(arguments, "--autopilot")
+    difficulty_option = _pop_option(arguments, "--difficulty")
+    max_seconds_option = _pop_option(arguments, "--max-seconds")
+    connect_option = _pop_option(arguments, "--connect")
+    player_option = _pop_option(arguments, "--player")
+    gc_report_option = _pop_option(arguments, "--gc-report")
+    if gc_report_option is not None:
+        # Kept in the environment for the relaunch into the game screen
+        os.environ[gc_control.GC_REPORT_ENV] = str(Path(gc_report_option).resolve())
+    leak_report_option = _pop_option(arguments, "--leak-report")
+    if leak_report_option is not None:
+        os.environ[leaks.LEAK_REPORT_ENV] = str(Path(leak_report_option).resolve())
+    if "--leak-referrers" in arguments:
+        arguments.remove("--leak-referrers")
+        os.environ[leaks.LEAK_REFERRERS_ENV] = "1"
+    threaded = "--threaded" in arguments
+    if threaded:
+        arguments.remove("--threaded")
+    turbo_option = _pop_option(arguments, "--turbo")
+
+    replay_path = recording.replay_path_from_environment()
+    if threaded:
+        # Input logs are aligned with the ticks of the Pyxel update
+        if replay_path is not None or os.environ.get(recording.RECORD_ENV):
+            sys.exit("--threaded cannot be combined with --record or --replay")
+        os.environ[THREADED_ENV] = "1"
+    if turbo_option is not None:
+        # Keys held on the keyboard would be pressed on every tick of a frame
+        autopiloted = {name.lower() for name in (autopilot_option or "").split(",")}
+        if headless:
+            sys.exit("headless games already run flat out, see python -m game.soak")
+        if threaded or os.environ.get(recording.RECORD_ENV):
+            sys.exit("--turbo cannot be combined with --threaded or --record")
+        if replay_path is None and autopiloted != {"mario", "luigi"}:
+            sys.exit("--turbo needs --replay FILE or --autopilot mario,luigi")
+        os.environ[soak.TURBO_ENV] = turbo_option
+    if autopilot_option is not None:
+        # Autopilot moves are not part of the input logs
+        if replay_path is not None or os.environ.get(recording.RECORD_ENV):
+            sys.exit("--autopilot cannot be combined with --record or --replay")
+        if headless:
+            autopilot_headless(
+                autopilot_option.split(","),
+                int(difficulty_option) if difficulty_option else 0,
+                float(max_seconds_option) if max_seconds_option else 900.0,
+            )
+            sys.exit(0)
+        os.environ[AUTOPILOT_ENV] = autopilot_option
+    if headless:
+        if replay_path is None:
+            sys.exit("--headless needs --replay FILE or --autopilot")
+        replay_headless(
+            replay_path,
+            rewind_seconds=float(rewind_option) if rewind_option else 0.0,
+            start_tick=int(seek_option) if seek_option else 0,
+            seekable_path=Path(seekable_option) if seekable_option else None,
+            save_hashes_path=Path(save_hashes_option) if save_hashes_option else None,
+            check_hashes_path=Path(check_hashes_option)
+            if check_hashes_option
+            else None,
+        )
+        sys.exit(0)
+    if connect_option is not None:
+        # The server decides the difficulty, the game starts with both players
+        if headless or replay_path is not None or autopilot_option is not None:
+            sys.exit(
+                "--connect cannot be combined with --headless, --replay or --autopilot"
+            )
+        try:
+            client = network.connect(connect_option, player_option or "mario")
+        except (ValueError, OSError) as error:
+            sys.exit(f"cannot join {connect_option}: {error}")
+        remote_window = Window(difficulty=Difficulty(client.difficulty))
+        arguments = [
+            str(remote_window.width),
+            str(remote_window.height),
+            str(client.difficulty),
+        ]
+    if replay_path is not None and len(arguments) < 3:
+        # A replay boots straight into the recorded game
+        replay_log = recording.load_input_log(replay_path)
+        replay_window = Window(difficulty=Difficulty(replay_log.difficulty))
+        arguments = [
+            str(replay_window.width),
+            str(replay_window.height),
+            str(replay_log.difficulty),
+        ]
+
     # Treat every CLI argument as optional so the launcher can override only the fields it needs.
-    new_width = int(sys.argv[1]) if len(sys.argv) > 1 else None
-    new_height = int(sys.argv[2]) if len(sys.argv) > 2 else None
-    new_difficulty_value = int(sys.argv[3]) if len(sys.argv) > 3 else None
-    points = int(sys.argv[4]) if len(sys.argv) > 4 else None
-    seconds_alive = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    new_width = int(arguments[0]) if len(arguments) > 0 else None
+    new_height = int(arguments[1]) if len(arguments) > 1 else None
+    new_difficulty_value = int(arguments[2]) if len(arguments) > 2 else None
+    points = int(arguments[3]) if len(arguments) > 3 else None
+    seconds_alive = int(arguments[4]) if len(arguments) > 4 else None
 
     main(new_width, new_height, new_difficulty_value, points, seconds_alive)
@@ -0,0 +1,908 @@
+"""Two-player games over the network against an authoritative server.
+
+The server runs the only real :class:`Game` on a fixed tick and each client
+controls one player. Clients send their key presses; on every tick the
+server sends back what changed: package positions, stages and states,
+counters, player floors, the truck, the door and the one-shot UI flags the
+presentation layer reacts to (sounds, sprite swaps). The client applies
+them to a local mirror of the game, built with the same layout, and renders
+it with the regular :class:`GameApp`.
+
+Protocol (TCP, little-endian):
+  * client hello: ``MBNT``, version and the player index (0 Mario, 1 Luigi);
+  * server hello: ``MBNT``, version, difficulty and the player index;
+  * client press: the keys (bit 0 up, bit 1 down) and a 16-bit sequence;
+  * server tick: 16-bit length, tick (32 bits), the sequence of the last
+    press of the client applied (16 bits), a byte of present sections and
+    the sections, in order: counters, events, players, truck, door,
+    changed packages and removed packages. Keyframes carry the whole state
+    and replace the packages of the receiver.
+
+Spectators connect to a :class:`~game.spectator.SpectatorFeed` with the
+same hello, as player :data:`SPECTATOR`, and receive the same ticks.
+
+Clients measure the bytes received per tick, the latency from a press to
+the first tick that applied it, and the jitter of the tick arrivals
+(RFC 3550 estimator).
+
+Usage::
+
+    python -m game.network --difficulty 1 --port 7461
+    python -m game.main --connect 127.0.0.1:7461 --player mario
+    python -m game.main --connect 127.0.0.1:7461 --player luigi
+"""
+
+import argparse
+import asyncio
+import socket
+import struct
+import sys
+from collections import deque
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from game.domain.difficulty import Difficulty
+from game.domain.game import Game
+from game.domain.package import Package, PackageState
+from game.domain.player import Player
+from game.domain.session import GameSession
+from game.domain.snapshot import packages_of
+from game.headless import HeadlessGame
+from game.presentation.controllers import Controller
+
+if TYPE_CHECKING:
+    from game.spectator import SpectatorFeed
+
+MAGIC = b"MBNT"
+VERSION = 1
+PLAYER_NAMES = ("mario", "luigi")
+SPECTATOR = 255
+UP_KEY = 1
+DOWN_KEY = 2
+
+NO_PACKAGE = 0xFFFF
+
+CLIENT_HELLO = struct.Struct("<4sBB")
+SERVER_HELLO = struct.Struct("<4sBBB")
+
+_PRESS = struct.Struct("<BH")
+_LENGTH = struct.Struct("<H")
+_TICK = struct.Struct("<IHB")
+_COUNTERS = struct.Struct("<IBBBH")
+_EVENTS = struct.Struct("<B")
+_PLAYER = struct.Struct("<BBBH")
+_TRUCK = struct.Struct("<hB")
+_DOOR = struct.Struct("<B")
+_PACKAGE = struct.Struct("<HhhBBB")
+_COUNT = struct.Struct("<H")
+_ID = struct.Struct("<H")
+
+# Sections of a tick
+COUNTERS = 1
+EVENTS = 2
+PLAYERS = 4
+TRUCK = 8
+DOOR = 16
+PACKAGES = 32
+REMOVED = 64
+KEYFRAME = 128
+
+# Session state bits of the counters
+_HAS_LOST = 1
+_IS_OVER = 2
+_TAKING_A_BREAK = 4
+
+# One-shot UI flags
+_CONVEYOR_CHANGED = 1
+_PUT_IN_TRUCK = 2
+_LIFE_REGENERATED = 4
+_TRUCK_UNLOADED = 8
+_TRUCK_TURNED = 16
+_BOSS_LEAVES = 32
+
+# Player bits
+_MOVING_PACKAGE = 1
+_RESTING = 2
+_SPRITE_CHANGED = 4
+
+_STATES = tuple(PackageState)
+_STATE_CODES = {state: code for code, state in enumerate(_STATES)}
+
+
+def _floor_of(game: Game, player: Player) -> int:
+    """Returns the index of the floor the player stands on.
+
+    :param game: Game, the game of the player.
+    :param player: Player, the player.
+    :return: int, the index in ``game.players_positions[player]``.
+    """
+    return next(
+        index
+        for index, floor in enumerate(game.players_positions[player])
+        if floor.player is player
+    )
+
+
+def encode_frame(tick: int, ack: int, sections: int, body: bytes) -> bytes:
+    """Builds the message of a tick.
+
+    :param tick: int, the tick number.
+    :param ack: int, sequence of the last press of the receiver applied.
+    :param sections: int, the sections present in the body.
+    :param body: bytes, the encoded sections.
+    :return: bytes, the length-prefixed message.
+    """
+    return _LENGTH.pack(_TICK.size + len(body)) + _TICK.pack(tick, ack, sections) + body
+
+
+class StateEncoder:
+    """Encodes what changed in a game since the previous tick.
+
+    The encoder plays the part of the presentation layer on the server: it
+    reads the one-shot UI flags of the game and its session and clears them
+    once they were encoded. Packages get a 16-bit network id for as long as
+    the game references them.
+
+    Attributes:
+        game (Game): The encoded game.
+        session (GameSession): The session running the game.
+    """
+
+    def __init__(self, game: Game, session: GameSession) -> None:
+        """Initializes an encoder that has sent nothing yet.
+
+        :param game: Game, the encoded game.
+        :param session: GameSession, the session running the game.
+        """
+        self.game = game
+        self.session = session
+        # id(package) -> (package, network id, last sent record)
+        self._packages: dict[int, tuple[Package, int, tuple]] = {}
+        self._used_ids: set[int] = set()
+        self._next_id = 0
+        self._counters: tuple | None = None
+        self._players: list[tuple | None] = [None] * len(game.players)
+        self._truck: tuple | None = None
+        self._door: int | None = None
+
+    def _new_id(self) -> int:
+        """Returns a network id that no package uses.
+
+        :return: int, the id.
+        """
+        while self._next_id in self._used_ids or self._next_id == NO_PACKAGE:
+            self._next_id = (self._next_id + 1) & 0xFFFF
+        self._used_ids.add(self._next_id)
+        return self._next_id
+
+    def encode(self) -> tuple[int, bytes]:
+        """Encodes the changes of the last tick and clears the UI flags.
+
+        :return: tuple of the present sections and their bytes.
+        """
+        game = self.game
+        session = self.session
+        sections = 0
+        body = bytearray()
+
+        state = (
+            (_HAS_LOST if session.has_lost else 0)
+            | (_IS_OVER if session.is_over else 0)
+            | (_TAKING_A_BREAK if session.is_taking_a_break else 0)
+        )
+        counters = (
+            game.points,
+            game.live_amount,
+            game.stored_deliveries,
+            state,
+            session.seconds_alive if session.has_lost else 0,
+        )
+        if counters != self._counters:
+            self._counters = counters
+            sections |= COUNTERS
+            body += _COUNTERS.pack(*counters)
+
+        truck = game.truck
+        events = 0
+        if game.package_changes_conveyor:
+            game.package_changes_conveyor = False
+            events |= _CONVEYOR_CHANGED
+        if game.package_put_in_truck:
+            game.package_put_in_truck = False
+            events |= _PUT_IN_TRUCK
+        if session.life_regenerated:
+            session.life_regenerated = False
+            events |= _LIFE_REGENERATED
+        if session.truck_unloaded:
+            session.truck_unloaded = False
+            events |= _TRUCK_UNLOADED
+        if truck.has_turned and truck.sprite_to_be_changed_back:
+            truck.sprite_to_be_changed_back = False
+            events |= _TRUCK_TURNED
+        if game.door is not None and game.door.boss.has_to_leave:
+            game.door.boss.has_to_leave = False
+            events |= _BOSS_LEAVES
+        if events:
+            sections |= EVENTS
+            body += _EVENTS.pack(events)
+
+        packages = packages_of(game)
+        current = {id(package) for package in packages}
+        removed = [key for key in self._packages if key not in current]
+        changed = []
+        for package in packages:
+            entry = self._packages.get(id(package))
+            if entry is None:
+                entry = (package, self._new_id(), ())
+            record = (
+                package.x,
+                package.y,
+                package.stage,
+                _STATE_CODES[package.state],
+                package.state_to_be_changed_to,
+            )
+            if record != entry[2]:
+                changed.append((entry[1], *record))
+                entry = (package, entry[1], record)
+            self._packages[id(package)] = entry
+
+        players = []
+        for index, player in enumerate(game.players):
+            carried = player.package
+            player_record = (
+                _floor_of(game, player),
+                (_MOVING_PACKAGE if player.is_moving_package else 0)
+                | (_RESTING if player.is_resting else 0)
+                | (_SPRITE_CHANGED if player.sprite_to_be_changed else 0),
+                self._packages[id(carried)][1] if carried is not None else NO_PACKAGE,
+            )
+            player.sprite_to_be_changed = False
+            if player_record != self._players[index]:
+                self._players[index] = player_record
+                players.append((index, *player_record))
+        if players:
+            sections |= PLAYERS
+            body += _COUNT.pack(len(players))
+            for changed_player in players:
+                body += _PLAYER.pack(*changed_player)
+
+        truck_record = (truck.x, truck.has_turned)
+        if truck_record != self._truck:
+            self._truck = truck_record
+            sections |= TRUCK
+            body += _TRUCK.pack(*truck_record)
+
+        if game.door is not None and game.door.is_open != self._door:
+            self._door = game.door.is_open
+            sections |= DOOR
+            body += _DOOR.pack(game.door.is_open)
+
+        if changed:
+            sections |= PACKAGES
+            body += _COUNT.pack(len(changed))
+            for package_record in changed:
+                body += _PACKAGE.pack(*package_record)
+
+        if removed:
+            sections |= REMOVED
+            body += _COUNT.pack(len(removed))
+            for key in removed:
+                _, network_id, _ = self._packages.pop(key)
+                self._used_ids.discard(network_id)
+                body += _ID.pack(network_id)
+        return sections, bytes(body)
+
+    def keyframe(self) -> tuple[int, bytes]:
+        """Encodes the whole state sent so far, without any event.
+
+        Applied after the tick of the last :meth:`encode`, it rebuilds the
+        receiver's game whatever ticks it missed.
+
+        :return: tuple of the present sections and their bytes.
+        :raises ValueError: if nothing was encoded yet.
+        """
+        if self._counters is None or self._truck is None:
+            raise ValueError("a keyframe needs a previous encode")
+        sections = KEYFRAME | COUNTERS | PLAYERS | TRUCK | PACKAGES
+        body = bytearray(_COUNTERS.pack(*self._counters))
+        body += _COUNT.pack(len(self._players))
+        for index, player_record in enumerate(self._players):
+            if player_record is not None:
+                body += _PLAYER.pack(index, *player_record)
+        body += _TRUCK.pack(*self._truck)
+        if self._door is not None:
+            sections |= DOOR
+            body += _DOOR.pack(self._door)
+        body += _COUNT.pack(len(self._packages))
+        for _, network_id, record in self._packages.values():
+            body += _PACKAGE.pack(network_id, *record)
+        return sections, bytes(body)
+
+
+class MatchServer:
+    """Authoritative server of a two-player game.
+
+    The game starts once both players are connected and ticks at a fixed
+    rate; the connections are closed after the tick of the game over.
+
+    Attributes:
+        headless (HeadlessGame): The authoritative game.
+        encoder (StateEncoder): Encoder of the changes of every tick.
+        spectators (SpectatorFeed | None): Feed the ticks are published to.
+        bytes_sent (int): Bytes of tick messages sent to every client.
+    """
+
+    def __init__(
+        self,
+        selected_difficulty: Difficulty,
+        seed: int | None = None,
+        spectators: "SpectatorFeed | None" = None,
+    ):
+        """Builds the game, waiting for players.
+
+        :param selected_difficulty: Difficulty, the chosen gameplay difficulty.
+        :param seed: int | None, seed of the difficulty presets, if any.
+        :param spectators: SpectatorFeed | None, feed publishing the ticks to
+            spectators, if any.
+        """
+        self.headless = HeadlessGame(selected_difficulty, seed=seed)
+        self.encoder = StateEncoder(self.headless.game, self.headless.session)
+        self.spectators = spectators
+        self.bytes_sent = 0
+        self._writers: list[asyncio.StreamWriter | None] = [None, None]
+        self._pressed = [0, 0]
+        self._sequences = [0, 0]
+        self._ready = asyncio.Event()
+        # Stream to the client of every running handler
+        self._handlers: dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Registers a player and reads its presses until it disconnects.
+
+        :param reader: asyncio.StreamReader, stream from the client.
+        :param writer: asyncio.StreamWriter, stream to the client.
+        """
+        handler = asyncio.current_task()
+        if handler is not None:
+            self._handlers[handler] = writer
+            handler.add_done_callback(self._handlers.pop)
+        try:
+            magic, version, player = CLIENT_HELLO.unpack(
+                await reader.readexactly(CLIENT_HELLO.size)
+            )
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or player >= len(self._writers)
+            or self._writers[player] is not None
+        ):
+            writer.close()
+            return
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        difficulty = self.headless.selected_difficulty.difficulty
+        writer.write(SERVER_HELLO.pack(MAGIC, VERSION, difficulty, player))
+        self._writers[player] = writer
+        print(f"{PLAYER_NAMES[player]} connected")
+        if all(self._writers):
+            self._ready.set()
+        try:
+            while True:
+                keys, sequence = _PRESS.unpack(await reader.readexactly(_PRESS.size))
+                self._pressed[player] |= keys & (UP_KEY | DOWN_KEY)
+                self._sequences[player] = sequence
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def run(self) -> None:
+        """Waits for both players, then plays the game until it is over."""
+        await self._ready.wait()
+        loop = asyncio.get_running_loop()
+        step = self.headless.clock.step
+        deadline = loop.time()
+        running = True
+        while running:
+            deadline += step
+            await asyncio.sleep(max(deadline - loop.time(), 0.0))
+            # Key presses map to the controllers in key binding order
+            pressed = self._pressed[0] | self._pressed[1] << 2
+            self._pressed = [0, 0]
+            acks = list(self._sequences)
+            running = self.headless.step(pressed)
+            tick = self.headless.ticks
+            sections, body = self.encoder.encode()
+            for player, writer in enumerate(self._writers):
+                if writer is None or writer.is_closing():
+                    continue
+                frame = encode_frame(tick, acks[player], sections, body)
+                writer.write(frame)
+                self.bytes_sent += len(frame)
+            if self.spectators is not None:
+                # Spectators cost one frame per tick, however many watch
+                keyframe = (
+                    self.encoder.keyframe()
+                    if self.spectators.wants_keyframe(tick)
+                    else None
+                )
+                self.spectators.publish(tick, sections, body, keyframe)
+        # Closed connections end their handlers, so none is left for
+        # asyncio.run to cancel
+        for writer in self._handlers.values():
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def serve(self, host: str, port: int) -> None:
+        """Accepts the two players and plays the game.
+
+        :param host: str, address to listen on.
+        :param port: int, TCP port to listen on.
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"waiting for two players on {host}:{port}")
+        async with server:
+            await self.run()
+        ticks = self.headless.ticks
+        print(
+            f"game over after {ticks} ticks with {self.headless.game.points} points, "
+            f"{self.bytes_sent / max(ticks * 2, 1):.1f} bytes/tick per client"
+        )
+
+
+class NetworkClient:
+    """Connection of one player or spectator to a :class:`MatchServer`.
+
+    The socket is non-blocking after the hello: :meth:`receive` returns the
+    ticks that arrived since the previous call.
+
+    Attributes:
+        player (int): Index of the controlled player (0 Mario, 1 Luigi), or
+            :data:`SPECTATOR`.
+        difficulty (int): Difficulty of the game.
+        closed (bool): Whether the server closed the connection.
+        bytes_per_tick (float): Mean size of the ticks of the last second.
+        latency (float): Mean seconds from a press to the first tick
+            applying it, over the last second.
+        jitter (float): Smoothed deviation of the tick arrivals, in seconds.
+        tick (int): Last tick received.
+    """
+
+    def __init__(self, host: str, port: int, player: int, fps: int = 60) -> None:
+        """Connects to the server and waits for its hello.
+
+        :param host: str, address of the server.
+        :param port: int, TCP port of the server.
+        :param player: int, index of the controlled player, or :data:`SPECTATOR`.
+        :param fps: int, tick rate of the server, used for the jitter.
+        :raises ConnectionError: if the server refuses the player.
+        """
+        self._socket = socket.create_connection((host, port))
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.sendall(CLIENT_HELLO.pack(MAGIC, VERSION, player))
+        hello = b""
+        while len(hello) < SERVER_HELLO.size:
+            data = self._socket.recv(SERVER_HELLO.size - len(hello))
+            if not data:
+                raise ConnectionError("the server refused the player")
+            hello += data
+        _, _, self.difficulty, self.player = SERVER_HELLO.unpack(hello)
+        self._socket.setblocking(False)
+        self._buffer = bytearray()
+        self._step = 1 / fps
+        self._sequence = 0
+        self._presses: deque[tuple[int, float]] = deque()
+        self._last_arrival: float | None = None
+        self._window_started_at = perf_counter()
+        self._window_bytes = 0
+        self._window_ticks = 0
+        self._window_latency = 0.0
+        self._window_presses = 0
+        self.closed = False
+        self.bytes_per_tick = 0.0
+        self.latency = 0.0
+        self.jitter = 0.0
+        self.tick = 0
+
+    def press(self, keys: int) -> None:
+        """Sends a press of the keys of the player.
+
+        :param keys: int, :data:`UP_KEY` and/or :data:`DOWN_KEY`.
+        """
+        if self.closed:
+            return
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        self._presses.append((self._sequence, perf_counter()))
+        try:
+            self._socket.send(_PRESS.pack(keys, self._sequence))
+        except (BlockingIOError, ConnectionError):
+            self.closed = True
+
+    def receive(self) -> list[tuple[int, bytes]]:
+        """Reads the ticks that arrived and updates the measurements.
+
+        :return: list of the sections and body of every tick, oldest first.
+        """
+        while not self.closed:
+            try:
+                data = self._socket.recv(65536)
+            except BlockingIOError:
+                break
+            except ConnectionError:
+                data = b""
+            if not data:
+                self.closed = True
+                break
+            self._buffer += data
+
+        now = perf_counter()
+        ticks = []
+        offset = 0
+        while len(self._buffer) - offset >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(self._buffer, offset)
+            if len(self._buffer) - offset - _LENGTH.size < length:
+                break
+            start = offset + _LENGTH.size
+            tick, ack, sections = _TICK.unpack_from(self._buffer, start)
+            ticks.append(
+                (sections, bytes(self._buffer[start + _TICK.size : start + length]))
+            )
+            offset = start + length
+            self._measure(now, tick, ack, _LENGTH.size + length)
+        del self._buffer[:offset]
+
+        if now - self._window_started_at >= 1.0:
+            if self._window_ticks:
+                self.bytes_per_tick = self._window_bytes / self._window_ticks
+            if self._window_presses:
+                self.latency = self._window_latency / self._window_presses
+            self._window_started_at = now
+            self._window_bytes = self._window_ticks = self._window_presses = 0
+            self._window_latency = 0.0
+        return ticks
+
+    def _measure(self, now: float, tick: int, ack: int, size: int) -> None:
+        """Updates the measurements with a received tick.
+
+        :param now: float, time at which the tick was read.
+        :param tick: int, the tick number.
+        :param ack: int, sequence of the last press applied by the server.
+        :param size: int, bytes of the tick message.
+        """
+        self._window_bytes += size
+        self._window_ticks += 1
+        # Sequences wrap around, a press is applied when ack is not behind it
+        while self._presses and (ack - self._presses[0][0]) & 0xFFFF < 0x8000:
+            _, sent_at = self._presses.popleft()
+            self._window_latency += now - sent_at
+            self._window_presses += 1
+        if self._last_arrival is not None:
+            transit = (now - self._last_arrival) - (tick - self.tick) * self._step
+            self.jitter += (abs(transit) - self.jitter) / 16
+        self._last_arrival = now
+        self.tick = tick
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self.closed = True
+        self._socket.close()
+
+    def debug_lines(self) -> list[str]:
+        """Returns the lines of the debug HUD.
+
+        :return: list[str], the measurements as text.
+        """
+        return [
+            f"TICK {self.tick}",
+            f"{self.bytes_per_tick:.1f} B/TICK",
+            f"LATENCY {self.latency * 1000:.1f} MS",
+            f"JITTER {self.jitter * 1000:.1f} MS",
+        ]
+
+
+class RemoteSession(GameSession):
+    """Session mirroring a game run by a :class:`MatchServer`.
+
+    Instead of running the rules, every update applies the ticks received
+    by the client to the local game and sets the same flags the real
+    session would, so :class:`GameApp` renders it unchanged.
+
+    Attributes:
+        client (NetworkClient): The connection to the server.
+    """
+
+    def __init__(
+        self, game: Game, selected_difficulty: Difficulty, client: NetworkClient
+    ) -> None:
+        """Initializes the mirror of a game that has not started yet.
+
+        :param game: Game, a game built with the layout of the server's game.
+        :param selected_difficulty: Difficulty, difficulty of the game.
+        :param client: NetworkClient, the connection to the server.
+        """
+        super().__init__(game, selected_difficulty, 1, 0.09, 0.07, 5)
+        self.client = client
+        self._packages: dict[int, Package] = {}
+        self._state = 0
+        self._seconds_alive = 0
+        factory = game.factories[0]
+        self._package_size = (factory.new_package_length, factory.new_package_height)
+
+    @property
+    def is_taking_a_break(self) -> bool:
+        """Returns whether the players rest while the truck is away.
+
+        :return: bool, as last sent by the server.
+        """
+        return bool(self._state & _TAKING_A_BREAK)
+
+    @property
+    def accepts_input(self) -> bool:
+        """Returns whether the players can currently be moved.
+
+        :return: bool, True when not on a break and not lost.
+        """
+        return (
+            not self._state & (_TAKING_A_BREAK | _HAS_LOST) and not self.client.closed
+        )
+
+    @property
+    def is_over(self) -> bool:
+        """Returns whether the game over screen should be shown.
+
+        :return: bool, True once the server says so or closed the connection.
+        """
+        return bool(self._state & _IS_OVER) or self.client.closed
+
+    @property
+    def seconds_alive(self) -> int:
+        """Returns how long the players survived.
+
+        :return: int, as sent by the server at the end of the game.
+        """
+        return self._seconds_alive
+
+    def update(self) -> None:
+        """Applies the ticks received since the previous update."""
+        self.game.newly_created_packages.clear()
+        for sections, body in self.client.receive():
+            self.apply(sections, body)
+
+    def apply(self, sections: int, body: bytes) -> None:
+        """Applies the changes of one tick to the local game.
+
+        :param sections: int, the sections present in the body.
+        :param body: bytes, the sections encoded by :class:`StateEncoder`.
+        """
+        game = self.game
+        offset = 0
+        if sections & COUNTERS:
+            points, lives, deliveries, self._state, self._seconds_alive = (
+                _COUNTERS.unpack_from(body, offset)
+            )
+            offset += _COUNTERS.size
+            if points != game.points:
+                game.points = points
+                game.points_to_be_updated = True
+            if lives != game.live_amount:
+                game.live_amount = lives
+                game.lives_to_be_updated = True
+            if deliveries != game.stored_deliveries:
+                game.stored_deliveries = deliveries
+                game.deliveries_to_be_updated = True
+            self.has_lost = bool(self._state & _HAS_LOST)
+
+        if sections & EVENTS:
+            (events,) = _EVENTS.unpack_from(body, offset)
+            offset += _EVENTS.size
+            game.package_changes_conveyor |= bool(events & _CONVEYOR_CHANGED)
+            game.package_put_in_truck |= bool(events & _PUT_IN_TRUCK)
+            self.life_regenerated |= bool(events & _LIFE_REGENERATED)
+            self.truck_unloaded |= bool(events & _TRUCK_UNLOADED)
+            if events & _TRUCK_TURNED:
+                game.truck.sprite_to_be_changed_back = True
+            if events & _BOSS_LEAVES and game.door is not None:
+                game.door.boss.has_to_leave = True
+
+        # Players refer to packages, which come after them
+        players = []
+        if sections & PLAYERS:
+            (count,) = _COUNT.unpack_from(body, offset)
+            offset += _COUNT.size
+            for _ in range(count):
+                players.append(_PLAYER.unpack_from(body, offset))
+                offset += _PLAYER.size
+
+        if sections & TRUCK:
+            game.truck.x, has_turned = _TRUCK.unpack_from(body, offset)
+            offset += _TRUCK.size
+            game.truck.has_turned = bool(has_turned)
+
+        if sections & DOOR and game.door is not None:
+            (is_open,) = _DOOR.unpack_from(body, offset)
+            offset += _DOOR.size
+            game.door.is_open = bool(is_open)
+
+        listed = set()
+        if sections & PACKAGES:
+            (count,) = _COUNT.unpack_from(body, offset)
+            offset += _COUNT.size
+            for _ in range(count):
+                network_id, x, y, stage, state, fall = _PACKAGE.unpack_from(
+                    body, offset
+                )
+                offset += _PACKAGE.size
+                self._apply_package(network_id, x, y, stage, _STATES[state], fall)
+                listed.add(network_id)
+
+        # A keyframe lists every package, the others left during missed ticks
+        if sections & KEYFRAME:
+            for network_id in [key for key in self._packages if key not in listed]:
+                self._packages.pop(network_id).offscreen = True
+
+        for index, floor_index, bits, package_id in players:
+            self._apply_player(game.players[index], floor_index, bits, package_id)
+
+        if sections & REMOVED:
+            (count,) = _COUNT.unpack_from(body, offset)
+            offset += _COUNT.size
+            for network_id in struct.unpack_from(f"<{count}H", body, offset):
+                package = self._packages.pop(network_id, None)
+                if package is not None:
+                    package.offscreen = True
+            offset += 2 * count
+
+    def _apply_package(
+        self,
+        network_id: int,
+        x: int,
+        y: int,
+        stage: int,
+        state: PackageState,
+        fall: int,
+    ) -> None:
+        """Creates or updates a package of the local game.
+
+        :param network_id: int, id of the package on the server.
+        :param x: int, its x coordinate.
+        :param y: int, its y coordinate.
+        :param stage: int, its stage.
+        :param state: PackageState, its state.
+        :param fall: int, direction of its fall, see ``state_to_be_changed_to``.
+        """
+        package = self._packages.get(network_id)
+        if package is None:
+            length, height = self._package_size
+            package = Package(x, y, length, height, state)
+            self._packages[network_id] = package
+            self.game.newly_created_packages.append(package)
+        package.move(x, y)
+        if stage != package.stage:
+            package.stage = stage
+            package.stage_to_be_changed_to = stage
+        if state != package.state:
+            package.state = state
+            if state == PackageState.FALLING:
+                package.state_to_be_changed_to = fall
+
+    def _apply_player(
+        self, player: Player, floor_index: int, bits: int, package_id: int
+    ) -> None:
+        """Updates a player of the local game.
+
+        :param player: Player, the player.
+        :param floor_index: int, the floor it stands on.
+        :param bits: int, its flags.
+        :param package_id: int, id of the carried package or :data:`NO_PACKAGE`.
+        """
+        floors = self.game.players_positions[player]
+        if floors[floor_index].player is not player:
+            for floor in floors:
+                if floor.player is player:
+                    floor.player = None
+            floors[floor_index].player = player
+            player.package = None
+            player.move(floors[floor_index].x, floors[floor_index].y)
+        player.package = self._packages.get(package_id)
+        player.is_moving_package = bool(bits & _MOVING_PACKAGE)
+        player.is_resting = bool(bits & _RESTING)
+        if bits & _SPRITE_CHANGED:
+            player.sprite_to_be_changed = True
+
+
+class RemoteController(Controller):
+    """Controller sending the presses of a key to the server.
+
+    Attributes:
+        player (Player): The local mirror of the controlled player.
+        client (NetworkClient): The connection to the server.
+        keys (int): :data:`UP_KEY` or :data:`DOWN_KEY`.
+    """
+
+    def __init__(self, player: Player, client: NetworkClient, keys: int) -> None:
+        """Initializes the controller.
+
+        :param player: Player, the local mirror of the controlled player.
+        :param client: NetworkClient, the connection to the server.
+        :param keys: int, :data:`UP_KEY` or :data:`DOWN_KEY`.
+        """
+        self.player = player
+        self.client = client
+        self.keys = keys
+
+    def execute(self) -> None:
+        """Sends the press to the server."""
+        self.client.press(self.keys)
+
+
+_active_client: NetworkClient | None = None
+
+
+def connect(address: str, player_name: str) -> NetworkClient:
+    """Connects this process to a match server as one of the players.
+
+    :param address: str, ``host:port`` of the server.
+    :param player_name: str, ``mario``, ``luigi`` or ``spectator``.
+    :return: NetworkClient, the connection, also returned by :func:`active_client`.
+    :raises ValueError: if the address or the player name is not valid.
+    """
+    global _active_client
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError("address must be HOST:PORT")
+    name = player_name.lower()
+    if name == "spectator":
+        player = SPECTATOR
+    elif name in PLAYER_NAMES:
+        player = PLAYER_NAMES.index(name)
+    else:
+        raise ValueError(
+            f"player must be one of {', '.join(PLAYER_NAMES)} or spectator"
+        )
+    _active_client = NetworkClient(host or "127.0.0.1", int(port), player)
+    return _active_client
+
+
+def active_client() -> NetworkClient | None:
+    """Returns the connection made by :func:`connect`, if any.
+
+    :return: NetworkClient | None, the connection.
+    """
+    return _active_client
+
+
+def main(argv: list[str]) -> None:
+    """Runs a match server from the command line.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.network")
+    parser.add_argument("--difficulty", type=int, default=0, choices=range(4))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7461)
+    parser.add_argument("--spectator-port", type=int, default=None)
+    options = parser.parse_args(argv)
+    difficulty = Difficulty(options.difficulty)
+    spectators = None
+    if options.spectator_port is not None:
+        from game.spectator import SpectatorFeed
+
+        spectators = SpectatorFeed(difficulty)
+        spectators.start(options.host, options.spectator_port)
+    server = MatchServer(difficulty, options.seed, spectators)
+    try:
+        asyncio.run(server.serve(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if spectators is not None:
+            spectators.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,449 @@
+"""Search-based planner playing both players of a headless game.
+
+Every few ticks the planner takes a snapshot of the game (see
+:mod:`game.domain.snapshot`) and evaluates pairs of target floors, one per
+player. A pair is evaluated by restoring the snapshot into a scratch game
+and simulating it a number of ticks ahead: the players first head to the
+pair of floors, then fall back to the :class:`Autopilot`. The pair losing
+the fewest lives and scoring the most points is played until the next plan.
+
+Restoring a snapshot into an existing scratch game is the cheapest way to
+clone a game in this code base, since the static layout is never rebuilt,
+so it is the critical path of the search; :func:`benchmark_cloning`
+compares it with :func:`copy.deepcopy`.
+
+Usage::
+
+    python -m game.planner --difficulty 1 --budget-ms 4 --set increase=10
+    python -m game.planner --benchmark-clone
+"""
+
+import argparse
+import copy
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import sys
+import threading
+from time import perf_counter
+
+from game.batch import TunedDifficulty, parse_override
+from game.domain.difficulty import Difficulty
+from game.domain.snapshot import restore_snapshot, take_snapshot
+from game.headless import HeadlessGame, create_autopilots
+
+FAN_OUTS = ("thread", "process")
+LIFE_VALUE = 50
+
+# Scratch game of every pool worker, set by _init_worker
+_worker = threading.local()
+
+
+class _Scratch:
+    """Game reused to simulate the candidates of a search.
+
+    Attributes:
+        headless (HeadlessGame): The scratch game.
+        autopilots (list[Autopilot]): Autopilots of its players.
+    """
+
+    def __init__(self, selected_difficulty: Difficulty) -> None:
+        """Builds the scratch game.
+
+        :param selected_difficulty: Difficulty, difficulty of the searched game.
+        """
+        self.headless = HeadlessGame(selected_difficulty)
+        names = [player.name for player in self.headless.game.players]
+        self.autopilots = create_autopilots(self.headless.game, names)
+
+    def rollout(
+        self,
+        root: bytes,
+        targets: tuple[int, ...],
+        horizon: int,
+        commit: int,
+        deadline: float | None = None,
+    ) -> float | None:
+        """Simulates a candidate from a snapshot and scores it.
+
+        :param root: bytes, snapshot of the searched game.
+        :param targets: tuple[int, ...], target floor of every player.
+        :param horizon: int, number of ticks to simulate.
+        :param commit: int, ticks spent heading to the targets before the
+            autopilot takes over.
+        :param deadline: float | None, :func:`time.perf_counter` time the
+            simulation is cut off at, None to always finish it.
+        :return: float | None, points won plus :data:`LIFE_VALUE` per life
+            won, so lives lost weigh negatively, or None if cut off.
+        """
+        if deadline is not None and perf_counter() >= deadline:
+            return None
+        headless = self.headless
+        game = headless.game
+        session = headless.session
+        restore_snapshot(root, game, session)
+        headless.ticks = headless.clock.ticks
+        points = game.points
+        lives = game.live_amount
+        for tick in range(horizon):
+            if deadline is not None and perf_counter() >= deadline:
+                return None
+            if session.accepts_input:
+                for autopilot, target in zip(self.autopilots, targets):
+                    if autopilot.player.is_moving_package:
+                        continue
+                    goal = target if tick < commit else autopilot.target_floor()
+                    autopilot.move(autopilot.direction_to(goal))
+            if not headless.step():
+                break
+        return game.points - points + LIFE_VALUE * (game.live_amount - lives)
+
+
+def _init_worker(selected_difficulty: Difficulty, generation) -> None:
+    """Builds the scratch game of a pool worker.
+
+    :param selected_difficulty: Difficulty, difficulty of the searched game.
+    :param generation: shared ``multiprocessing.Value`` holding the number of
+        the running search.
+    """
+    _worker.scratch = _Scratch(selected_difficulty)
+    _worker.generation = generation
+
+
+def _evaluate(
+    job: tuple[int, int, bytes, tuple[int, ...], int, int, float],
+) -> tuple[int, float | None, int]:
+    """Evaluates one candidate in a pool worker.
+
+    Candidates of a search that already ended are skipped and rollouts are
+    cut off at the deadline of their search, so a search that ran out of
+    time does not delay the next one.
+
+    :param job: tuple of the search number, the candidate index, the root
+        snapshot, the targets, the horizon, the commit ticks and the deadline.
+    :return: tuple of the candidate index, its score (None if skipped or cut
+        off) and the number of simulated ticks.
+    """
+    generation, index, root, targets, horizon, commit, deadline = job
+    if generation != _worker.generation.value:
+        return index, None, 0
+    score = _worker.scratch.rollout(root, targets, horizon, commit, deadline)
+    return index, score, horizon if score is not None else 0
+
+
+class SearchPlanner:
+    """Plans the floor moves of both players by simulating candidates.
+
+    Candidates are every pair of target floors, the pair chosen by the
+    autopilots first and the others by how close they are to the current
+    floors. They are evaluated until the time budget of the planning tick
+    runs out: rollouts still running are cut off and results arriving late
+    are dropped, so a tight budget degrades gracefully to the autopilot.
+    Every simulated tick of a finished rollout counts as one search node.
+
+    Attributes:
+        headless (HeadlessGame): The game to play.
+        horizon (int): Ticks simulated per candidate. Must be > 0.
+        commit (int): Ticks heading to the targets before the autopilot
+            takes over in the simulation.
+        replan_ticks (int): Ticks between two plans. Must be > 0.
+        budget (float): Seconds of search allowed per planning tick.
+        nodes (int): Simulated ticks so far.
+        search_time (float): Seconds spent searching so far.
+        plans (int): Number of plans so far.
+        evaluated (int): Number of candidates evaluated so far.
+    """
+
+    def __init__(
+        self,
+        headless: HeadlessGame,
+        horizon: int = 90,
+        replan_ticks: int = 6,
+        budget: float = 0.004,
+        fan_out: str | None = None,
+        workers: int | None = None,
+    ) -> None:
+        """Initializes the planner.
+
+        :param headless: HeadlessGame, the game to play.
+        :param horizon: int, ticks simulated per candidate. Must be > 0.
+        :param replan_ticks: int, ticks between two plans. Must be > 0.
+        :param budget: float, seconds of search allowed per planning tick.
+        :param fan_out: str | None, ``thread`` or ``process`` to evaluate the
+            candidates in a pool, None to evaluate them in this thread.
+        :param workers: int | None, size of the pool, one per core if None.
+        :raises ValueError: if a parameter is out of range.
+        """
+        if horizon <= 0:
+            raise ValueError("horizon must be a positive integer")
+        if replan_ticks <= 0:
+            raise ValueError("replan_ticks must be a positive integer")
+        if fan_out is not None and fan_out not in FAN_OUTS:
+            raise ValueError(f"fan_out must be one of {', '.join(FAN_OUTS)}")
+        self.headless = headless
+        self.horizon = horizon
+        self.commit = max(horizon // 3, 1)
+        self.replan_ticks = replan_ticks
+        self.budget = budget
+        game = headless.game
+        self._autopilots = create_autopilots(
+            game, [player.name for player in game.players]
+        )
+        self._targets: tuple[int | None, ...] = (None,) * len(self._autopilots)
+        self._next_plan = headless.ticks
+        self._scratch: _Scratch | None = None
+        self._pool: multiprocessing.pool.Pool | None = None
+        self._generation = multiprocessing.Value("L", 0)
+        initargs = (headless.selected_difficulty, self._generation)
+        if fan_out == "thread":
+            self._pool = multiprocessing.pool.ThreadPool(
+                workers, _init_worker, initargs
+            )
+        elif fan_out == "process":
+            self._pool = multiprocessing.Pool(workers, _init_worker, initargs)
+        else:
+            self._scratch = _Scratch(headless.selected_difficulty)
+        self.nodes = 0
+        self.search_time = 0.0
+        self.plans = 0
+        self.evaluated = 0
+
+    @property
+    def nodes_per_second(self) -> float:
+        """Returns the search speed.
+
+        :return: float, simulated ticks per second of search, 0 before any search.
+        """
+        if not self.search_time:
+            return 0.0
+        return self.nodes / self.search_time
+
+    def close(self) -> None:
+        """Stops the worker pool, if any."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def __enter__(self) -> "SearchPlanner":
+        """Returns the planner for use in a ``with`` block.
+
+        :return: SearchPlanner, this planner.
+        """
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stops the worker pool at the end of a ``with`` block."""
+        self.close()
+
+    def candidates(self) -> list[tuple[int, ...]]:
+        """Lists the pairs of target floors to evaluate, most promising first.
+
+        :return: list of tuples with one floor index per player.
+        """
+        game = self.headless.game
+        greedy = []
+        current = []
+        for autopilot in self._autopilots:
+            floors = game.players_positions[autopilot.player]
+            here = next(
+                index
+                for index, floor in enumerate(floors)
+                if floor.player is autopilot.player
+            )
+            target = autopilot.target_floor()
+            current.append(here)
+            greedy.append(here if target is None else target)
+        pairs = list(
+            itertools.product(
+                *(
+                    range(len(game.players_positions[autopilot.player]))
+                    for autopilot in self._autopilots
+                )
+            )
+        )
+        pairs.remove(tuple(greedy))
+        pairs.sort(
+            key=lambda pair: sum(
+                abs(floor - here) for floor, here in zip(pair, current)
+            )
+        )
+        return [tuple(greedy), *pairs]
+
+    def plan(self) -> tuple[int, ...]:
+        """Searches the best pair of target floors within the time budget.
+
+        :return: tuple[int, ...], the target floor of every player.
+        """
+        started_at = perf_counter()
+        deadline = started_at + self.budget
+        root = take_snapshot(self.headless.game, self.headless.session)
+        candidates = self.candidates()
+        scores: dict[int, float] = {}
+        if self._pool is None:
+            assert self._scratch is not None
+            for index, targets in enumerate(candidates):
+                score = self._scratch.rollout(
+                    root, targets, self.horizon, self.commit, deadline
+                )
+                if score is None:
+                    break
+                scores[index] = score
+                self.nodes += self.horizon
+        else:
+            generation = self._generation.value
+            jobs = (
+                (
+                    generation,
+                    index,
+                    root,
+                    targets,
+                    self.horizon,
+                    self.commit,
+                    deadline,
+                )
+                for index, targets in enumerate(candidates)
+            )
+            results = self._pool.imap_unordered(_evaluate, jobs)
+            try:
+                for _ in candidates:
+                    index, score, nodes = results.next(
+                        max(deadline - perf_counter(), 0.0)
+                    )
+                    if score is not None and perf_counter() < deadline:
+                        scores[index] = score
+                        self.nodes += nodes
+            except multiprocessing.TimeoutError:
+                pass
+            # Makes the workers skip what is left of this search
+            with self._generation.get_lock():
+                self._generation.value += 1
+        self.search_time += perf_counter() - started_at
+        self.plans += 1
+        self.evaluated += len(scores)
+        if not scores:
+            return candidates[0]
+        # Ties keep the most promising candidate
+        best = max(scores, key=lambda index: (scores[index], -index))
+        return candidates[best]
+
+    def execute(self) -> None:
+        """Plans if it is time to, then moves both players toward their targets."""
+        session = self.headless.session
+        if not session.accepts_input:
+            return
+        if self.headless.ticks >= self._next_plan:
+            self._targets = self.plan()
+            self._next_plan = self.headless.ticks + self.replan_ticks
+        for autopilot, target in zip(self._autopilots, self._targets):
+            if not autopilot.player.is_moving_package:
+                autopilot.move(autopilot.direction_to(target))
+
+
+def benchmark_cloning(
+    selected_difficulty: Difficulty, warmup_ticks: int = 1800, repeat: int = 2000
+) -> dict[str, float]:
+    """Measures the ways of cloning a game in the middle of a session.
+
+    :param selected_difficulty: Difficulty, difficulty of the cloned game.
+    :param warmup_ticks: int, ticks played by the autopilots before cloning.
+    :param repeat: int, number of clones timed per method.
+    :return: dict mapping each method to its time per clone in seconds.
+    """
+    names = ["mario", "luigi"]
+    headless = HeadlessGame(selected_difficulty, seed=0, autopilot=names)
+    while headless.ticks < warmup_ticks and headless.step():
+        pass
+    scratch = HeadlessGame(selected_difficulty)
+    game, session = headless.game, headless.session
+
+    timings = {}
+    started_at = perf_counter()
+    for _ in range(repeat):
+        root = take_snapshot(game, session)
+    timings["snapshot"] = (perf_counter() - started_at) / repeat
+    started_at = perf_counter()
+    for _ in range(repeat):
+        restore_snapshot(root, scratch.game, scratch.session)
+    timings["restore"] = (perf_counter() - started_at) / repeat
+    timings["snapshot + restore"] = timings["snapshot"] + timings["restore"]
+    deep_repeat = max(repeat // 20, 1)
+    started_at = perf_counter()
+    for _ in range(deep_repeat):
+        copy.deepcopy((game, session))
+    timings["deepcopy"] = (perf_counter() - started_at) / deep_repeat
+    started_at = perf_counter()
+    for _ in range(deep_repeat):
+        HeadlessGame.from_snapshot(root)
+    timings["new game from snapshot"] = (perf_counter() - started_at) / deep_repeat
+    return timings
+
+
+def main(argv: list[str]) -> None:
+    """Plays a game with the planner, or benchmarks cloning, from the command line.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.planner")
+    parser.add_argument("--difficulty", type=int, default=0, choices=range(4))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=900.0)
+    parser.add_argument("--horizon", type=int, default=90)
+    parser.add_argument("--replan-ticks", type=int, default=6)
+    parser.add_argument("--budget-ms", type=float, default=4.0)
+    parser.add_argument("--fan-out", choices=FAN_OUTS, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--autopilot", action="store_true")
+    parser.add_argument("--benchmark-clone", action="store_true")
+    parser.add_argument(
+        "--set", type=parse_override, action="append", default=[], metavar="NAME=VALUE"
+    )
+    options = parser.parse_args(argv)
+    difficulty = TunedDifficulty(options.difficulty, dict(options.set))
+
+    if options.benchmark_clone:
+        for method, seconds in benchmark_cloning(difficulty).items():
+            print(f"{method:24}{seconds * 1e6:10.1f} us/clone")
+        return
+
+    if options.autopilot:
+        headless = HeadlessGame(
+            difficulty, seed=options.seed, autopilot=["mario", "luigi"]
+        )
+        planner = None
+    else:
+        headless = HeadlessGame(difficulty, seed=options.seed)
+        planner = SearchPlanner(
+            headless,
+            options.horizon,
+            options.replan_ticks,
+            options.budget_ms / 1000,
+            options.fan_out,
+            options.workers,
+        )
+    max_ticks = int(options.max_seconds * 60)
+    started_at = perf_counter()
+    try:
+        while headless.ticks < max_ticks:
+            if planner is not None:
+                planner.execute()
+            if not headless.step():
+                break
+    finally:
+        if planner is not None:
+            planner.close()
+    elapsed = perf_counter() - started_at
+
+    print(f"ticks: {headless.ticks} in {elapsed:.1f} s")
+    print(f"points: {headless.game.points}")
+    print(f"lives: {headless.game.live_amount}")
+    if planner is not None:
+        print(
+            f"search: {planner.plans} plans, "
+            f"{planner.evaluated / max(planner.plans, 1):.1f} candidates/plan, "
+            f"{planner.nodes_per_second:.0f} nodes/s, "
+            f"{planner.search_time / max(planner.plans, 1) * 1000:.2f} ms/plan"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+from time import perf_counter
 
+from game.domain.conveyor import Direction
 from game.domain.exceptions import DomainError
 from game.domain.game import Game
 from game.domain.player import Player
@@ -10,8 +12,13 @@ class Controller(ABC):
 
     Subclasses must implement :meth:`execute` with the concrete
     behavior triggered by an input event.
+
+    Attributes:
+        player (Player): The player the controller acts on.
     """
 
+    player: Player
+
     @abstractmethod
     def execute(self) -> None:
         """Execute the controller action."""
@@ -144,3 +151,194 @@ class MoveDownPlayer(Controller):
             self.game.move_player_down(self.player)
         except DomainError:
             return
+
+
+class Autopilot(Controller):
+    """Controller that plays a bound player on its own.
+
+    Every execution reads the game state, picks the floor at the end of the
+    conveyor whose first package will reach its end soonest and moves the
+    player one floor toward it. The plan only depends on the current state,
+    so the autopilot is deterministic and survives snapshots and rewinds.
+    The time spent deciding is measured on every execution.
+
+    Attributes:
+        game (Game): The game instance that will perform the movement.
+        player (Player): The player to drive.
+        decisions (int): Number of decisions taken so far.
+        total_decision_time (float): Seconds spent deciding so far.
+        max_decision_time (float): Longest decision so far, in seconds.
+        decision_histogram (dict[int, int]): Number of decisions per time
+            taken, in whole microseconds.
+    """
+
+    def __init__(self, game: Game, player: Player) -> None:
+        """Initializes the autopilot with a game and a player.
+
+        :param game: Game, the game instance.
+        :param player: Player, the player to be driven.
+        :raises TypeError: if parameters have incorrect type.
+        :raises ValueError: if the player is not part of the game.
+        """
+        self.game = game
+        self.player = player
+        if player not in game.players_positions:
+            raise ValueError("player is not part of the game")
+        floors = game.players_positions[player]
+        # The layout never changes: keeps the conveyors ending on the
+        # player's floors with the index of that floor
+        self._conveyors = [
+            (conveyor, floors.index(conveyor.finish_floor))
+            for conveyor in game.conveyors
+            if conveyor.finish_floor in floors
+        ]
+        self.decisions = 0
+        self.total_decision_time = 0.0
+        self.max_decision_time = 0.0
+        self.decision_histogram: dict[int, int] = {}
+
+    @property
+    def game(self) -> Game:
+        """Returns the game associated with this controller.
+
+        :return: Game, the game instance.
+        """
+        return self.__game
+
+    @game.setter
+    def game(self, game: Game) -> None:
+        """Sets the game associated with this controller.
+
+        :param game: Game, the game instance.
+        :raises TypeError: if game is not a Game instance.
+        """
+        if not isinstance(game, Game):
+            raise TypeError("game must be a Game instance")
+        self.__game = game
+
+    @property
+    def player(self) -> Player:
+        """Returns the player associated with this controller.
+
+        :return: Player, the player instance.
+        """
+        return self.__player
+
+    @player.setter
+    def player(self, player: Player) -> None:
+        """Sets the player associated with this controller.
+
+        :param player: Player, the player instance.
+        :raises TypeError: if player is not a Player instance.
+        """
+        if not isinstance(player, Player):
+            raise TypeError("player must be a Player instance")
+        self.__player = player
+
+    @property
+    def mean_decision_time(self) -> float:
+        """Returns the average time spent per decision.
+
+        :return: float, seconds per decision, 0 before the first one.
+        """
+        if not self.decisions:
+            return 0.0
+        return self.total_decision_time / self.decisions
+
+    def decision_time_percentile(self, percent: float) -> float:
+        """Returns the time within which a share of the decisions were taken.
+
+        :param percent: float, the share of the decisions, from 0 to 100.
+        :return: float, seconds, to the microsecond, 0 before the first decision.
+        :raises ValueError: if percent is not between 0 and 100.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100")
+        needed = self.decisions * percent / 100
+        counted = 0
+        for microseconds in sorted(self.decision_histogram):
+            counted += self.decision_histogram[microseconds]
+            if counted >= needed:
+                return microseconds / 1e6
+        return 0.0
+
+    def target_floor(self) -> int | None:
+        """Returns the floor where the next package about to fall is caught.
+
+        Packages are compared by the time they need to reach the end of their
+        conveyor, so faster conveyors come first at equal distance.
+
+        :return: int | None, index of the floor in the player's floors, or
+            None if no package is heading to them.
+        """
+        best_time = None
+        best_floor = None
+        for conveyor, floor in self._conveyors:
+            if not conveyor.packages or not conveyor.velocity:
+                continue
+            for package in conveyor.packages:
+                if conveyor.direction == Direction.LEFT:
+                    distance = package.x - conveyor.x
+                else:
+                    distance = conveyor.x + conveyor.length - package.x - package.length
+                time_left = distance / conveyor.velocity
+                if best_time is None or time_left < best_time:
+                    best_time = time_left
+                    best_floor = floor
+        return best_floor
+
+    def direction_to(self, target: int | None) -> int:
+        """Returns the floor move bringing the player closer to a floor.
+
+        :param target: int | None, index of the floor in the player's floors,
+            None to stay.
+        :return: int, 1 to move up, -1 to move down, 0 to stay.
+        """
+        if target is None:
+            return 0
+        current = next(
+            (
+                index
+                for index, floor in enumerate(self.game.players_positions[self.player])
+                if floor.player is self.player
+            ),
+            target,
+        )
+        return (target > current) - (target < current)
+
+    def decide(self) -> int:
+        """Decides the next floor move of the player.
+
+        :return: int, 1 to move up, -1 to move down, 0 to stay.
+        """
+        started_at = perf_counter()
+        move = self.direction_to(self.target_floor())
+        elapsed = perf_counter() - started_at
+        self.decisions += 1
+        self.total_decision_time += elapsed
+        if elapsed > self.max_decision_time:
+            self.max_decision_time = elapsed
+        microseconds = int(elapsed * 1e6)
+        self.decision_histogram[microseconds] = (
+            self.decision_histogram.get(microseconds, 0) + 1
+        )
+        return move
+
+    def move(self, direction: int) -> None:
+        """Moves the player one floor, ignoring domain errors.
+
+        :param direction: int, 1 to move up, -1 to move down, 0 to stay.
+        """
+        try:
+            if direction > 0:
+                self.game.move_player_up(self.player)
+            elif direction < 0:
+                self.game.move_player_down(self.player)
+        except DomainError:
+            return
+
+    def execute(self) -> None:
+        """Moves the player one floor toward its target, ignoring domain errors."""
+        if self.player.is_moving_package:
+            return
+        self.move(self.decide())
@@ -1,33 +1,55 @@
+from collections import deque
+from collections.abc import Callable
 from time import perf_counter
 
 import pyxel
 
+from game.gc_control import GcController
+from game.leaks import LeakDetector
+from game.soak import SoakMonitor, element_counts
+from game.domain.clock import FixedStepClock
 from game.domain.game import Game
 from game.domain.package import Package, PackageState
+from game.domain.session import GameSession
 from game.domain.truck import Truck
-from game.domain.elements import Element
 from game.domain.player import Player
 from game.domain.door import Door
 from game.domain.boss import Boss
-from game.presentation.gui import PointsCounter, LivesCounter, DeliveriesCounter
+from game.presentation.hud import Hud
 from game.presentation.window import Window
 from game.domain.difficulty import Difficulty
-from game.presentation.controllers import Controller
+from game.presentation.controllers import Autopilot, Controller
+from game.presentation.inputs import InputSource, PyxelInput
 from game.presentation.pyxel_elements import Frame, PyxelElement
 from game.presentation.screen import Screen
+from game.presentation.simulation import RenderSnapshot, SimulationThread
 
 
 class GameApp(Screen):
     """Primary screen that runs the gameplay loop and renders Pyxel elements.
 
+    The game rules are run by a :class:`GameSession`; this screen feeds it
+    the player input and keeps the sprites and sounds in sync with it.
+
     Attributes:
         elements (list[PyxelElement]): All Pyxel-rendered elements in the scene.
+        hud (Hud | None): Panel of the score, deliveries and lives, drawn
+            over the elements.
         buttons (dict[int, Controller]): Mapping from key codes to controller commands.
+        session (GameSession): The rules advancing the game.
         game (Game): The domain game object.
-        tick_second (float): Time unit used for scaling ticks.
-        move_package_tick (float): Tick factor for package movement.
-        move_truck_tick (float): Tick factor for truck movement.
-        create_package_tick (float): Tick factor for package creation.
+        input_source (InputSource): Source of the button presses.
+        autopilots (list[Autopilot]): Autopilots driving players instead of their keys.
+        overlay (Callable[[], list[str]] | None): Lines of debug text drawn
+            over the game, e.g. network measurements.
+        simulation (SimulationThread | None): Thread running the ticks, if
+            they do not run in the Pyxel update.
+        turbo (int): Ticks run per frame.
+        soak_monitor (SoakMonitor | None): Checks of the run in turbo mode.
+        gc_controller (GcController | None): Controller told about every
+            tick, set once the scene is built.
+        leak_detector (LeakDetector | None): Detector sampling the live
+            objects and the sprites, set once the scene is built.
         selected_difficulty (Difficulty): Difficulty configuration.
         running_window (Window): Window configuration.
     """
@@ -36,125 +58,200 @@ class GameApp(Screen):
         self,
         *elements: PyxelElement,
         buttons: dict[int, Controller],
-        game: Game,
-        tick_second: float,
-        move_package_tick: float,
-        move_truck_tick: float,
-        create_package_tick: float,
+        session: GameSession,
+        hud: Hud | None = None,
         selected_difficulty: Difficulty,
         app,
+        input_source: InputSource | None = None,
+        autopilots: list[Autopilot] | None = None,
+        overlay: Callable[[], list[str]] | None = None,
+        threaded: bool = False,
+        turbo: int = 1,
     ) -> None:
         """Initializes the game screen.
 
         :param elements: PyxelElement, the drawable elements in the scene.
         :param buttons: dict mapping key codes to Controller instances.
-        :param game: Game, the domain game object.
-        :param tick_second: float, base tick duration in seconds.
-        :param move_package_tick: float, multiplier for package movement ticks.
-        :param move_truck_tick: float, multiplier for truck movement ticks.
-        :param create_package_tick: float, multiplier for package creation ticks.
+        :param session: GameSession, the rules advancing the game.
+        :param hud: Hud | None, panel of the score, deliveries and lives, if any.
         :param selected_difficulty: Difficulty, the selected difficulty configuration.
         :param app: root application controlling screen transitions.
+        :param input_source: InputSource | None, source of the button presses,
+            the keyboard if None.
+        :param autopilots: list[Autopilot] | None, autopilots replacing the
+            keys of their players, none if None.
+        :param overlay: Callable[[], list[str]] | None, returns the lines of
+            debug text drawn over the game on every frame, none if None.
+        :param threaded: bool, whether to run the ticks on a
+            :class:`SimulationThread` and draw its snapshots. Its
+            measurements are drawn when there is no other overlay.
+        :param turbo: int, ticks run per frame, so the game runs at that many
+            times the wall speed. Above 1, the session clock must be a
+            :class:`FixedStepClock` and the ticks are checked by a
+            :class:`SoakMonitor`, drawn when there is no other overlay.
+        :raises ValueError: if turbo mode is asked without a fixed-step
+            clock or with a simulation thread.
         """
+        if turbo > 1 and (threaded or not isinstance(session.clock, FixedStepClock)):
+            raise ValueError("turbo mode needs a fixed-step clock and no thread")
         self.elements = list(elements)
+        self.hud = hud
+        # New packages go below the door and the sprites drawn after it
+        self._packages_layer = next(
+            (
+                len(self.elements) - index
+                for index, element in enumerate(self.elements)
+                if isinstance(element.element, Door)
+            ),
+            0,
+        )
         self.buttons = buttons
-        self.game = game
-        self.tick_second = float(tick_second)
-        self.move_package_tick = float(move_package_tick)
-        self.create_package_tick = float(create_package_tick)
-        self.move_truck_tick = float(move_truck_tick)
+        self.session = session
+        self.game: Game = session.game
+        self.input_source = input_source if input_source is not None else PyxelInput()
+        self.input_source.bind(list(buttons))
+        self.autopilots = autopilots if autopilots is not None else []
+        self._autopiloted = {autopilot.player for autopilot in self.autopilots}
+        self.simulation = SimulationThread(self._simulate) if threaded else None
+        if self.simulation is not None and overlay is None:
+            overlay = self.simulation.debug_lines
+        self.turbo = turbo
+        self.soak_monitor = SoakMonitor() if turbo > 1 else None
+        self._tick_seconds = (
+            session.clock.step if isinstance(session.clock, FixedStepClock) else 0.0
+        )
+        if self.soak_monitor is not None:
+            self.soak_monitor.games = 1
+            if overlay is None:
+                overlay = self.soak_monitor.debug_lines
+        self.overlay = overlay
+        self._sounds: deque[tuple[int, int]] = deque()
+        self.gc_controller: GcController | None = None
+        self.leak_detector: LeakDetector | None = None
         self.selected_difficulty = selected_difficulty
         self.running_window = Window(selected_difficulty)
-        self._game_starts_at = perf_counter()
-        self._taking_a_break_until = perf_counter()
-        self._last_create_package_time = perf_counter()
-        self._last_move_package_time = perf_counter()
-        self._last_move_truck_time = perf_counter()
+        self._eliminates = selected_difficulty.difficulty_values()["eliminates"]
         self._has_lost = False
-        self._has_lost_at = perf_counter()
         super().__init__(app)
 
-        self._fix_eliminates_elements()
+    def update(self) -> None:
+        """Runs one update step of the game loop: logic and state changes.
 
-    def _fix_eliminates_elements(self) -> None:
-        """Adjusts the delivery counter sprite based on the difficulty."""
-        for element in self.elements:
-            if self.selected_difficulty.difficulty_values()["eliminates"] == 0:
-                if (
-                    isinstance(element.element, Element)
-                    and element.element.x == 428
-                    and element.element.y == 45
-                ):
-                    element.element.length = 41
-                    element.element.height = 11
-                    element.frames[0].u = 99
-                    element.frames[0].v = 195
-                    element.frames[0].w = 41
-            if self.selected_difficulty.difficulty_values()["eliminates"] == 3:
-                if (
-                    isinstance(element.element, Element)
-                    and element.element.x == 428
-                    and element.element.y == 45
-                ):
-                    element.frames[0].v = 66
-            if self.selected_difficulty.difficulty_values()["eliminates"] == 5:
-                if (
-                    isinstance(element.element, Element)
-                    and element.element.x == 428
-                    and element.element.y == 45
-                ):
-                    element.frames[0].v = 98
+        With a simulation thread, the keys are handed to the thread, which
+        runs the ticks, and the sounds of its ticks are played.
+        """
+        if self.simulation is not None:
+            self.simulation.start()
+            self.input_source.begin_tick()
+            for button in self.buttons:
+                if self.input_source.btnp(button):
+                    self.simulation.press(button)
+            while self._sounds:
+                pyxel.play(*self._sounds.popleft())
+            snapshot = self.simulation.latest
+            if snapshot is not None and snapshot.is_over:
+                self.app.change_to_game_over(
+                    points=snapshot.points, seconds_alive=snapshot.seconds_alive
+                )
+            return
 
-    def update(self) -> None:
-        """Runs one update step of the game loop: logic and state changes."""
-
-        # Increases the minimum number of packages at play
-        if (
-            self.game.points
-            % (self.selected_difficulty.difficulty_values()["increase"])
-            == 0
-        ):
-            self.game.minimum_number_packages = (
-                1
-                + self.game.points
-                // (self.selected_difficulty.difficulty_values()["increase"])
+        if self.soak_monitor is not None:
+            self._run_turbo(self.soak_monitor)
+        else:
+            self.session.clock.advance()
+            self.input_source.begin_tick()
+            self.tick(
+                [button for button in self.buttons if self.input_source.btnp(button)]
+                if self.session.accepts_input
+                else []
             )
 
-        # Regenerates lives
-        if (
-            self.selected_difficulty.difficulty_values()["eliminates"] != 0
-            and (
-                self.game.stored_deliveries
-                >= self.selected_difficulty.difficulty_values()["eliminates"]
+        # Changes to Game Over Screen
+        if self.session.is_over:
+            self.app.change_to_game_over(
+                points=self.game.points,
+                seconds_alive=self.session.seconds_alive,
             )
-            and (
-                self.game.stored_deliveries
-                % self.selected_difficulty.difficulty_values()["eliminates"]
-                == 0
+
+    def _run_turbo(self, monitor: SoakMonitor) -> None:
+        """Runs the ticks of a turbo frame and tells the monitor about them.
+
+        :param monitor: SoakMonitor, the checks of the run.
+        """
+        for _ in range(self.turbo):
+            started_at = perf_counter()
+            self.session.clock.advance()
+            self.input_source.begin_tick()
+            self.tick(
+                [button for button in self.buttons if self.input_source.btnp(button)]
+                if self.session.accepts_input
+                else []
             )
-            and (self.game.live_amount < 3)
-        ):
-            self.game.live_amount += 1
-            self.game.stored_deliveries -= self.selected_difficulty.difficulty_values()[
-                "eliminates"
-            ]
-            self.game.deliveries_to_be_updated = True
-            self.game.lives_to_be_updated = True
-            pyxel.play(1, 4)
+            if monitor.record(self._tick_seconds, perf_counter() - started_at):
+                counts = element_counts(self.game)
+                counts["sprites"] = sum(
+                    isinstance(element.element, Package) for element in self.elements
+                )
+                monitor.sample(counts)
+            if self.session.is_over:
+                return
+
+    def _simulate(self, pressed: set[int], tick: int) -> RenderSnapshot:
+        """Runs a tick on the simulation thread and takes its snapshot.
+
+        :param pressed: set[int], the keys pressed since the previous tick.
+        :param tick: int, the tick number.
+        :return: RenderSnapshot, the scene after the tick.
+        """
+        self.session.clock.advance()
+        self.tick([button for button in self.buttons if button in pressed])
+        return RenderSnapshot(
+            tick=tick,
+            published_at=perf_counter(),
+            blits=tuple(blit for element in self.elements for blit in element.blits()),
+            is_over=self.session.is_over,
+            points=self.game.points,
+            seconds_alive=self.session.seconds_alive,
+            hud=self.hud.values() if self.hud is not None else ((), 0, 0),
+        )
 
+    def _play(self, channel: int, sound: int) -> None:
+        """Plays a sound now, or on the Pyxel thread with a simulation thread.
+
+        :param channel: int, the Pyxel channel.
+        :param sound: int, the sound index.
+        """
+        if self.simulation is None:
+            pyxel.play(channel, sound)
+        else:
+            self._sounds.append((channel, sound))
+
+    def tick(self, pressed: list[int]) -> None:
+        """Runs the game rules of one tick and keeps the sprites in sync.
+
+        :param pressed: list[int], the keys pressed during the tick.
+        """
         # Checks for key inputs
-        if self._taking_a_break_until < perf_counter() and not self._has_lost:
-            for button in self.buttons:
+        if self.session.accepts_input:
+            for button in pressed:
                 if (
-                    pyxel.btnp(button)
-                    and not self.buttons[button].player.is_moving_package
+                    not self.buttons[button].player.is_moving_package
+                    and self.buttons[button].player not in self._autopiloted
                 ):
                     self.buttons[button].execute()
+            for autopilot in self.autopilots:
+                autopilot.execute()
+
+        self.session.update()
+
+        if self.session.life_regenerated:
+            self.session.life_regenerated = False
+            self._play(1, 4)
 
         # Renders the new packages bellow certain elements
         for new_package in list(self.game.newly_created_packages):
             self.elements.insert(
-                -15,
+                len(self.elements) - self._packages_layer,
                 (
                     PyxelElement(
                         new_package, Frame(0, 66, 3, 12, 8, colkey=0)
@@ -162,7 +259,6 @@ class GameApp(Screen):
                 ),
             )
             self.game.newly_created_packages.remove(new_package)
-            self.game.packages_at_play += 1
 
         # Updates the sprites which need changing
         for element in list(self.elements):
@@ -180,27 +276,14 @@ class GameApp(Screen):
                 element.frames[0].h = 10
                 element.frames[0].v -= 2
                 element.element.state_to_be_changed_to = 0
-                self.game.packages_at_play -= 1
-                self.game.live_amount -= 1
-                pyxel.play(0, 1)
-                self.game.lives_to_be_updated = True
-                self.game.boss_comes_in = True
+                self._play(0, 1)
             if isinstance(element.element, Player):
-                if (
-                    self._taking_a_break_until > perf_counter()
-                    and not element.element.is_resting
-                ):
+                if element.element.is_resting and element.frames[0].v != 113:
                     element.frames[0].v = 113
                     element.frames[0].w += 1
-                    element.element.is_resting = True
-                if (
-                    element.element.is_resting
-                    and self._taking_a_break_until < perf_counter()
-                ):
-                    element.element.is_resting = False
+                if not element.element.is_resting and element.frames[0].v == 113:
                     element.frames[0].v = 1
                     element.frames[0].w -= 1
-                    self.game.boss_comes_in = True
                 if element.element.sprite_to_be_changed and not (
                     (element.element.name == "Mario"
                      and element.element.y == self.running_window.height - 100)
@@ -240,22 +323,15 @@ class GameApp(Screen):
                         element.frames[0].w *= -1
                         element.frames[0].w -= 1
             if isinstance(element.element, Door):
-                if self.game.boss_comes_in:
-                    if element.frames[0].v != 17:
-                        self.elements.append(
-                            PyxelElement(
-                                element.element.boss,
-                                Frame(0, 35, 65, 12, 14, colkey=0, scale=2),
-                            )
+                if element.element.is_open and element.frames[0].v != 17:
+                    self.elements.append(
+                        PyxelElement(
+                            element.element.boss,
+                            Frame(0, 35, 65, 12, 14, colkey=0, scale=2),
                         )
-                        element.frames[0].v = 17
-                    element.element.boss.comes_in_time = perf_counter()
-                    self.game.boss_comes_in = False
-                if (
-                    element.frames[0].v == 17
-                    and element.element.boss.comes_in_time + 1.5 < perf_counter()
-                ):
-                    element.element.boss.has_to_leave = True
+                    )
+                    element.frames[0].v = 17
+                if not element.element.is_open and element.frames[0].v == 17:
                     element.frames[0].v = 1
             if isinstance(element.element, Boss) and element.element.has_to_leave:
                 element.element.has_to_leave = False
@@ -263,18 +339,15 @@ class GameApp(Screen):
             if isinstance(element.element, Package) and element.element.offscreen:
                 self.elements.remove(element)
 
-        # Checks if the Truck is full
-        if self.game.truck.is_full():
+        # Swaps the truck for the leaving one once it was emptied
+        if self.session.truck_unloaded:
+            self.session.truck_unloaded = False
             for element in self.elements[:]:
                 if (
                     isinstance(element.element, Package)
                     and element.element.state == PackageState.ON_TRUCK
                 ) or isinstance(element.element, Truck):
                     self.elements.remove(element)
-            self.game.package_put_in_truck = False
-            self.game.truck.has_returned = False
-            self.game.truck.sprite_to_be_changed_back = True
-            self.game.truck.packages = []
             self.elements.append(
                 (
                     PyxelElement(
@@ -282,139 +355,58 @@ class GameApp(Screen):
                     )
                 )
             )
-            self._taking_a_break_until = perf_counter() + 8
-            self._last_create_package_time += 8
-            self.game.points += 10
-            pyxel.play(0, 5)
-            if (
-                self.game.stored_deliveries < 9
-                and self.selected_difficulty.difficulty_values()["eliminates"] != 0
-            ):
-                self.game.stored_deliveries += 1
-                self.game.deliveries_to_be_updated = True
-            self.game.points_to_be_updated = True
+            self._play(0, 5)
+
+        # Swaps the truck back once it turned around
+        if self.game.truck.has_turned and self.game.truck.sprite_to_be_changed_back:
+            self.game.truck.sprite_to_be_changed_back = False
+            for element in self.elements:
+                if isinstance(element.element, Truck):
+                    self.elements.remove(element)
+                    self.elements.append(
+                        (
+                            PyxelElement(
+                                self.game.truck,
+                                Frame(0, 131, 1, 45, 30, colkey=11),
+                            )
+                        )
+                    )
 
-        # Updates Point Counter
+        # Updates the counters of the HUD, which redraws them when drawn
+        hud = self.hud
         if self.game.points_to_be_updated:
             self.game.points_to_be_updated = False
-            self.game.point_counter.update_points(self.game.points)
-            for element in self.elements:
-                if isinstance(element.element, PointsCounter):
-                    element.frames[0].v = 18 + 16 * element.element.digit4_value
-                    element.frames[1].v = 18 + 16 * element.element.digit3_value
-                    element.frames[2].v = 18 + 16 * element.element.digit2_value
-                    element.frames[3].v = 18 + 16 * element.element.digit1_value
-
-        # Updates Delivery Counter
-        if (
-            self.game.deliveries_to_be_updated
-            and self.selected_difficulty.difficulty_values()["eliminates"] != 0
-        ):
+            if hud is not None:
+                hud.points_counter.update_points(self.game.points)
+        if self.game.deliveries_to_be_updated and self._eliminates != 0:
             self.game.deliveries_to_be_updated = False
-            for element in self.elements:
-                if isinstance(element.element, DeliveriesCounter):
-                    element.frames[0].v = 18 + (self.game.stored_deliveries * 16)
-
-        # Updates Live Counter
+            if hud is not None and hud.deliveries_counter is not None:
+                hud.deliveries_counter.update_deliveries(self.game.stored_deliveries)
         if self.game.lives_to_be_updated:
             self.game.lives_to_be_updated = False
-            for element in self.elements:
-                if isinstance(element.element, LivesCounter):
-                    element.frames[0].v = 144 + 16 * (3 - self.game.live_amount)
+            if hud is not None:
+                hud.lives_counter.update_lives(self.game.live_amount)
 
-        # Marks the game as lost
-        if self.game.live_amount <= 0 and not self._has_lost:
-            self._has_lost_at = perf_counter()
+        # Plays the losing sound once
+        if self.session.has_lost and not self._has_lost:
             self._has_lost = True
-            pyxel.play(0, 2)
-
-        # Changes to Game Over Screen
-        if self._has_lost and self._has_lost_at + 1.6 < perf_counter():
-            self.app.change_to_game_over(
-                points=self.game.points,
-                seconds_alive=int(perf_counter() - self._game_starts_at - 1.6),
-            )
-
-        # Only works while the game is not taking a break
-        if self._taking_a_break_until < perf_counter() and not self._has_lost:
-
-            # Player puts down a package
-            for player in self.game.players:
-                if (
-                    player.is_moving_package
-                    and player.package_picked_up_at
-                    + self.move_package_tick * 3
-                    <= perf_counter()
-                ):
-                    player.is_moving_package = False
-                    player.sprite_to_be_changed = True
-                    self.game.player_put_down_package(player)
-
-            current_time = perf_counter()
-            # Moves all packages
-            if (
-                current_time - self._last_move_package_time
-                >= self.tick_second * self.move_package_tick
-            ):
-                self._last_move_package_time = current_time
-                self.game.move_packages()
-
-            # Changes the create package timing to spread them out
-            if self.game.first_package_moved and (
-                self.create_package_tick
-                != (self.move_package_tick * 100)
-                * (
-                    self.selected_difficulty.difficulty_values()["belts"]
-                    / (self.game.minimum_number_packages + 1)
-                )
-            ):
-                self.create_package_tick = (self.move_package_tick * 100) * (
-                    self.selected_difficulty.difficulty_values()["belts"]
-                    / (self.game.minimum_number_packages + 1)
-                )
-            # Tries to create a package
-            if (
-                self.game.packages_at_play < self.game.minimum_number_packages + 1
-                and (
-                    current_time - self._last_create_package_time
-                    >= self.tick_second * self.create_package_tick
-                )
-            ) or (
-                self.game.packages_at_play < self.game.minimum_number_packages
-                and self.game.first_package_moved
-            ):
-                self._last_create_package_time = current_time
-                self.game.create_package()
-
-        # Moves the Truck
-        elif (
-            perf_counter() - self._last_move_truck_time
-            >= self.tick_second * self.move_truck_tick
-        ) and not self.game.truck.has_returned and not self._has_lost:
-            self._last_move_truck_time = perf_counter()
-            self.game.truck.truck_in_movement(self.game.original_truck_x)
-            if self.game.truck.has_turned and self.game.truck.sprite_to_be_changed_back:
-                self.game.truck.sprite_to_be_changed_back = False
-                for element in self.elements:
-                    if isinstance(element.element, Truck):
-                        self.elements.remove(element)
-                        self.elements.append(
-                            (
-                                PyxelElement(
-                                    self.game.truck,
-                                    Frame(0, 131, 1, 45, 30, colkey=11),
-                                )
-                            )
-                        )
+            self._play(0, 2)
 
         # Plays sounds
         if self.game.package_changes_conveyor:
-            pyxel.play(0, 0)
+            self._play(0, 0)
             self.game.package_changes_conveyor = False
         if self.game.package_put_in_truck:
-            pyxel.play(0, 3)
+            self._play(0, 3)
             self.game.package_put_in_truck = False
 
+        if self.gc_controller is not None:
+            self.gc_controller.frame(self.session.is_taking_a_break)
+        if self.leak_detector is not None:
+            now = self.session.clock.now()
+            if self.leak_detector.due(now):
+                self.leak_detector.sample(now, self.elements)
+
     def draw(self) -> None:
         """Draws the game screen and all its elements."""
         pyxel.cls(15)
@@ -464,5 +456,21 @@ class GameApp(Screen):
         )
 
         # Lastly, renders the elements on top of the background
-        for element in self.elements:
-            element.draw()
+        if self.simulation is None:
+            for element in self.elements:
+                element.draw()
+            if self.hud is not None:
+                self.hud.draw(*self.hud.values())
+        else:
+            # Only the snapshot is read, the counters belong to the worker
+            snapshot = self.simulation.latest
+            if snapshot is not None:
+                for blit in snapshot.blits:
+                    pyxel.blt(*blit)
+                if self.hud is not None:
+                    self.hud.draw(*snapshot.hud)
+                self.simulation.drawn(snapshot)
+
+        if self.overlay is not None:
+            for index, line in enumerate(self.overlay()):
+                pyxel.text(2, 2 + 7 * index, line, 0)
@@ -3,70 +3,61 @@ from game.domain.exceptions import DomainError
 
 
 class PointsCounter(Element):
-    """HUD element that tracks and displays a four-digit score.
+    """HUD element that tracks the digits of the score.
 
     Attributes:
         x (int): x-coordinate of the HUD element.
         y (int): y-coordinate of the HUD element.
         length (int): width reserved for rendering.
         height (int): height reserved for rendering.
-        digit1_value (int): units digit.
-        digit2_value (int): tens digit.
-        digit3_value (int): hundreds digit.
-        digit4_value (int): thousands digit.
+        min_digits (int): digits always shown, padded with zeros. Must be > 0.
+        digits (tuple[int, ...]): digits of the score, most significant
+            first, at least ``min_digits`` of them.
     """
 
-    def __init__(self, x: int, y: int, length: int, height: int) -> None:
+    def __init__(
+        self, x: int, y: int, length: int, height: int, min_digits: int = 4
+    ) -> None:
         """Initializes the points counter.
 
         :param x: int, x-coordinate (>= 0).
         :param y: int, y-coordinate (>= 0).
         :param length: int, width of the counter (must be > 0).
         :param height: int, height of the counter (must be > 0).
+        :param min_digits: int, digits always shown (must be > 0).
+        :raises ValueError: if min_digits is not positive.
         """
         super().__init__(x, y, length, height)
-        self.digit1_value = 0
-        self.digit2_value = 0
-        self.digit3_value = 0
-        self.digit4_value = 0
+        if min_digits <= 0:
+            raise ValueError("min_digits must be strictly greater than 0")
+        self.min_digits = min_digits
+        self.digits: tuple[int, ...] = (0,) * min_digits
 
     def update_points(self, points: int) -> None:
         """Updates cached digits of the score for rendering.
 
-        :param points: int, the new score [0–9999].
+        :param points: int, the new score, any number of digits.
         :raises TypeError: if points is not an int.
-        :raises DomainError: if points has more than 4 digits.
+        :raises DomainError: if points is negative.
         """
         if not isinstance(points, int):
             raise TypeError("points must be an int")
-
         if points < 0:
             raise DomainError("Points cannot be negative.")
-        if len(str(points)) > 4:
-            raise DomainError(
-                "Thats it, you won, you have more than 9999 points."
-            )  # If any player reaches this point might as well force them to stop
-
-        string_points = str(points)
-
-        # Update digits with their respective values
-        self.digit1_value = 0
-        self.digit2_value = 0
-        self.digit3_value = 0
-        self.digit4_value = 0
 
-        if len(string_points) >= 1:
-            self.digit1_value = int(string_points[-1])
-        if len(string_points) >= 2:
-            self.digit2_value = int(string_points[-2])
-        if len(string_points) >= 3:
-            self.digit3_value = int(string_points[-3])
-        if len(string_points) == 4:
-            self.digit4_value = int(string_points[-4])
+        digits: list[int] = []
+        while points or len(digits) < self.min_digits:
+            points, digit = divmod(points, 10)
+            digits.append(digit)
+        self.digits = tuple(reversed(digits))
 
 
 class LivesCounter(Element):
-    """HUD element that anchors the lives indicator sprites."""
+    """HUD element that anchors the lives indicator sprites.
+
+    Attributes:
+        lives (int): lives shown.
+    """
 
     def __init__(self, x: int, y: int, length: int, height: int) -> None:
         """Initializes the lives counter element.
@@ -77,10 +68,28 @@ class LivesCounter(Element):
         :param height: int, height.
         """
         super().__init__(x, y, length, height)
+        self.lives = 3
+
+    def update_lives(self, lives: int) -> None:
+        """Updates the lives shown.
+
+        :param lives: int, the lives left.
+        :raises TypeError: if lives is not an int.
+        :raises DomainError: if lives is negative.
+        """
+        if not isinstance(lives, int):
+            raise TypeError("lives must be an int")
+        if lives < 0:
+            raise DomainError("Lives cannot be negative.")
+        self.lives = lives
 
 
 class DeliveriesCounter(Element):
-    """HUD element that anchors the delivered-packages counter."""
+    """HUD element that anchors the delivered-packages counter.
+
+    Attributes:
+        deliveries (int): stored deliveries shown.
+    """
 
     def __init__(self, x: int, y: int, length: int, height: int) -> None:
         """Initializes the deliveries counter element.
@@ -91,3 +100,17 @@ class DeliveriesCounter(Element):
         :param height: int, height.
         """
         super().__init__(x, y, length, height)
+        self.deliveries = 0
+
+    def update_deliveries(self, deliveries: int) -> None:
+        """Updates the stored deliveries shown.
+
+        :param deliveries: int, the stored deliveries.
+        :raises TypeError: if deliveries is not an int.
+        :raises DomainError: if deliveries is negative.
+        """
+        if not isinstance(deliveries, int):
+            raise TypeError("deliveries must be an int")
+        if deliveries < 0:
+            raise DomainError("Deliveries cannot be negative.")
+        self.deliveries = deliveries
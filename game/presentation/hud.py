@@ -0,0 +1,245 @@
+"""Retained HUD panel showing the score, the stored deliveries and the lives.
+
+The sprites of the panel are composited once into an image. A second image
+keeps the panel without its counters, so when a counter changes only its
+glyphs are drawn again, over their own background. Drawing the HUD then
+costs a single blit per frame, whatever the length of the score.
+"""
+
+import pyxel
+
+from game.presentation.gui import DeliveriesCounter, LivesCounter, PointsCounter
+from game.presentation.pyxel_elements import Frame, PyxelElement
+
+# v coordinate of the glyph of every digit in the sprite sheet
+DIGIT_GLYPHS = tuple(18 + 16 * digit for digit in range(10))
+# v coordinate of the lives indicator showing 0 to 3 lives
+LIVES_GLYPHS = tuple(144 + 16 * (3 - lives) for lives in range(4))
+
+
+class Hud:
+    """Panel of the score, deliveries and lives drawn from a cached image.
+
+    The images are composited on the first draw, once Pyxel is initialized
+    and the sprite sheet loaded. The counters must not be covered by a
+    later sprite of the panel. The values drawn are read with :meth:`values`
+    and passed to :meth:`draw`, so a simulation thread can read them after
+    its tick and the Pyxel thread draw them from its snapshot.
+
+    Attributes:
+        panel (tuple[PyxelElement, ...]): Sprites of the panel in drawing
+            order, those of the counters included.
+        points_counter (PointsCounter): Score shown, its digits are spread
+            over the counter when they do not fit the spacing of the sheet.
+        lives_counter (LivesCounter): Lives shown.
+        deliveries_counter (DeliveriesCounter | None): Stored deliveries
+            shown, None if its sprite never changes.
+    """
+
+    def __init__(
+        self,
+        *panel: PyxelElement,
+        points_counter: PointsCounter,
+        lives_counter: LivesCounter,
+        deliveries_counter: DeliveriesCounter | None = None,
+    ) -> None:
+        """Initializes the HUD.
+
+        :param panel: PyxelElement, the sprites of the panel in drawing order.
+        :param points_counter: PointsCounter, the score, drawn by a sprite of
+            the panel whose first frame is the glyph of a digit.
+        :param lives_counter: LivesCounter, the lives, drawn by a sprite of
+            the panel.
+        :param deliveries_counter: DeliveriesCounter | None, the stored
+            deliveries, drawn by a sprite of the panel, or None if they are
+            not shown.
+        :raises ValueError: if a counter has no sprite in the panel.
+        """
+        self.panel = panel
+        self.points_counter = points_counter
+        self.lives_counter = lives_counter
+        self.deliveries_counter = deliveries_counter
+        sprites = {id(element.element): element for element in panel}
+        counters = [points_counter, lives_counter]
+        if deliveries_counter is not None:
+            counters.append(deliveries_counter)
+        for counter in counters:
+            if id(counter) not in sprites:
+                raise ValueError("every counter needs a sprite in the panel")
+        self._digit = sprites[id(points_counter)].frames[0]
+        self._lives = sprites[id(lives_counter)].frames[0]
+        self._deliveries = (
+            sprites[id(deliveries_counter)].frames[0]
+            if deliveries_counter is not None
+            else None
+        )
+        # Sprites whose glyphs are drawn on top of the background image
+        self._counters = {id(sprites[id(counter)]) for counter in counters}
+        self._image: pyxel.Image | None = None
+        self._background: pyxel.Image | None = None
+        self._left = 0
+        self._top = 0
+        self._width = 0
+        self._height = 0
+        self._colkey = 0
+        self._shown_digits: tuple[int, ...] = ()
+        self._shown_lives = -1
+        self._shown_deliveries = -1
+
+    def values(self) -> tuple[tuple[int, ...], int, int]:
+        """Reads the values shown by the counters.
+
+        :return: tuple of the digits of the score, the lives and the stored
+            deliveries (0 if they are not shown).
+        """
+        deliveries_counter = self.deliveries_counter
+        return (
+            self.points_counter.digits,
+            self.lives_counter.lives,
+            deliveries_counter.deliveries if deliveries_counter is not None else 0,
+        )
+
+    def draw(self, digits: tuple[int, ...], lives: int, deliveries: int) -> None:
+        """Redraws the changed counters and blits the panel.
+
+        :param digits: tuple[int, ...], the digits of the score, most
+            significant first.
+        :param lives: int, the lives.
+        :param deliveries: int, the stored deliveries, ignored if they are
+            not shown.
+        """
+        if self._image is None:
+            self._compose()
+        image = self._image
+        if image is None:
+            return
+        if digits != self._shown_digits:
+            self._draw_digits(digits)
+        if lives != self._shown_lives:
+            self._shown_lives = lives
+            self._draw_glyph(
+                self._lives,
+                self.lives_counter.x,
+                self.lives_counter.y,
+                LIVES_GLYPHS[min(lives, len(LIVES_GLYPHS) - 1)],
+            )
+        if self.deliveries_counter is not None and self._deliveries is not None:
+            if deliveries != self._shown_deliveries:
+                self._shown_deliveries = deliveries
+                self._draw_glyph(
+                    self._deliveries,
+                    self.deliveries_counter.x,
+                    self.deliveries_counter.y,
+                    DIGIT_GLYPHS[min(deliveries, len(DIGIT_GLYPHS) - 1)],
+                )
+        pyxel.blt(
+            self._left,
+            self._top,
+            image,
+            0,
+            0,
+            self._width,
+            self._height,
+            self._colkey,
+        )
+
+    def _compose(self) -> None:
+        """Composites the panel into the background and the shown images."""
+        blits = [blit for element in self.panel for blit in element.blits()]
+        self._left = min(blit[0] for blit in blits)
+        self._top = min(blit[1] for blit in blits)
+        self._width = max(blit[0] + abs(blit[5]) for blit in blits) - self._left
+        self._height = max(blit[1] + abs(blit[6]) for blit in blits) - self._top
+        self._colkey = _unused_color(blits)
+
+        background = pyxel.Image(self._width, self._height)
+        background.cls(self._colkey)
+        for element in self.panel:
+            if id(element) in self._counters:
+                continue
+            for x, y, *sprite in element.blits():
+                background.blt(x - self._left, y - self._top, *sprite)
+        image = pyxel.Image(self._width, self._height)
+        image.blt(0, 0, background, 0, 0, self._width, self._height)
+        self._background = background
+        self._image = image
+        self._shown_digits = ()
+        self._shown_lives = -1
+        self._shown_deliveries = -1
+
+    def _draw_digits(self, digits: tuple[int, ...]) -> None:
+        """Draws the digits of the score that changed.
+
+        Up to the number of frames of the counter, digits keep the spacing
+        of the sheet; longer scores are spread over the counter, right
+        aligned, down to glyphs touching each other.
+
+        :param digits: tuple[int, ...], the digits, most significant first.
+        """
+        counter = self.points_counter
+        frame = self._digit
+        # Spacing of the frames laid out by Grid.ROW
+        pitch = frame.h * (frame.scale if frame.scale else 1)
+        count = len(digits)
+        if count > 1 and frame.w + pitch * (count - 1) > counter.length:
+            pitch = max((counter.length - frame.w) // (count - 1), frame.w)
+        right = counter.x + frame.w + pitch * (min(count, counter.min_digits) - 1)
+        if count != len(self._shown_digits):
+            # The slots move, so the whole row is drawn again
+            self._restore(0, counter.y - self._top, self._width, frame.h)
+            self._shown_digits = ()
+        shown = self._shown_digits
+        for index, digit in enumerate(digits):
+            if shown and shown[index] == digit:
+                continue
+            x = right - frame.w - pitch * (count - 1 - index)
+            self._draw_glyph(frame, x, counter.y, DIGIT_GLYPHS[digit])
+        self._shown_digits = digits
+
+    def _draw_glyph(self, frame: Frame, x: int, y: int, v: int) -> None:
+        """Draws a glyph over its background.
+
+        :param frame: Frame, the sprite of the counter.
+        :param x: int, x coordinate of the glyph on the screen.
+        :param y: int, y coordinate of the glyph on the screen.
+        :param v: int, y coordinate of the glyph in the image bank.
+        """
+        image = self._image
+        if image is None:
+            return
+        x -= self._left
+        y -= self._top
+        self._restore(x, y, abs(frame.w), abs(frame.h))
+        image.blt(x, y, frame.image, frame.u, v, frame.w, frame.h, frame.colkey)
+
+    def _restore(self, x: int, y: int, width: int, height: int) -> None:
+        """Copies an area of the background image over the shown image.
+
+        :param x: int, x coordinate of the area in the images.
+        :param y: int, y coordinate of the area in the images.
+        :param width: int, width of the area.
+        :param height: int, height of the area.
+        """
+        if self._image is not None and self._background is not None:
+            self._image.blt(x, y, self._background, x, y, width, height)
+
+
+def _unused_color(blits: list[tuple]) -> int:
+    """Finds a color that no opaque pixel of the sprites uses.
+
+    :param blits: list[tuple], the arguments of the blits drawing the sprites.
+    :return: int, the color, to key out the empty parts of the panel.
+    :raises ValueError: if the sprites use every color.
+    """
+    used = set()
+    for _, _, bank, u, v, width, height, colkey, *_ in blits:
+        image = pyxel.images[bank]
+        for y in range(v, v + abs(height)):
+            for x in range(u, u + abs(width)):
+                color = image.pget(x, y)
+                if color != colkey:
+                    used.add(color)
+    for color in range(16):
+        if color not in used:
+            return color
+    raise ValueError("the sprites of the HUD use every color")
@@ -0,0 +1,136 @@
+from abc import ABC, abstractmethod
+
+import pyxel
+
+from game.recording import InputLog
+
+
+class InputSource(ABC):
+    """Source of the button presses polled by :class:`GameApp`.
+
+    The screen calls :meth:`bind` once with the polled buttons, then
+    :meth:`begin_tick` at the start of every update before polling
+    buttons with :meth:`btnp`.
+    """
+
+    def bind(self, buttons: list[int]) -> None:
+        """Receives the buttons that will be polled, in a stable order.
+
+        :param buttons: list[int], the polled key codes.
+        """
+
+    def begin_tick(self) -> None:
+        """Called once at the start of every update (no-op by default)."""
+
+    @abstractmethod
+    def btnp(self, button: int) -> bool:
+        """Returns whether the button was pressed during this tick.
+
+        :param button: int, the key code.
+        :return: bool, True if the button was pressed.
+        """
+        raise NotImplementedError
+
+
+class PyxelInput(InputSource):
+    """Live keyboard input read through :func:`pyxel.btnp`."""
+
+    def btnp(self, button: int) -> bool:
+        """Returns whether the key was pressed this frame.
+
+        :param button: int, the key code.
+        :return: bool, the value of :func:`pyxel.btnp`.
+        """
+        return pyxel.btnp(button)
+
+
+class RecordingInput(InputSource):
+    """Input source that records the presses of another source.
+
+    Attributes:
+        source (InputSource): The recorded source.
+        log (InputLog): The log receiving the presses of every tick.
+        tick (int): Index of the current tick, -1 before the first one.
+    """
+
+    def __init__(self, source: InputSource, log: InputLog) -> None:
+        """Initializes the recording input.
+
+        :param source: InputSource, the source being recorded.
+        :param log: InputLog, the log to write to.
+        """
+        self.source = source
+        self.log = log
+        self.tick = -1
+        self._bits: dict[int, int] = {}
+
+    def bind(self, buttons: list[int]) -> None:
+        """Assigns one bit of the log masks to every button.
+
+        :param buttons: list[int], the polled key codes.
+        """
+        self._bits = {button: 1 << index for index, button in enumerate(buttons)}
+        self.source.bind(buttons)
+
+    def begin_tick(self) -> None:
+        """Starts a new tick in the log."""
+        self.tick += 1
+        self.log.ticks = self.tick + 1
+        self.source.begin_tick()
+
+    def btnp(self, button: int) -> bool:
+        """Polls the recorded source and logs the press.
+
+        :param button: int, the key code.
+        :return: bool, True if the button was pressed.
+        """
+        pressed = self.source.btnp(button)
+        if pressed:
+            self.log.record(self.tick, self._bits.get(button, 0))
+        return pressed
+
+
+class ReplayInput(InputSource):
+    """Input source that plays back an :class:`InputLog`.
+
+    Once the log is exhausted no button is pressed anymore.
+
+    Attributes:
+        log (InputLog): The played log.
+        tick (int): Index of the current tick, -1 before the first one.
+    """
+
+    def __init__(self, log: InputLog) -> None:
+        """Initializes the replay input.
+
+        :param log: InputLog, the log to play back.
+        """
+        self.log = log
+        self.tick = -1
+        self._bits: dict[int, int] = {}
+        self._next_event = 0
+        self._mask = 0
+
+    def bind(self, buttons: list[int]) -> None:
+        """Maps the log mask bits back to the buttons.
+
+        :param buttons: list[int], the polled key codes.
+        """
+        self._bits = {button: 1 << index for index, button in enumerate(buttons)}
+
+    def begin_tick(self) -> None:
+        """Moves to the next tick and loads its presses."""
+        self.tick += 1
+        self._mask = 0
+        events = self.log.events
+        if self._next_event < len(events) and events[self._next_event][0] == self.tick:
+            self._mask = events[self._next_event][1]
+            self._next_event += 1
+
+    def btnp(self, button: int) -> bool:
+        """Returns whether the log presses the button on this tick.
+
+        :param button: int, the key code.
+        :return: bool, True if the button is pressed.
+        """
+        return bool(self._mask & self._bits.get(button, 0))
@@ -1,11 +1,23 @@
+import random
 import sys
 import subprocess
 from pathlib import Path
 
 import pyxel
 
+from game import gc_control, leaks, network, profiling, recording, soak
 from game.game_setup import create_game_app
+from game.headless import autopilot_from_environment
+from game.domain.clock import Clock, FixedStepClock
 from game.domain.difficulty import Difficulty
+from game.presentation.game_app import GameApp
+from game.presentation.inputs import (
+    InputSource,
+    PyxelInput,
+    RecordingInput,
+    ReplayInput,
+)
+from game.presentation.simulation import threaded_from_environment
 from game.presentation.window import Window
 from game.presentation.difficulty_selector import DifficultySelectorScreen
 from game.presentation.game_over import GameOverScreen
@@ -41,10 +53,43 @@ class App:
 
         # Determine which screen to boot into (gameplay, game over, or selector).
         if new_difficulty_value is not None and new_difficulty_value != -1:
+            # Recorded and replayed games run on a deterministic clock
+            clock: Clock | None = None
+            input_source: InputSource | None = None
+            replay_log = recording.replay_log_from_environment()
+            record_log = (
+                recording.start_recording_from_environment(new_difficulty_value)
+                if replay_log is None
+                else None
+            )
+            if replay_log is not None:
+                random.seed(replay_log.seed)
+                new_difficulty_value = replay_log.difficulty
+                clock = FixedStepClock(1 / replay_log.fps)
+                input_source = ReplayInput(replay_log)
+            elif record_log is not None:
+                clock = FixedStepClock(1 / record_log.fps)
+                input_source = RecordingInput(PyxelInput(), record_log)
+            turbo = soak.turbo_from_environment()
+            if turbo > 1 and clock is None:
+                # Turbo frames run several ticks of game time each
+                clock = FixedStepClock(1 / 60)
             self.current_screen = create_game_app(
                 selected_difficulty=Difficulty(new_difficulty_value),
                 app=self,
+                clock=clock,
+                input_source=input_source,
+                autopilot=autopilot_from_environment(),
+                remote=network.active_client(),
+                # Recordings are taken tick by tick on the Pyxel thread
+                threaded=threaded_from_environment()
+                and replay_log is None
+                and record_log is None,
+                turbo=turbo,
             )
+            # Everything built so far lives as long as the game screen
+            self.current_screen.gc_controller = gc_control.start_from_environment()
+            self.current_screen.leak_detector = leaks.start_from_environment()
         elif new_difficulty_value is not None and new_difficulty_value == -1:
             self.current_screen = GameOverScreen(
                 app=self,
@@ -60,12 +105,23 @@ class App:
         else:
             running_window = Window(width=200, height=175)
 
+        # While profiling, recording or writing a report, ESC is
+        # handled in update so the files get written before Pyxel terminates
+        # the process.
+        self.profiler = profiling.active_session()
+        self.handles_quit = (
+            self.profiler is not None
+            or recording.is_recording()
+            or gc_control.active_controller() is not None
+            or leaks.active_detector() is not None
+        )
+
         pyxel.init(
             running_window.width,
             running_window.height,
             title="Mario Bros. --- Game & Watch",
             fps=60,
-            quit_key=pyxel.KEY_ESCAPE,
+            quit_key=pyxel.KEY_NONE if self.handles_quit else pyxel.KEY_ESCAPE,
         )
         pyxel.fullscreen(True)
         pyxel.load(str(resource_path))
@@ -73,8 +129,21 @@ class App:
 
     def update(self) -> None:
         """Delegates update logic to the current screen."""
+        if (self.handles_quit and pyxel.btnp(pyxel.KEY_ESCAPE)) or (
+            self.profiler is not None and self.profiler.frame()
+        ):
+            self.quit()
         self.current_screen.update()
 
+    def quit(self) -> None:
+        """Writes the profiling reports and the recording, then quits Pyxel."""
+        profiling.stop_active_session()
+        gc_control.stop_active_controller()
+        leaks.stop_active_detector()
+        if isinstance(self.current_screen, GameApp):
+            recording.finish(self.current_screen.game.points)
+        pyxel.quit()
+
     def draw(self) -> None:
         """Delegates draw logic to the current screen."""
         self.current_screen.draw()
@@ -87,6 +156,7 @@ class App:
         """
         new_running_window = Window(difficulty=Difficulty(difficulty_value))
         project_root = Path(__file__).resolve().parents[2]
+        profiling.stop_active_session()
 
         subprocess.Popen(
             [
@@ -111,6 +181,10 @@ class App:
         """
         new_running_window = Window(width=200, height=175)
         project_root = Path(__file__).resolve().parents[2]
+        profiling.stop_active_session()
+        gc_control.stop_active_controller()
+        leaks.stop_active_detector()
+        recording.finish(points)
 
         subprocess.Popen(
             [
@@ -133,6 +207,7 @@ class App:
         """Restart the process and return to the difficulty selection screen."""
         new_running_window = Window(width=200, height=175)
         project_root = Path(__file__).resolve().parents[2]
+        profiling.stop_active_session()
 
         subprocess.Popen(
             [
@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from enum import Enum
 
 import pyxel
@@ -87,21 +88,29 @@ class PyxelElement(Element):
 
     def draw(self) -> None:
         """Puts every frame using the configured grid alignment."""
+        for blit in self.blits():
+            pyxel.blt(*blit)
+
+    def blits(self) -> Iterator[tuple]:
+        """Yields the arguments of the :func:`pyxel.blt` calls drawing the element.
+
+        :return: Iterator[tuple], one tuple of positional arguments per frame.
+        """
         element_x = self.element.x
         element_y = self.element.y
 
         for frame in self.frames:
-            pyxel.blt(
-                x=element_x,
-                y=element_y,
-                img=frame.image,
-                u=frame.u,
-                v=frame.v,
-                w=frame.w,
-                h=frame.h,
-                colkey=frame.colkey,
-                rotate=frame.rotate,
-                scale=frame.scale,
+            yield (
+                element_x,
+                element_y,
+                frame.image,
+                frame.u,
+                frame.v,
+                frame.w,
+                frame.h,
+                frame.colkey,
+                frame.rotate,
+                frame.scale,
             )
 
             if self.grid == Grid.ROW:
@@ -166,6 +175,13 @@ class BoardedPyxelElement(PyxelElement):
         """
         return self.decorated.element
 
+    def blits(self) -> Iterator[tuple]:
+        """Yields the blits of the decorated element, the border is not a sprite.
+
+        :return: Iterator[tuple], one tuple of positional arguments per frame.
+        """
+        return self.decorated.blits()
+
     def draw(self) -> None:
         """Draws a border around the decorated element and then the element itself."""
         target = self.decorated.element
@@ -0,0 +1,189 @@
+"""Game ticks on a worker thread, handed to the renderer as snapshots.
+
+The worker runs the ticks of a :class:`~game.presentation.game_app.GameApp`
+on its own fixed-step schedule and publishes after each one an immutable
+:class:`RenderSnapshot` of the scene. Snapshots are double buffered: the
+worker fills the back slot and then flips the index of the front slot, a
+single assignment, so the Pyxel thread draws the front snapshot without any
+lock and a slow tick only makes it draw the previous snapshot again.
+
+Key presses and sounds cross the threads through deques, whose appends and
+pops are atomic.
+"""
+
+import os
+import threading
+from collections import deque
+from collections.abc import Callable
+from time import perf_counter, sleep
+from typing import NamedTuple
+
+THREADED_ENV = "MARIO_BROS_THREADED"
+
+
+class RenderSnapshot(NamedTuple):
+    """Everything needed to draw one tick and leave the game.
+
+    Attributes:
+        tick (int): Number of the tick, from 1.
+        published_at (float): :func:`time.perf_counter` time of the publication.
+        blits (tuple[tuple, ...]): Positional arguments of the
+            :func:`pyxel.blt` calls of the elements, in drawing order.
+        is_over (bool): Whether the game over screen should be shown.
+        points (int): Points of the players.
+        seconds_alive (int): Seconds the players survived.
+        hud (tuple[tuple[int, ...], int, int]): Values shown by the HUD, see
+            :meth:`game.presentation.hud.Hud.values`.
+    """
+
+    tick: int
+    published_at: float
+    blits: tuple[tuple, ...]
+    is_over: bool
+    points: int
+    seconds_alive: int
+    hud: tuple[tuple[int, ...], int, int]
+
+
+class SimulationThread:
+    """Runs the ticks of a game on a daemon thread.
+
+    Attributes:
+        fps (int): Ticks per second.
+        max_catch_up (int): Late ticks run back to back before the schedule
+            is reset.
+        ticks (int): Ticks run so far.
+        max_tick_time (float): Longest tick, snapshot included, in seconds.
+        presented (int): Snapshots drawn at least once.
+        skipped (int): Snapshots replaced before being drawn.
+        handoff_time (float): Total seconds from publishing the presented
+            snapshots to drawing them for the first time.
+        max_handoff_time (float): Longest of these handoffs, in seconds.
+    """
+
+    def __init__(
+        self,
+        step: Callable[[set[int], int], RenderSnapshot],
+        fps: int = 60,
+        max_catch_up: int = 5,
+    ) -> None:
+        """Initializes a thread that has not started yet.
+
+        :param step: Callable, runs a tick with the keys pressed since the
+            previous one and the tick number, and returns its snapshot.
+        :param fps: int, ticks per second.
+        :param max_catch_up: int, late ticks run back to back at most.
+        """
+        self.fps = fps
+        self.max_catch_up = max_catch_up
+        self._step = step
+        self._presses: deque[int] = deque()
+        self._buffers: list[RenderSnapshot | None] = [None, None]
+        self._front = 0
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self.ticks = 0
+        self.max_tick_time = 0.0
+        self._last_presented = 0
+        self.presented = 0
+        self.skipped = 0
+        self.handoff_time = 0.0
+        self.max_handoff_time = 0.0
+
+    @property
+    def latest(self) -> RenderSnapshot | None:
+        """Returns the front snapshot.
+
+        :return: RenderSnapshot | None, the last published snapshot, None
+            before the first tick.
+        """
+        return self._buffers[self._front]
+
+    @property
+    def mean_handoff_time(self) -> float:
+        """Returns the mean delay between publishing and drawing a snapshot.
+
+        :return: float, seconds, 0 before the first snapshot was drawn.
+        """
+        return self.handoff_time / self.presented if self.presented else 0.0
+
+    def start(self) -> None:
+        """Starts running ticks."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="simulation", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stops running ticks after the current one."""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def press(self, button: int) -> None:
+        """Hands a key press to the next tick.
+
+        :param button: int, the key code.
+        """
+        self._presses.append(button)
+
+    def drawn(self, snapshot: RenderSnapshot) -> None:
+        """Measures the handoff of a snapshot the renderer just drew.
+
+        :param snapshot: RenderSnapshot, the drawn snapshot.
+        """
+        if snapshot.tick == self._last_presented:
+            return
+        handoff = perf_counter() - snapshot.published_at
+        self.skipped += max(snapshot.tick - self._last_presented - 1, 0)
+        self._last_presented = snapshot.tick
+        self.presented += 1
+        self.handoff_time += handoff
+        self.max_handoff_time = max(self.max_handoff_time, handoff)
+
+    def debug_lines(self) -> list[str]:
+        """Returns the lines of the debug HUD.
+
+        :return: list[str], the measurements as text.
+        """
+        return [
+            f"TICK {self.ticks} MAX {self.max_tick_time * 1000:.1f} MS",
+            f"HANDOFF {self.mean_handoff_time * 1000:.1f} MS"
+            f" MAX {self.max_handoff_time * 1000:.1f} MS",
+            f"SKIPPED {self.skipped}",
+        ]
+
+    def _run(self) -> None:
+        """Runs the ticks on schedule until stopped."""
+        step = 1 / self.fps
+        deadline = perf_counter()
+        while not self._stopping:
+            deadline += step
+            delay = deadline - perf_counter()
+            if delay > 0:
+                sleep(delay)
+            elif delay < -self.max_catch_up * step:
+                # Too late to catch up, the missed ticks are dropped
+                deadline = perf_counter()
+
+            pressed = set()
+            while self._presses:
+                pressed.add(self._presses.popleft())
+            started_at = perf_counter()
+            self.ticks += 1
+            snapshot = self._step(pressed, self.ticks)
+            self.max_tick_time = max(self.max_tick_time, perf_counter() - started_at)
+
+            back = 1 - self._front
+            self._buffers[back] = snapshot
+            self._front = back
+
+
+def threaded_from_environment() -> bool:
+    """Returns whether the environment asks to run the ticks on a thread.
+
+    :return: bool, True if :data:`THREADED_ENV` is set to a non-empty value.
+    """
+    return bool(os.environ.get(THREADED_ENV))
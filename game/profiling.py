@@ -0,0 +1,287 @@
+"""Profiling helpers used by the ``--profile`` mode of :mod:`game.main`.
+
+The configuration is stored in environment variables so that the profiler
+follows the application through the subprocess relaunches performed by
+:class:`game.presentation.main_app.App` when switching screens. Every process
+writes its own segment and merges it into a session-wide report.
+"""
+
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+from types import FrameType
+from typing import Any, Callable
+
+PROFILE_DIR_ENV = "MARIO_BROS_PROFILE"
+PROFILE_FRAMES_ENV = "MARIO_BROS_PROFILE_FRAMES"
+PROFILE_SECONDS_ENV = "MARIO_BROS_PROFILE_SECONDS"
+
+SESSION_PSTATS = "session.pstats"
+SESSION_COLLAPSED = "session.collapsed"
+
+_active_session: "ProfileSession | None" = None
+
+
+class StackSampler:
+    """Sampler that records the call stack of the main thread.
+
+    Each sample is stored in the collapsed-stack format understood by
+    ``flamegraph.pl`` and speedscope: frames joined by ``;`` from the
+    outermost call to the innermost one.
+
+    Pyxel keeps the GIL while it runs its loop, so a sampling thread would
+    starve; on platforms offering ``setitimer`` the samples are taken by a
+    CPU-time signal instead, and a thread is only used as a fallback.
+
+    Attributes:
+        interval (float): Seconds between two samples. Must be > 0.
+        samples (Counter[str]): Number of hits for each collapsed stack.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """Initializes the sampler.
+
+        :param interval: float, seconds between samples. Must be > 0.
+        :raises ValueError: if interval is not strictly positive.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be strictly greater than 0")
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._target_thread_id = threading.main_thread().ident
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._previous_handler: Callable[[int, FrameType | None], Any] | int | None = (
+            None
+        )
+
+    def start(self) -> None:
+        """Starts sampling the main thread."""
+        if hasattr(signal, "setitimer"):
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling."""
+        if hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+            return
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _on_signal(self, signum: int, frame: FrameType | None) -> None:
+        """Signal handler recording the interrupted stack.
+
+        :param signum: int, the received signal.
+        :param frame: FrameType | None, the frame that was interrupted.
+        """
+        self._record(frame)
+
+    def _run(self) -> None:
+        """Sampling loop executed by the fallback thread."""
+        while not self._stop_event.wait(self.interval):
+            if self._target_thread_id is not None:
+                self._record(sys._current_frames().get(self._target_thread_id))
+
+    def _record(self, frame: FrameType | None) -> None:
+        """Adds one sample for the stack ending at the given frame.
+
+        :param frame: FrameType | None, innermost frame of the sampled stack.
+        """
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[";".join(stack)] += 1
+
+    def write(self, path: Path) -> None:
+        """Writes the collected samples in collapsed-stack format.
+
+        :param path: Path, destination file.
+        """
+        with path.open("w", encoding="utf-8") as file:
+            for stack, count in self.samples.items():
+                file.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """Profiles one process, optionally limited by frames or seconds.
+
+    The deterministic profiler (:mod:`cProfile`) produces the ``.pstats``
+    output while a :class:`StackSampler` produces the collapsed stacks.
+
+    Attributes:
+        output_dir (Path): Directory where the reports are written.
+        max_frames (int | None): Frames left for the whole session, or None.
+        max_seconds (float | None): Seconds left for the whole session, or None.
+        label (str): Name used for the segment files of this process.
+        frames (int): Frames counted by :meth:`frame` in this process.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        max_frames: int | None = None,
+        max_seconds: float | None = None,
+        label: str = "app",
+    ) -> None:
+        """Initializes the profiling session.
+
+        :param output_dir: Path, directory for the reports (created if missing).
+        :param max_frames: int | None, frame budget left for the session.
+        :param max_seconds: float | None, time budget left for the session.
+        :param label: str, name used for this process' segment files.
+        :raises ValueError: if a budget is negative.
+        """
+        if max_frames is not None and max_frames < 0:
+            raise ValueError("max_frames cannot be negative")
+        if max_seconds is not None and max_seconds < 0:
+            raise ValueError("max_seconds cannot be negative")
+        self.output_dir = output_dir
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.label = label
+        self.frames = 0
+        self._profiler = cProfile.Profile()
+        self._sampler = StackSampler()
+        self._started_at = 0.0
+        self._running = False
+
+    def start(self) -> None:
+        """Starts both profilers."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._started_at = perf_counter()
+        self._running = True
+        self._sampler.start()
+        self._profiler.enable()
+
+    def frame(self) -> bool:
+        """Counts one frame of the running loop.
+
+        :return: bool, True when the frame or time budget is exhausted.
+        """
+        self.frames += 1
+        if self.max_frames is not None and self.frames >= self.max_frames:
+            return True
+        return (
+            self.max_seconds is not None
+            and perf_counter() - self._started_at >= self.max_seconds
+        )
+
+    def stop(self) -> None:
+        """Stops profiling, writes the reports and hands the budget to children.
+
+        Calling this method more than once has no effect.
+        """
+        if not self._running:
+            return
+        self._profiler.disable()
+        self._sampler.stop()
+        self._running = False
+
+        segment = len(list(self.output_dir.glob("[0-9][0-9][0-9]-*.pstats")))
+        prefix = self.output_dir / f"{segment:03d}-{self.label}"
+        self._profiler.dump_stats(f"{prefix}.pstats")
+        self._sampler.write(Path(f"{prefix}.collapsed"))
+
+        # Merge the new segment into the session-wide reports
+        session_pstats = self.output_dir / SESSION_PSTATS
+        stats = pstats.Stats(f"{prefix}.pstats")
+        if session_pstats.exists():
+            stats.add(str(session_pstats))
+        stats.dump_stats(str(session_pstats))
+        with (self.output_dir / SESSION_COLLAPSED).open("a", encoding="utf-8") as file:
+            file.write(Path(f"{prefix}.collapsed").read_text(encoding="utf-8"))
+
+        # Relaunched processes inherit the environment, so they get what is left
+        if self.max_frames is not None:
+            os.environ[PROFILE_FRAMES_ENV] = str(max(self.max_frames - self.frames, 0))
+        if self.max_seconds is not None:
+            elapsed = perf_counter() - self._started_at
+            os.environ[PROFILE_SECONDS_ENV] = str(max(self.max_seconds - elapsed, 0.0))
+
+
+def configure_from_argv(argv: list[str]) -> list[str]:
+    """Extracts the profiling options from the command line.
+
+    Recognized options are ``--profile DIR``, ``--profile-frames N`` and
+    ``--profile-seconds S``. They are stored in the environment so that
+    relaunched processes keep profiling.
+
+    :param argv: list[str], command line arguments without the program name.
+    :return: list[str], the remaining (positional) arguments.
+    :raises ValueError: if an option has no value.
+    """
+    options = {
+        "--profile": PROFILE_DIR_ENV,
+        "--profile-frames": PROFILE_FRAMES_ENV,
+        "--profile-seconds": PROFILE_SECONDS_ENV,
+    }
+    remaining = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in options:
+            value = next(arguments, None)
+            if value is None:
+                raise ValueError(f"{argument} expects a value")
+            os.environ[options[argument]] = value
+        else:
+            remaining.append(argument)
+    return remaining
+
+
+def start_from_environment(label: str) -> ProfileSession | None:
+    """Starts a profiling session if the environment asks for one.
+
+    :param label: str, name used for this process' segment files.
+    :return: ProfileSession | None, the running session or None.
+    """
+    global _active_session
+    output_dir = os.environ.get(PROFILE_DIR_ENV)
+    if not output_dir:
+        return None
+    frames = os.environ.get(PROFILE_FRAMES_ENV)
+    seconds = os.environ.get(PROFILE_SECONDS_ENV)
+    _active_session = ProfileSession(
+        Path(output_dir),
+        max_frames=int(frames) if frames else None,
+        max_seconds=float(seconds) if seconds else None,
+        label=label,
+    )
+    _active_session.start()
+    return _active_session
+
+
+def active_session() -> ProfileSession | None:
+    """Returns the profiling session running in this process, if any.
+
+    :return: ProfileSession | None, the active session.
+    """
+    return _active_session
+
+
+def stop_active_session() -> None:
+    """Stops the active profiling session, writing its reports."""
+    if _active_session is not None:
+        _active_session.stop()
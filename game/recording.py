@@ -0,0 +1,584 @@
+"""Deterministic input recording and replay.
+
+A recorded game is stored as an :class:`InputLog`: the difficulty, the
+seed of the random generator and the buttons pressed on every tick of a
+fixed-step clock. Replaying the log through the same controllers
+reproduces the game exactly, either in the Pyxel window or headless.
+
+Like profiling, recording and replay are requested through environment
+variables so that they survive the relaunch into the game screen. They
+apply to the next game only.
+"""
+
+import mmap
+import os
+import random
+import struct
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from game.domain.difficulty import Difficulty
+from game.encoding import read_varint, write_varint
+from game.headless import HeadlessGame
+
+RECORD_ENV = "MARIO_BROS_RECORD"
+REPLAY_ENV = "MARIO_BROS_REPLAY"
+SEED_ENV = "MARIO_BROS_SEED"
+
+_active_recording: "tuple[Path, InputLog] | None" = None
+
+
+class InputLog:
+    """Compact per-tick log of the buttons pressed during a game.
+
+    Only ticks with at least one press are stored, as ``(tick, mask)``
+    pairs where bit ``i`` of the mask is the ``i``-th bound button. On disk
+    the ticks are delta encoded as varints followed by a one-byte mask.
+
+    Attributes:
+        difficulty (int): Difficulty level of the recorded game.
+        seed (int): Seed of the random generator used for the game.
+        fps (int): Ticks per second of the fixed-step clock.
+        events (list[tuple[int, int]]): Ticks with presses and their masks.
+        ticks (int): Number of recorded ticks.
+        final_points (int): Points at the last recorded tick.
+    """
+
+    MAGIC = b"MBIL"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sBBHQII")
+
+    def __init__(
+        self,
+        difficulty: int,
+        seed: int,
+        fps: int = 60,
+        events: list[tuple[int, int]] | None = None,
+        ticks: int = 0,
+        final_points: int = 0,
+    ) -> None:
+        """Initializes the log.
+
+        :param difficulty: int, difficulty level of the game.
+        :param seed: int, seed of the random generator. Must be >= 0.
+        :param fps: int, ticks per second. Must be > 0.
+        :param events: list of ``(tick, mask)`` pairs sorted by tick.
+        :param ticks: int, number of recorded ticks.
+        :param final_points: int, points at the last recorded tick.
+        :raises ValueError: if seed is negative or fps is not positive.
+        """
+        if seed < 0:
+            raise ValueError("seed cannot be negative")
+        if fps <= 0:
+            raise ValueError("fps must be a positive integer")
+        self.difficulty = difficulty
+        self.seed = seed
+        self.fps = fps
+        self.events = events if events is not None else []
+        self.ticks = ticks
+        self.final_points = final_points
+
+    def record(self, tick: int, mask: int) -> None:
+        """Adds presses to a tick, merging them with presses already logged.
+
+        :param tick: int, the tick index, not lower than the last logged one.
+        :param mask: int, bit mask of the pressed buttons (8 buttons at most).
+        :raises ValueError: if the tick goes back in time or mask does not fit a byte.
+        """
+        if not 0 <= mask <= 0xFF:
+            raise ValueError("mask must fit in one byte")
+        if not mask:
+            return
+        if self.events:
+            last_tick, last_mask = self.events[-1]
+            if tick < last_tick:
+                raise ValueError("ticks must be recorded in order")
+            if tick == last_tick:
+                self.events[-1] = (tick, last_mask | mask)
+                return
+        self.events.append((tick, mask))
+
+    def masks(self, start: int = 0, stop: int | None = None) -> Iterator[int]:
+        """Yields the mask of every recorded tick, including empty ones.
+
+        :param start: int, first tick to yield.
+        :param stop: int | None, tick to stop before, the end of the log if None.
+        :return: Iterator[int], one mask per tick from ``start`` to ``stop - 1``.
+        """
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+        index = bisect_left(self.events, (start, 0))
+        for tick in range(start, stop):
+            if index < len(self.events) and self.events[index][0] == tick:
+                yield self.events[index][1]
+                index += 1
+            else:
+                yield 0
+
+    def seek(self, tick: int, rewind_seconds: float = 0.0) -> HeadlessGame:
+        """Builds the headless game and plays it up to a tick.
+
+        :param tick: int, number of recorded ticks to play.
+        :param rewind_seconds: float, length of the rewind window to keep, 0 for none.
+        :return: HeadlessGame, the game in its state at that tick.
+        """
+        headless = HeadlessGame(
+            Difficulty(self.difficulty),
+            seed=self.seed,
+            fps=self.fps,
+            rewind_seconds=rewind_seconds,
+        )
+        for mask in self.masks(0, tick):
+            headless.step(mask)
+        return headless
+
+    def to_bytes(self) -> bytes:
+        """Encodes the log.
+
+        :return: bytes, the binary representation of the log.
+        """
+        buffer = bytearray(
+            self._HEADER.pack(
+                self.MAGIC,
+                self.VERSION,
+                self.difficulty,
+                self.fps,
+                self.seed,
+                self.ticks,
+                self.final_points,
+            )
+        )
+        write_varint(buffer, len(self.events))
+        previous_tick = 0
+        for tick, mask in self.events:
+            write_varint(buffer, tick - previous_tick)
+            buffer.append(mask)
+            previous_tick = tick
+        return bytes(buffer)
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview) -> "InputLog":
+        """Decodes a log produced by :meth:`to_bytes`.
+
+        :param data: bytes | memoryview, the binary log.
+        :return: InputLog, the decoded log.
+        :raises ValueError: if the data is not an input log of a known version.
+        """
+        if len(data) < cls._HEADER.size:
+            raise ValueError("data is too short to be an input log")
+        magic, version, difficulty, fps, seed, ticks, final_points = (
+            cls._HEADER.unpack_from(data)
+        )
+        if magic != cls.MAGIC:
+            raise ValueError("data is not an input log")
+        if version != cls.VERSION:
+            raise ValueError(f"unsupported input log version {version}")
+        count, offset = read_varint(data, cls._HEADER.size)
+        events = []
+        tick = 0
+        for _ in range(count):
+            delta, offset = read_varint(data, offset)
+            tick += delta
+            events.append((tick, data[offset]))
+            offset += 1
+        return cls(difficulty, seed, fps, events, ticks, final_points)
+
+    def save(self, path: Path) -> None:
+        """Writes the log to a file.
+
+        :param path: Path, destination file.
+        """
+        path.write_bytes(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: Path) -> "InputLog":
+        """Reads a log from a file.
+
+        :param path: Path, the log file.
+        :return: InputLog, the decoded log.
+        """
+        return cls.from_bytes(path.read_bytes())
+
+
+class SeekableReplay:
+    """Replay file with periodic state keyframes and a footer index.
+
+    The file starts with the header of the recorded game, followed by one
+    segment per ``keyframe_interval`` ticks: the snapshot of the game at the
+    first tick of the segment (see :mod:`game.domain.snapshot`) and the
+    presses of the ticks of the segment. A footer lists the first tick and
+    the offset of every segment.
+
+    The file is memory-mapped: opening it only reads the header and the
+    index, and seeking reads a single keyframe and the presses between it
+    and the requested tick, which are then simulated headless.
+
+    Attributes:
+        difficulty (int): Difficulty level of the recorded game.
+        seed (int): Seed of the random generator used for the game.
+        fps (int): Ticks per second of the fixed-step clock.
+        ticks (int): Number of recorded ticks.
+        final_points (int): Points at the last recorded tick.
+        keyframe_interval (int): Ticks between keyframes.
+        keyframe_ticks (list[int]): First tick of every segment.
+    """
+
+    MAGIC = b"MBRF"
+    INDEX_MAGIC = b"MBRX"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sBBHQIII")
+    _SNAPSHOT_SIZE = struct.Struct("<I")
+    _INDEX_ENTRY = struct.Struct("<IQ")
+    _FOOTER = struct.Struct("<QI4s")
+
+    def __init__(self, path: Path) -> None:
+        """Opens a replay file and reads its index.
+
+        :param path: Path, a file written by :meth:`write`.
+        :raises ValueError: if the file is not a seekable replay of a known version.
+        """
+        self._file = path.open("rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("file is not a seekable replay") from None
+        self._data = memoryview(self._map)
+        try:
+            self._read_index()
+        except (ValueError, struct.error) as error:
+            self.close()
+            raise ValueError(f"file is not a valid seekable replay: {error}") from None
+
+    def _read_index(self) -> None:
+        """Decodes the header and the footer index."""
+        data = self._data
+        if len(data) < self._HEADER.size + self._FOOTER.size:
+            raise ValueError("file is too short")
+        (
+            magic,
+            version,
+            self.difficulty,
+            self.fps,
+            self.seed,
+            self.ticks,
+            self.final_points,
+            self.keyframe_interval,
+        ) = self._HEADER.unpack_from(data)
+        if magic != self.MAGIC:
+            raise ValueError("wrong magic number")
+        if version != self.VERSION:
+            raise ValueError(f"unsupported version {version}")
+        index_offset, count, index_magic = self._FOOTER.unpack_from(
+            data, len(data) - self._FOOTER.size
+        )
+        if index_magic != self.INDEX_MAGIC:
+            raise ValueError("missing index")
+        self.keyframe_ticks: list[int] = []
+        self._offsets: list[int] = []
+        for entry in range(count):
+            tick, offset = self._INDEX_ENTRY.unpack_from(
+                data, index_offset + entry * self._INDEX_ENTRY.size
+            )
+            self.keyframe_ticks.append(tick)
+            self._offsets.append(offset)
+        if not count:
+            raise ValueError("empty index")
+
+    def close(self) -> None:
+        """Unmaps and closes the file."""
+        self._data.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "SeekableReplay":
+        """Returns the open replay.
+
+        :return: SeekableReplay, this replay.
+        """
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Closes the replay when leaving a ``with`` block."""
+        self.close()
+
+    def _segment_of(self, tick: int) -> int:
+        """Returns the index of the segment containing a tick.
+
+        :param tick: int, a tick of the replay.
+        :return: int, the segment index.
+        """
+        return max(bisect_right(self.keyframe_ticks, tick) - 1, 0)
+
+    def _keyframe(self, segment: int) -> memoryview:
+        """Returns the snapshot stored at the start of a segment.
+
+        :param segment: int, the segment index.
+        :return: memoryview, the snapshot bytes inside the mapped file.
+        """
+        offset = self._offsets[segment]
+        (size,) = self._SNAPSHOT_SIZE.unpack_from(self._data, offset)
+        start = offset + self._SNAPSHOT_SIZE.size
+        return self._data[start : start + size]
+
+    def _events(self, segment: int) -> list[tuple[int, int]]:
+        """Decodes the presses of a segment.
+
+        :param segment: int, the segment index.
+        :return: list of ``(tick, mask)`` pairs sorted by tick.
+        """
+        offset = self._offsets[segment]
+        (size,) = self._SNAPSHOT_SIZE.unpack_from(self._data, offset)
+        offset += self._SNAPSHOT_SIZE.size + size
+        count, offset = read_varint(self._data, offset)
+        tick = self.keyframe_ticks[segment]
+        events = []
+        for _ in range(count):
+            delta, offset = read_varint(self._data, offset)
+            tick += delta
+            events.append((tick, self._data[offset]))
+            offset += 1
+        return events
+
+    def masks(self, start: int = 0, stop: int | None = None) -> Iterator[int]:
+        """Yields the mask of every tick in a range, reading only its segments.
+
+        :param start: int, first tick to yield.
+        :param stop: int | None, tick to stop before, the end of the replay if None.
+        :return: Iterator[int], one mask per tick from ``start`` to ``stop - 1``.
+        """
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+        tick = start
+        segment = self._segment_of(start)
+        while tick < stop:
+            segment_stop = (
+                self.keyframe_ticks[segment + 1]
+                if segment + 1 < len(self.keyframe_ticks)
+                else self.ticks
+            )
+            presses = dict(self._events(segment))
+            while tick < min(stop, segment_stop):
+                yield presses.get(tick, 0)
+                tick += 1
+            segment += 1
+
+    def seek(self, tick: int, rewind_seconds: float = 0.0) -> HeadlessGame:
+        """Resumes the game at a tick from the closest keyframe before it.
+
+        :param tick: int, the tick to seek to, clamped to the recorded ticks.
+        :param rewind_seconds: float, length of the rewind window to keep, 0 for none.
+        :return: HeadlessGame, the game in its state at that tick.
+        """
+        tick = min(max(tick, 0), self.ticks)
+        segment = self._segment_of(tick)
+        headless = HeadlessGame.from_snapshot(
+            self._keyframe(segment), fps=self.fps, rewind_seconds=rewind_seconds
+        )
+        for mask in self.masks(self.keyframe_ticks[segment], tick):
+            headless.step(mask)
+        return headless
+
+    def input_log(self) -> InputLog:
+        """Extracts the full input log, reading every segment.
+
+        :return: InputLog, the recorded presses.
+        """
+        events = []
+        for segment in range(len(self.keyframe_ticks)):
+            events.extend(self._events(segment))
+        return InputLog(
+            self.difficulty,
+            self.seed,
+            self.fps,
+            events,
+            self.ticks,
+            self.final_points,
+        )
+
+    @classmethod
+    def write(cls, path: Path, log: InputLog, keyframe_interval: int = 600) -> None:
+        """Writes a seekable replay of a log, simulating it to take the keyframes.
+
+        :param path: Path, destination file.
+        :param log: InputLog, the log to convert.
+        :param keyframe_interval: int, ticks between keyframes. Must be > 0.
+        :raises ValueError: if keyframe_interval is not positive.
+        """
+        if keyframe_interval <= 0:
+            raise ValueError("keyframe_interval must be a positive integer")
+        buffer = bytearray(
+            cls._HEADER.pack(
+                cls.MAGIC,
+                cls.VERSION,
+                log.difficulty,
+                log.fps,
+                log.seed,
+                log.ticks,
+                log.final_points,
+                keyframe_interval,
+            )
+        )
+        headless = HeadlessGame(Difficulty(log.difficulty), seed=log.seed, fps=log.fps)
+        index = []
+        for start in range(0, max(log.ticks, 1), keyframe_interval):
+            stop = min(start + keyframe_interval, log.ticks)
+            index.append((start, len(buffer)))
+            snapshot = headless.snapshot()
+            buffer += cls._SNAPSHOT_SIZE.pack(len(snapshot))
+            buffer += snapshot
+            first = bisect_left(log.events, (start, 0))
+            last = bisect_left(log.events, (stop, 0))
+            write_varint(buffer, last - first)
+            previous_tick = start
+            for tick, mask in log.events[first:last]:
+                write_varint(buffer, tick - previous_tick)
+                buffer.append(mask)
+                previous_tick = tick
+            for mask in log.masks(start, stop):
+                headless.step(mask)
+        index_offset = len(buffer)
+        for tick, offset in index:
+            buffer += cls._INDEX_ENTRY.pack(tick, offset)
+        buffer += cls._FOOTER.pack(index_offset, len(index), cls.INDEX_MAGIC)
+        path.write_bytes(buffer)
+
+
+def is_seekable_replay(path: Path) -> bool:
+    """Returns whether a file is a seekable replay rather than a plain log.
+
+    :param path: Path, the file to check.
+    :return: bool, True if the file starts with the seekable replay magic.
+    """
+    with path.open("rb") as file:
+        return file.read(len(SeekableReplay.MAGIC)) == SeekableReplay.MAGIC
+
+
+def load_input_log(path: Path) -> InputLog:
+    """Loads the input log of a plain log or of a seekable replay.
+
+    :param path: Path, the file to load.
+    :return: InputLog, the recorded presses.
+    """
+    if is_seekable_replay(path):
+        with SeekableReplay(path) as replay:
+            return replay.input_log()
+    return InputLog.load(path)
+
+
+def configure_from_argv(argv: list[str]) -> list[str]:
+    """Extracts the recording options from the command line.
+
+    Recognized options are ``--record FILE``, ``--replay FILE`` and
+    ``--seed N``. They are stored in the environment so that the relaunched
+    game process picks them up.
+
+    :param argv: list[str], command line arguments without the program name.
+    :return: list[str], the remaining arguments.
+    :raises ValueError: if an option has no value.
+    """
+    options = {"--record": RECORD_ENV, "--replay": REPLAY_ENV, "--seed": SEED_ENV}
+    remaining = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in options:
+            value = next(arguments, None)
+            if value is None:
+                raise ValueError(f"{argument} expects a value")
+            os.environ[options[argument]] = value
+        else:
+            remaining.append(argument)
+    return remaining
+
+
+def replay_path_from_environment() -> Path | None:
+    """Returns the log to replay, if the environment asks for a replay.
+
+    :return: Path | None, the log file or None.
+    """
+    path = os.environ.get(REPLAY_ENV)
+    return Path(path) if path else None
+
+
+def replay_log_from_environment() -> InputLog | None:
+    """Loads the log to replay, if the environment asks for a replay.
+
+    :return: InputLog | None, the log or None.
+    """
+    path = replay_path_from_environment()
+    return load_input_log(path) if path is not None else None
+
+
+def start_recording_from_environment(difficulty: int) -> InputLog | None:
+    """Seeds the random generator and starts recording if requested.
+
+    :param difficulty: int, difficulty level of the game being recorded.
+    :return: InputLog | None, the log to fill, or None when not recording.
+    """
+    global _active_recording
+    path = os.environ.get(RECORD_ENV)
+    if not path:
+        return None
+    seed_value = os.environ.get(SEED_ENV)
+    seed = int(seed_value) if seed_value else random.getrandbits(32)
+    random.seed(seed)
+    log = InputLog(difficulty, seed)
+    _active_recording = (Path(path), log)
+    return log
+
+
+def is_recording() -> bool:
+    """Returns whether this process is recording a game.
+
+    :return: bool, True if a recording was started.
+    """
+    return _active_recording is not None
+
+
+def finish(final_points: int) -> None:
+    """Saves the active recording and ends recording and replay.
+
+    Later games started by relaunched processes are played normally.
+
+    :param final_points: int, points at the end of the recording.
+    """
+    global _active_recording
+    if _active_recording is not None:
+        path, log = _active_recording
+        log.final_points = final_points
+        log.save(path)
+        _active_recording = None
+    for name in (RECORD_ENV, REPLAY_ENV, SEED_ENV):
+        os.environ.pop(name, None)
+
+
+def replay_headless(
+    log: InputLog | SeekableReplay,
+    on_tick: Callable[[], bool] | None = None,
+    rewind_seconds: float = 0.0,
+    start_tick: int = 0,
+    hash_states: bool = False,
+    headless: HeadlessGame | None = None,
+) -> HeadlessGame:
+    """Replays a log without Pyxel, as fast as possible.
+
+    :param log: InputLog | SeekableReplay, the recording to replay.
+    :param on_tick: optional callable run after every tick; returning True
+        stops the replay early.
+    :param rewind_seconds: float, length of the rewind window to keep, 0 for none.
+    :param start_tick: int, tick to seek to before replaying the rest.
+    :param hash_states: bool, whether to record the state hash of every tick
+        in ``state_hashes``.
+    :param headless: HeadlessGame | None, the game already seeked to the
+        start tick of the log, or None to seek it here.
+    :return: HeadlessGame, the game in its state after the last replayed tick.
+    """
+    if headless is None:
+        headless = log.seek(start_tick, rewind_seconds)
+    if hash_states:
+        headless.hash_states()
+    for mask in log.masks(headless.ticks):
+        if not headless.step(mask):
+            break
+        if on_tick is not None and on_tick():
+            break
+    return headless
@@ -0,0 +1,234 @@
+"""Fixed-memory rewind buffer of recent game states.
+
+The buffer keeps one entry per tick for a sliding window of ticks: a full
+snapshot (see :mod:`game.domain.snapshot`) every ``keyframe_interval``
+ticks and, in between, the byte delta against the previous tick. Most
+fields of a snapshot do not change from one tick to the next (packages
+only move every few ticks), so deltas are usually a few bytes long.
+"""
+
+from game.encoding import read_varint, write_varint
+
+
+def encode_delta(previous: bytes, current: bytes) -> bytes:
+    """Encodes the bytes that changed between two snapshots.
+
+    The delta is the length of ``current`` followed by runs of changed bytes,
+    each stored as the gap since the previous run, the run length and the
+    new bytes. Changed bytes are found by XOR-ing both snapshots as integers,
+    which is much faster than comparing them byte by byte in Python.
+
+    :param previous: bytes, the older snapshot.
+    :param current: bytes, the newer snapshot.
+    :return: bytes, the delta accepted by :func:`apply_delta`.
+    """
+    buffer = bytearray()
+    write_varint(buffer, len(current))
+    common = min(len(previous), len(current))
+    changed = int.from_bytes(previous[:common], "little") ^ int.from_bytes(
+        current[:common], "little"
+    )
+    end_of_last_run = 0
+    while changed:
+        unchanged = ((changed & -changed).bit_length() - 1) >> 3
+        changed >>= unchanged * 8
+        start = end_of_last_run + unchanged
+        size = 0
+        while changed & 0xFF:
+            changed >>= 8
+            size += 1
+        write_varint(buffer, unchanged)
+        write_varint(buffer, size)
+        buffer += current[start : start + size]
+        end_of_last_run = start + size
+    if len(current) > common:
+        write_varint(buffer, common - end_of_last_run)
+        write_varint(buffer, len(current) - common)
+        buffer += current[common:]
+    return bytes(buffer)
+
+
+def _patch(snapshot: bytearray, delta: bytes) -> None:
+    """Applies a delta to a snapshot in place.
+
+    :param snapshot: bytearray, the snapshot the delta was computed against.
+    :param delta: bytes, a delta made by :func:`encode_delta`.
+    """
+    length, offset = read_varint(delta, 0)
+    if len(snapshot) > length:
+        del snapshot[length:]
+    else:
+        snapshot.extend(bytes(length - len(snapshot)))
+    position = 0
+    while offset < len(delta):
+        gap, offset = read_varint(delta, offset)
+        size, offset = read_varint(delta, offset)
+        position += gap
+        snapshot[position : position + size] = delta[offset : offset + size]
+        position += size
+        offset += size
+
+
+def apply_delta(previous: bytes, delta: bytes) -> bytes:
+    """Rebuilds a snapshot from the previous one and a delta.
+
+    :param previous: bytes, the snapshot the delta was computed against.
+    :param delta: bytes, a delta made by :func:`encode_delta`.
+    :return: bytes, the newer snapshot.
+    """
+    snapshot = bytearray(previous)
+    _patch(snapshot, delta)
+    return bytes(snapshot)
+
+
+class RewindBuffer:
+    """Ring buffer of the snapshots of the last ``capacity`` ticks.
+
+    Recording a tick is O(1): the entry replaces the oldest one. Seeking
+    loads the closest keyframe at or before the tick and applies at most
+    ``keyframe_interval - 1`` deltas. Recording a tick that is not the one
+    following the last recorded tick drops the later ticks first, so the
+    game can be resumed from a rewound state.
+
+    Attributes:
+        capacity (int): Number of ticks kept. Must be > 0.
+        keyframe_interval (int): Ticks between full snapshots. Must be > 0.
+        fps (int): Ticks per second, used to report the memory per minute.
+    """
+
+    def __init__(
+        self, seconds: float = 60.0, fps: int = 60, keyframe_interval: int = 60
+    ) -> None:
+        """Initializes an empty buffer.
+
+        :param seconds: float, length of the rewind window in seconds. Must be > 0.
+        :param fps: int, ticks per second. Must be > 0.
+        :param keyframe_interval: int, ticks between full snapshots. Must be > 0.
+        :raises ValueError: if a parameter is not positive.
+        """
+        if seconds <= 0:
+            raise ValueError("seconds must be strictly greater than 0")
+        if fps <= 0:
+            raise ValueError("fps must be a positive integer")
+        if keyframe_interval <= 0:
+            raise ValueError("keyframe_interval must be a positive integer")
+        self.fps = fps
+        self.capacity = max(int(seconds * fps), 1)
+        # A keyframe must always remain in the window
+        self.keyframe_interval = min(keyframe_interval, self.capacity)
+        self._entries = [b""] * self.capacity
+        self._is_keyframe = bytearray(self.capacity)
+        self._previous = b""
+        self._first_tick = 0
+        self._last_tick = -1
+        self._memory = 0
+
+    def __len__(self) -> int:
+        """Returns the number of recorded ticks in the window.
+
+        :return: int, the number of ticks.
+        """
+        return self._last_tick - self._first_tick + 1
+
+    @property
+    def last_tick(self) -> int:
+        """Returns the last recorded tick.
+
+        :return: int, the tick, -1 when the buffer is empty.
+        """
+        return self._last_tick
+
+    @property
+    def first_tick(self) -> int:
+        """Returns the oldest tick that can still be restored.
+
+        :return: int, the tick of the oldest keyframe in the window.
+        :raises ValueError: if the buffer is empty.
+        """
+        if not len(self):
+            raise ValueError("rewind buffer is empty")
+        tick = self._first_tick
+        while not self._is_keyframe[tick % self.capacity]:
+            tick += 1
+        return tick
+
+    @property
+    def memory_bytes(self) -> int:
+        """Returns the bytes taken by the stored snapshots and deltas.
+
+        :return: int, the payload size of the window.
+        """
+        return self._memory
+
+    @property
+    def memory_per_minute(self) -> float:
+        """Returns the payload size of one minute of play at the current rate.
+
+        :return: float, bytes per minute of recorded ticks.
+        """
+        if not len(self):
+            return 0.0
+        return self._memory * self.fps * 60 / len(self)
+
+    def clear(self) -> None:
+        """Forgets every recorded tick."""
+        self._entries = [b""] * self.capacity
+        self._is_keyframe = bytearray(self.capacity)
+        self._previous = b""
+        self._first_tick = 0
+        self._last_tick = -1
+        self._memory = 0
+
+    def record(self, tick: int, snapshot: bytes) -> None:
+        """Stores the snapshot of a tick.
+
+        :param tick: int, the tick of the snapshot. Must be >= 0.
+        :param snapshot: bytes, the state of the game at that tick.
+        :raises ValueError: if tick is negative.
+        """
+        if tick < 0:
+            raise ValueError("tick cannot be negative")
+        if tick != self._last_tick + 1 or not len(self):
+            if len(self) and self.first_tick < tick <= self._last_tick + 1:
+                # Resuming from a rewound state drops the ticks after it
+                self._previous = self.snapshot_at(tick - 1)
+                for dropped in range(tick, self._last_tick + 1):
+                    slot = dropped % self.capacity
+                    self._memory -= len(self._entries[slot])
+                    self._entries[slot] = b""
+                    self._is_keyframe[slot] = False
+                self._last_tick = tick - 1
+            else:
+                self.clear()
+                self._first_tick = tick
+                self._last_tick = tick - 1
+
+        slot = tick % self.capacity
+        keyframe = tick % self.keyframe_interval == 0 or tick == self._first_tick
+        entry = snapshot if keyframe else encode_delta(self._previous, snapshot)
+        self._memory -= len(self._entries[slot])
+        self._entries[slot] = entry
+        self._is_keyframe[slot] = keyframe
+        self._memory += len(entry)
+        self._previous = snapshot
+        self._last_tick = tick
+        self._first_tick = max(self._first_tick, tick - self.capacity + 1)
+
+    def snapshot_at(self, tick: int) -> bytes:
+        """Rebuilds the snapshot of a tick of the window.
+
+        :param tick: int, between :attr:`first_tick` and :attr:`last_tick`.
+        :return: bytes, the snapshot of that tick.
+        :raises ValueError: if the tick is not in the window.
+        """
+        if not len(self) or not self.first_tick <= tick <= self._last_tick:
+            raise ValueError(f"tick {tick} is not in the rewind window")
+        if tick == self._last_tick:
+            return self._previous
+        keyframe_tick = tick
+        while not self._is_keyframe[keyframe_tick % self.capacity]:
+            keyframe_tick -= 1
+        snapshot = bytearray(self._entries[keyframe_tick % self.capacity])
+        for delta_tick in range(keyframe_tick + 1, tick + 1):
+            _patch(snapshot, self._entries[delta_tick % self.capacity])
+        return bytes(snapshot)
@@ -0,0 +1,479 @@
+"""Asyncio server hosting many headless games in one process.
+
+Every connection plays one game. The client opens it with a hello message
+and then sends one byte per button press; the server answers with its
+session id and, on every tick, a small state frame. Sessions tick on their
+own fixed step, from the moment they were opened, and a single scheduler
+coroutine steps every session that is due, so the event loop only wakes
+up once per batch of due sessions instead of once per session and tick.
+
+Backpressure:
+  * inputs pressed between two ticks are OR-ed into a single mask, so a
+    client sending too fast only costs the reads;
+  * state frames are dropped while the write buffer of a client is above
+    ``write_buffer_limit``, the next frame sent carries the current state;
+  * a session more than ``max_catch_up`` ticks late skips the missed ticks
+    instead of stepping them all at once.
+
+The lag of a tick is the delay between its deadline and the moment it was
+stepped; it is tracked per session and summarized in the reports.
+
+Protocol (little-endian):
+  * client hello: ``MBSV``, version, difficulty, autopilot flags (bit 0
+    Mario, bit 1 Luigi) and the seed as a signed 64-bit integer, -1 for none;
+  * client input: one byte per press, the bit mask over the controllers of
+    :func:`game.headless.create_controllers`;
+  * server hello: ``MBSV``, version and the session id as a 32-bit integer;
+  * server state: tick (32 bits), points (32 bits), lives and flags (bit 0
+    game over, bit 1 the players are taking a break), one byte each.
+
+The server closes the connection after the frame of the game over.
+
+Usage::
+
+    python -m game.server serve --socket mario_bros.sock
+    python -m game.server load --socket mario_bros.sock --sessions 500
+"""
+
+import argparse
+import asyncio
+import heapq
+import random
+import statistics
+import struct
+import sys
+from time import process_time
+
+from game.domain.difficulty import Difficulty
+from game.headless import HeadlessGame
+
+MAGIC = b"MBSV"
+VERSION = 1
+DEFAULT_SOCKET = "mario_bros.sock"
+
+_CLIENT_HELLO = struct.Struct("<4sBBBq")
+_SERVER_HELLO = struct.Struct("<4sBI")
+_STATE = struct.Struct("<IIBB")
+
+_AUTOPILOT_NAMES = ("mario", "luigi")
+
+
+class Session:
+    """One game hosted by the server.
+
+    Attributes:
+        session_id (int): Identifier sent to the client.
+        headless (HeadlessGame): The game.
+        writer (asyncio.StreamWriter): Stream to the client.
+        step (float): Seconds between two ticks.
+        deadline (float): Event loop time at which the next tick is due.
+        pressed (int): Mask of the controllers pressed since the last tick.
+        closed (bool): Whether the session has ended.
+        lag_total (float): Sum of the lags of the stepped ticks, in seconds.
+        lag_ticks (int): Number of ticks summed in ``lag_total``.
+        lag_max (float): Largest lag of a stepped tick, in seconds.
+        skipped_ticks (int): Ticks skipped because the session was too late.
+        dropped_frames (int): State frames dropped by backpressure.
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        headless: HeadlessGame,
+        writer: asyncio.StreamWriter,
+        start: float,
+        fps: int = 60,
+    ) -> None:
+        """Initializes a session whose first tick is due one step after start.
+
+        :param session_id: int, identifier sent to the client.
+        :param headless: HeadlessGame, the game.
+        :param writer: asyncio.StreamWriter, stream to the client.
+        :param start: float, event loop time at which the session opens.
+        :param fps: int, ticks per second.
+        """
+        self.session_id = session_id
+        self.headless = headless
+        self.writer = writer
+        self.step = 1 / fps
+        self.deadline = start + self.step
+        self.pressed = 0
+        self.closed = False
+        self.reset_statistics()
+
+    @property
+    def mean_lag(self) -> float:
+        """Returns the mean lag of the stepped ticks.
+
+        :return: float, seconds, 0 before the first tick.
+        """
+        return self.lag_total / self.lag_ticks if self.lag_ticks else 0.0
+
+    def reset_statistics(self) -> None:
+        """Starts measuring the lags, skipped ticks and dropped frames again."""
+        self.lag_total = 0.0
+        self.lag_ticks = 0
+        self.lag_max = 0.0
+        self.skipped_ticks = 0
+        self.dropped_frames = 0
+
+    def tick(self, now: float, max_catch_up: int, write_buffer_limit: int) -> None:
+        """Steps the ticks that are due and sends the state to the client.
+
+        :param now: float, current event loop time.
+        :param max_catch_up: int, ticks stepped at most in one call.
+        :param write_buffer_limit: int, bytes waiting to be sent above which
+            the state frame is dropped.
+        """
+        late = int((now - self.deadline) / self.step)
+        if late >= max_catch_up:
+            self.skipped_ticks += late - max_catch_up + 1
+            self.deadline += (late - max_catch_up + 1) * self.step
+        headless = self.headless
+        running = True
+        while running and self.deadline <= now:
+            lag = now - self.deadline
+            self.lag_total += lag
+            self.lag_ticks += 1
+            if lag > self.lag_max:
+                self.lag_max = lag
+            running = headless.step(self.pressed)
+            self.pressed = 0
+            self.deadline += self.step
+
+        transport = self.writer.transport
+        if not running:
+            self.closed = True
+        elif transport.get_write_buffer_size() > write_buffer_limit:
+            self.dropped_frames += 1
+            return
+        session = headless.session
+        flags = (1 if not running else 0) | (2 if session.is_taking_a_break else 0)
+        self.writer.write(
+            _STATE.pack(
+                headless.ticks, headless.game.points, headless.game.live_amount, flags
+            )
+        )
+        if self.closed:
+            self.writer.close()
+
+
+class GameServer:
+    """Hosts headless game sessions for clients of a local socket.
+
+    Attributes:
+        fps (int): Ticks per second of every session.
+        max_catch_up (int): Ticks a late session steps at most at once.
+        write_buffer_limit (int): Bytes waiting to be sent to a client above
+            which its state frames are dropped.
+        sessions (dict[int, Session]): Open sessions by id.
+        finished (list[Session]): Sessions that ended since the last report.
+    """
+
+    def __init__(
+        self,
+        fps: int = 60,
+        max_catch_up: int = 4,
+        write_buffer_limit: int = 16 * 1024,
+    ) -> None:
+        """Initializes a server without sessions.
+
+        :param fps: int, ticks per second of every session. Must be > 0.
+        :param max_catch_up: int, ticks a late session steps at most at once.
+            Must be > 0.
+        :param write_buffer_limit: int, bytes waiting to be sent to a client
+            above which its state frames are dropped.
+        :raises ValueError: if fps or max_catch_up is not positive.
+        """
+        if fps <= 0:
+            raise ValueError("fps must be a positive integer")
+        if max_catch_up <= 0:
+            raise ValueError("max_catch_up must be a positive integer")
+        self.fps = fps
+        self.max_catch_up = max_catch_up
+        self.write_buffer_limit = write_buffer_limit
+        self.sessions: dict[int, Session] = {}
+        self.finished: list[Session] = []
+        self._schedule: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+        self._next_id = 1
+        self._stepped_ticks = 0
+        self._cpu_time = process_time()
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Plays one game for a connected client.
+
+        :param reader: asyncio.StreamReader, stream from the client.
+        :param writer: asyncio.StreamWriter, stream to the client.
+        """
+        try:
+            hello = await reader.readexactly(_CLIENT_HELLO.size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        magic, version, difficulty, autopilot, seed = _CLIENT_HELLO.unpack(hello)
+        if magic != MAGIC or version != VERSION or difficulty > 3:
+            writer.close()
+            return
+
+        headless = HeadlessGame(
+            Difficulty(difficulty),
+            seed=seed if seed >= 0 else None,
+            fps=self.fps,
+            autopilot=[
+                name
+                for bit, name in enumerate(_AUTOPILOT_NAMES)
+                if autopilot & (1 << bit)
+            ],
+        )
+        session_id = self._next_id
+        self._next_id += 1
+        session = Session(
+            session_id, headless, writer, asyncio.get_running_loop().time(), self.fps
+        )
+        self.sessions[session_id] = session
+        writer.write(_SERVER_HELLO.pack(MAGIC, VERSION, session_id))
+        heapq.heappush(self._schedule, (session.deadline, session_id))
+        self._wakeup.set()
+
+        try:
+            while not session.closed:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for mask in data:
+                    session.pressed |= mask
+        except ConnectionError:
+            pass
+        finally:
+            session.closed = True
+            self.sessions.pop(session_id, None)
+            self.finished.append(session)
+            writer.close()
+
+    async def run_scheduler(self) -> None:
+        """Steps every session when its tick is due, forever."""
+        loop = asyncio.get_running_loop()
+        schedule = self._schedule
+        while True:
+            if not schedule:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = schedule[0][0] - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            now = loop.time()
+            while schedule and schedule[0][0] <= now:
+                _, session_id = heapq.heappop(schedule)
+                session = self.sessions.get(session_id)
+                if session is None or session.closed:
+                    continue
+                ticks = session.headless.ticks
+                try:
+                    session.tick(now, self.max_catch_up, self.write_buffer_limit)
+                except ConnectionError:
+                    session.closed = True
+                self._stepped_ticks += session.headless.ticks - ticks
+                if not session.closed:
+                    heapq.heappush(schedule, (session.deadline, session_id))
+            # Lets the clients be served between two batches
+            await asyncio.sleep(0)
+
+    def report(self, interval: float) -> str:
+        """Summarizes the sessions since the last report and resets the counters.
+
+        :param interval: float, seconds since the last report.
+        :return: str, one line with the sessions, tick rate, lags and CPU use.
+        """
+        sessions = [*self.sessions.values(), *self.finished]
+        self.finished = []
+        ticks = self._stepped_ticks
+        self._stepped_ticks = 0
+        cpu = process_time()
+        cpu_share = (cpu - self._cpu_time) / interval
+        self._cpu_time = cpu
+        if not sessions:
+            return "no sessions"
+        mean_lags = sorted(session.mean_lag * 1000 for session in sessions)
+        max_lags = sorted(session.lag_max * 1000 for session in sessions)
+        dropped = sum(session.dropped_frames for session in sessions)
+        skipped = sum(session.skipped_ticks for session in sessions)
+        worst = max(sessions, key=lambda session: session.lag_max)
+        for session in sessions:
+            session.reset_statistics()
+        return (
+            f"{len(self.sessions)} sessions, {ticks / interval:.0f} ticks/s, "
+            f"CPU {cpu_share:.0%}, "
+            f"mean lag p50 {statistics.median(mean_lags):.2f} ms "
+            f"max {mean_lags[-1]:.2f} ms, "
+            f"worst lag p50 {statistics.median(max_lags):.2f} ms "
+            f"max {max_lags[-1]:.2f} ms (session {worst.session_id}), "
+            f"{skipped} skipped ticks, {dropped} dropped frames"
+        )
+
+    async def serve(self, path: str, report_seconds: float = 5.0) -> None:
+        """Accepts clients on a Unix socket and runs their sessions forever.
+
+        :param path: str, path of the socket.
+        :param report_seconds: float, seconds between two printed reports,
+            0 for none.
+        """
+        server = await asyncio.start_unix_server(self.handle_client, path)
+        scheduler = asyncio.create_task(self.run_scheduler())
+        print(f"serving on {path}")
+        try:
+            async with server:
+                if report_seconds <= 0:
+                    await server.serve_forever()
+                while True:
+                    await asyncio.sleep(report_seconds)
+                    print(self.report(report_seconds), flush=True)
+        finally:
+            scheduler.cancel()
+
+
+async def play_client(
+    path: str,
+    difficulty: int,
+    autopilot: int,
+    seed: int,
+    press_rate: float,
+    stop_at: float,
+    frames: list[int],
+) -> None:
+    """Plays games against the server with random presses until stop_at.
+
+    A new game is started every time the previous one is over.
+
+    :param path: str, path of the server socket.
+    :param difficulty: int, difficulty of the games.
+    :param autopilot: int, autopilot flags of the hello message.
+    :param seed: int, seed of the random presses.
+    :param press_rate: float, mean presses per second.
+    :param stop_at: float, event loop time at which to stop.
+    :param frames: list[int], one counter of received state frames per
+        client, the counter of this client being ``frames[0]`` once bound.
+    """
+    loop = asyncio.get_running_loop()
+    presses = random.Random(seed)
+    while loop.time() < stop_at:
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(_CLIENT_HELLO.pack(MAGIC, VERSION, difficulty, autopilot, -1))
+        await reader.readexactly(_SERVER_HELLO.size)
+        try:
+            over = False
+            pending = b""
+            next_press = loop.time() + presses.expovariate(press_rate)
+            while not over and loop.time() < stop_at:
+                timeout = max(min(next_press, stop_at) - loop.time(), 0.0)
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), timeout)
+                except asyncio.TimeoutError:
+                    writer.write(bytes((1 << presses.randrange(4),)))
+                    next_press = loop.time() + presses.expovariate(press_rate)
+                    continue
+                if not data:
+                    break
+                pending += data
+                complete = len(pending) // _STATE.size * _STATE.size
+                if complete:
+                    frames[0] += complete // _STATE.size
+                    over = bool(pending[complete - 1] & 1)
+                    pending = pending[complete:]
+        except ConnectionError:
+            # The game ended while a press was being sent
+            pass
+        finally:
+            writer.close()
+
+
+async def generate_load(
+    path: str,
+    sessions: int,
+    seconds: float,
+    difficulty: int = 1,
+    autopilot: int = 0,
+    press_rate: float = 2.0,
+) -> None:
+    """Stands in for many clients to load a server, then prints what it received.
+
+    :param path: str, path of the server socket.
+    :param sessions: int, number of concurrent clients.
+    :param seconds: float, duration of the load.
+    :param difficulty: int, difficulty of the games.
+    :param autopilot: int, autopilot flags of the hello messages.
+    :param press_rate: float, mean presses per second of every client.
+    """
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + seconds
+    counters = [[0] for _ in range(sessions)]
+    clients = []
+    for index, frames in enumerate(counters):
+        clients.append(
+            asyncio.create_task(
+                play_client(
+                    path, difficulty, autopilot, index, press_rate, stop_at, frames
+                )
+            )
+        )
+        # Staggers the connections so the sessions do not tick in phase
+        await asyncio.sleep(0.002)
+    await asyncio.gather(*clients)
+    received = sorted(frames[0] for frames in counters)
+    print(
+        f"{sessions} clients for {seconds:.0f} s: "
+        f"{sum(received) / seconds:.0f} frames/s, "
+        f"per client min {received[0] / seconds:.1f} "
+        f"median {statistics.median(received) / seconds:.1f} frames/s"
+    )
+
+
+def main(argv: list[str]) -> None:
+    """Runs the server or the load generator from the command line.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve")
+    serve.add_argument("--socket", default=DEFAULT_SOCKET)
+    serve.add_argument("--report-seconds", type=float, default=5.0)
+    serve.add_argument("--max-catch-up", type=int, default=4)
+    load = commands.add_parser("load")
+    load.add_argument("--socket", default=DEFAULT_SOCKET)
+    load.add_argument("--sessions", type=int, default=500)
+    load.add_argument("--seconds", type=float, default=30.0)
+    load.add_argument("--difficulty", type=int, default=1, choices=range(4))
+    load.add_argument("--autopilot", action="store_true")
+    load.add_argument("--press-rate", type=float, default=2.0)
+    options = parser.parse_args(argv)
+
+    if options.command == "serve":
+        server = GameServer(max_catch_up=options.max_catch_up)
+        try:
+            asyncio.run(server.serve(options.socket, options.report_seconds))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(
+            generate_load(
+                options.socket,
+                options.sessions,
+                options.seconds,
+                options.difficulty,
+                0b11 if options.autopilot else 0,
+                options.press_rate,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
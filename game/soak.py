@@ -0,0 +1,422 @@
+"""Accelerated soak runs checking memory, tick time and element counts.
+
+A soak run plays games back to back on a fixed-step clock, so hours of
+game time take minutes: headless games run as fast as the CPU allows, or
+at ``--speed`` times the wall speed, with the autopilot playing both
+players or a recording replayed in a loop. In the window, ``--turbo N``
+runs N ticks per frame instead.
+
+A :class:`SoakMonitor` is told about every tick and samples the run every
+simulated minute: the memory blocks allocated by Python after a full
+collection, the peak resident memory, the mean and longest tick time, and
+the number of packages held by the game. A sample fails the run when the mean tick time exceeds the frame
+budget, when a count exceeds its bound, or, once the warm-up is over, when
+the memory blocks grow faster than allowed over the samples so far.
+``--leak-report FILE`` also samples the live objects of every class with a
+:class:`game.leaks.LeakDetector` and fails the run when one leaks.
+
+Usage::
+
+    python -m game.soak --difficulty 3 --hours 4
+    python -m game.soak --replay game.mbil --hours 1 --speed 20
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from time import perf_counter
+from typing import NamedTuple
+
+from game import recording
+from game.domain.difficulty import Difficulty
+from game.domain.game import Game
+from game.headless import HeadlessGame
+from game.leaks import LeakDetector
+
+TURBO_ENV = "MARIO_BROS_TURBO"
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+
+class SoakSample(NamedTuple):
+    """Measurements of one interval of a soak run.
+
+    Attributes:
+        game_seconds (float): Game time played since the run started.
+        games (int): Games started since the run started.
+        memory_blocks (int): Memory blocks allocated by Python.
+        peak_rss_kib (int): Peak resident memory of the process, 0 if unknown.
+        mean_tick_time (float): Mean tick time of the interval, in seconds.
+        max_tick_time (float): Longest tick of the interval, in seconds.
+        counts (dict[str, int]): Number of elements of every kind.
+    """
+
+    game_seconds: float
+    games: int
+    memory_blocks: int
+    peak_rss_kib: int
+    mean_tick_time: float
+    max_tick_time: float
+    counts: dict[str, int]
+
+
+def element_counts(game: Game) -> dict[str, int]:
+    """Counts the packages held by the lists of a game.
+
+    :param game: Game, the game.
+    :return: dict[str, int], packages on the belts, falling, on the truck and
+        waiting to be drawn.
+    """
+    return {
+        "belt": sum(len(conveyor.packages) for conveyor in game.conveyors),
+        "falling": sum(len(conveyor.falling_packages) for conveyor in game.conveyors),
+        "truck": len(game.truck.packages),
+        "new": len(game.newly_created_packages),
+    }
+
+
+def peak_rss_kib() -> int:
+    """Returns the peak resident memory of the process.
+
+    :return: int, the peak in KiB, 0 where it cannot be read.
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def turbo_from_environment() -> int:
+    """Returns the ticks per frame the environment asks the window to run.
+
+    :return: int, 1 unless turbo mode is on.
+    """
+    value = os.environ.get(TURBO_ENV, "")
+    return max(int(value), 1) if value else 1
+
+
+class SoakMonitor:
+    """Continuous checks of a long run, fed with the time of every tick.
+
+    Attributes:
+        interval (float): Game seconds between samples. Must be > 0.
+        warmup (float): Game seconds before the memory growth is checked.
+        max_growth (float): Allowed growth of the memory blocks per game hour.
+        max_tick_time (float): Allowed mean tick time of an interval, in seconds.
+        max_count (int): Allowed number of elements of every kind.
+        game_seconds (float): Game time played so far.
+        games (int): Games started so far, counted by the caller.
+        samples (list[SoakSample]): Samples taken so far.
+        failures (list[str]): Description of every failed check.
+    """
+
+    def __init__(
+        self,
+        interval: float = 60.0,
+        warmup: float = 600.0,
+        max_growth: float = 5000.0,
+        max_tick_time: float = 1 / 60,
+        max_count: int = 64,
+    ) -> None:
+        """Initializes a monitor without samples.
+
+        :param interval: float, game seconds between samples. Must be > 0.
+        :param warmup: float, game seconds before the memory growth is checked.
+        :param max_growth: float, allowed memory blocks gained per game hour.
+        :param max_tick_time: float, allowed mean tick time, the frame budget
+            by default.
+        :param max_count: int, allowed number of elements of every kind.
+        :raises ValueError: if the interval is not positive.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be strictly greater than 0")
+        self.interval = interval
+        self.warmup = warmup
+        self.max_growth = max_growth
+        self.max_tick_time = max_tick_time
+        self.max_count = max_count
+        self.game_seconds = 0.0
+        self.games = 0
+        self.samples: list[SoakSample] = []
+        self.failures: list[str] = []
+        self._next_sample = interval
+        self._ticks = 0
+        self._tick_time = 0.0
+        self._max_tick_time = 0.0
+
+    def record(self, game_seconds: float, tick_time: float) -> bool:
+        """Accounts for one tick.
+
+        :param game_seconds: float, game time covered by the tick.
+        :param tick_time: float, wall time the tick took, in seconds.
+        :return: bool, True when a sample is due; the caller then passes the
+            element counts to :meth:`sample`.
+        """
+        self.game_seconds += game_seconds
+        self._ticks += 1
+        self._tick_time += tick_time
+        if tick_time > self._max_tick_time:
+            self._max_tick_time = tick_time
+        return self.game_seconds >= self._next_sample
+
+    def sample(self, counts: dict[str, int]) -> SoakSample:
+        """Takes a sample of the interval that just ended and checks it.
+
+        The memory is measured after a full collection, so the cycles of
+        finished games waiting for the collector are not taken for growth.
+
+        :param counts: dict[str, int], number of elements of every kind.
+        :return: SoakSample, the sample, also appended to ``samples``.
+        """
+        gc.collect()
+        sample = SoakSample(
+            game_seconds=self.game_seconds,
+            games=self.games,
+            memory_blocks=sys.getallocatedblocks(),
+            peak_rss_kib=peak_rss_kib(),
+            mean_tick_time=self._tick_time / self._ticks if self._ticks else 0.0,
+            max_tick_time=self._max_tick_time,
+            counts=counts,
+        )
+        self.samples.append(sample)
+        self._next_sample += self.interval
+        self._ticks = 0
+        self._tick_time = 0.0
+        self._max_tick_time = 0.0
+        self._check(sample)
+        return sample
+
+    def growth(self) -> float:
+        """Returns the trend of the memory blocks after the warm-up.
+
+        :return: float, least-squares slope in blocks per game hour, 0 with
+            fewer than three samples after the warm-up.
+        """
+        points = [
+            (sample.game_seconds / 3600, sample.memory_blocks)
+            for sample in self.samples
+            if sample.game_seconds > self.warmup
+        ]
+        if len(points) < 3:
+            return 0.0
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        spread = sum((x - mean_x) ** 2 for x, _ in points)
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+    def _check(self, sample: SoakSample) -> None:
+        """Appends the checks the sample fails to ``failures``.
+
+        :param sample: SoakSample, the latest sample.
+        """
+        at = f"at {sample.game_seconds / 60:.0f} min"
+        if sample.mean_tick_time > self.max_tick_time:
+            self.failures.append(
+                f"{at}: mean tick {sample.mean_tick_time * 1e3:.2f} ms "
+                f"over {self.max_tick_time * 1e3:.2f} ms"
+            )
+        for name, count in sample.counts.items():
+            if count > self.max_count:
+                self.failures.append(f"{at}: {count} {name} over {self.max_count}")
+        growth = self.growth()
+        if growth > self.max_growth:
+            self.failures.append(
+                f"{at}: memory grows by {growth:.0f} blocks/hour "
+                f"over {self.max_growth:.0f}"
+            )
+
+    def debug_lines(self) -> list[str]:
+        """Returns the state of the run as lines of text for an overlay.
+
+        :return: list[str], the game time, the last sample and the failures.
+        """
+        lines = [f"soak {self.game_seconds / 60:.1f} min, {self.games} games"]
+        if self.samples:
+            sample = self.samples[-1]
+            lines.append(
+                f"tick {sample.mean_tick_time * 1e6:.0f}/"
+                f"{sample.max_tick_time * 1e6:.0f} us"
+            )
+            lines.append(f"blocks {sample.memory_blocks} ({self.growth():+.0f}/h)")
+            lines.append(
+                " ".join(f"{name} {count}" for name, count in sample.counts.items())
+            )
+        lines.append(f"failures {len(self.failures)}")
+        if self.failures:
+            lines.append(self.failures[-1])
+        return lines
+
+
+def _format_sample(sample: SoakSample) -> str:
+    """Formats a sample on one line.
+
+    :param sample: SoakSample, the sample.
+    :return: str, the line.
+    """
+    counts = " ".join(f"{name}={count}" for name, count in sample.counts.items())
+    return (
+        f"{sample.game_seconds / 60:7.1f} min  games {sample.games:4d}  "
+        f"blocks {sample.memory_blocks:8d}  rss {sample.peak_rss_kib:7d} KiB  "
+        f"tick {sample.mean_tick_time * 1e6:6.1f}/{sample.max_tick_time * 1e6:7.1f} us  "
+        f"{counts}"
+    )
+
+
+def run_soak(
+    selected_difficulty: Difficulty,
+    hours: float,
+    autopilot: Iterable[str] = ("mario", "luigi"),
+    log: recording.InputLog | None = None,
+    speed: float = 0.0,
+    seed: int = 0,
+    monitor: SoakMonitor | None = None,
+    on_sample: Callable[[SoakSample], None] | None = None,
+) -> SoakMonitor:
+    """Plays headless games back to back for hours of game time.
+
+    :param selected_difficulty: Difficulty, the difficulty of autopiloted games.
+    :param hours: float, game time to play, in hours.
+    :param autopilot: Iterable[str], players driven by the autopilot when
+        there is no log.
+    :param log: recording.InputLog | None, a recording replayed in a loop
+        instead of the autopilot; every lap has to reach its final points.
+    :param speed: float, game speed as a multiple of the wall speed, 0 to run
+        as fast as possible.
+    :param seed: int, seed of the first autopiloted game, the next ones use
+        the following seeds.
+    :param monitor: SoakMonitor | None, the checks to run, defaults if None.
+    :param on_sample: Callable[[SoakSample], None] | None, called with every
+        sample.
+    :return: SoakMonitor, the monitor holding the samples and failures.
+    :raises ValueError: if the log has no tick.
+    """
+    if log is not None and log.ticks == 0:
+        raise ValueError("the recording has no tick to replay")
+    monitor = monitor if monitor is not None else SoakMonitor()
+    autopilot = list(autopilot)
+    end = hours * 3600
+    started_at = perf_counter()
+    while monitor.game_seconds < end:
+        if log is not None:
+            headless = log.seek(0)
+            masks: Iterable[int] = log.masks(0)
+        else:
+            headless = HeadlessGame(
+                selected_difficulty, seed=seed + monitor.games, autopilot=autopilot
+            )
+            masks = iter(int, 1)
+        monitor.games += 1
+        step = headless.clock.step
+        for mask in masks:
+            tick_started_at = perf_counter()
+            alive = headless.step(mask)
+            if monitor.record(step, perf_counter() - tick_started_at):
+                sample = monitor.sample(element_counts(headless.game))
+                if on_sample is not None:
+                    on_sample(sample)
+            if speed > 0:
+                ahead = monitor.game_seconds / speed - (perf_counter() - started_at)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if not alive or monitor.game_seconds >= end:
+                break
+        if (
+            log is not None
+            and headless.ticks == log.ticks
+            and headless.game.points != log.final_points
+        ):
+            monitor.failures.append(
+                f"replay lap {monitor.games}: {headless.game.points} points, "
+                f"recorded {log.final_points}"
+            )
+    return monitor
+
+
+def main(argv: list[str]) -> None:
+    """Runs a soak test from the command line and exits with its outcome.
+
+    :param argv: list[str], the command line arguments without the program.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.soak")
+    parser.add_argument("--difficulty", type=int, default=3, choices=range(4))
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--speed", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--autopilot", default="mario,luigi")
+    parser.add_argument("--replay", type=Path, default=None)
+    parser.add_argument("--interval", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=600.0)
+    parser.add_argument("--max-growth", type=float, default=5000.0)
+    parser.add_argument("--max-tick-ms", type=float, default=1000 / 60)
+    parser.add_argument("--max-count", type=int, default=64)
+    parser.add_argument("--leak-report", type=Path, default=None)
+    parser.add_argument("--leak-growth", type=float, default=30.0)
+    parser.add_argument("--leak-referrers", action="store_true")
+    options = parser.parse_args(argv)
+
+    monitor = SoakMonitor(
+        interval=options.interval,
+        warmup=options.warmup,
+        max_growth=options.max_growth,
+        max_tick_time=options.max_tick_ms / 1000,
+        max_count=options.max_count,
+    )
+    detector = (
+        LeakDetector(
+            options.leak_report,
+            interval=options.interval,
+            warmup=options.warmup,
+            max_growth=options.leak_growth,
+            dump_referrers=options.leak_referrers,
+        )
+        if options.leak_report is not None
+        else None
+    )
+
+    def on_sample(sample: SoakSample) -> None:
+        print(_format_sample(sample), flush=True)
+        if detector is None:
+            return
+        for name in detector.sample(sample.game_seconds):
+            monitor.failures.append(
+                f"at {sample.game_seconds / 60:.0f} min: {name} leaks "
+                f"({detector.alarms[name]:.0f}/hour)"
+            )
+
+    log = recording.load_input_log(options.replay) if options.replay else None
+    started_at = perf_counter()
+    run_soak(
+        Difficulty(options.difficulty),
+        options.hours,
+        autopilot=options.autopilot.split(","),
+        log=log,
+        speed=options.speed,
+        seed=options.seed,
+        monitor=monitor,
+        on_sample=on_sample,
+    )
+    elapsed = perf_counter() - started_at
+    if detector is not None:
+        detector.stop()
+
+    print(
+        f"played {monitor.game_seconds / 3600:.2f} game hours in {elapsed:.1f} s "
+        f"({monitor.game_seconds / elapsed if elapsed else 0:.0f}x), "
+        f"{monitor.games} games"
+    )
+    print(f"memory growth: {monitor.growth():.0f} blocks/hour")
+    for failure in monitor.failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if monitor.failures else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
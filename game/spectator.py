@@ -0,0 +1,455 @@
+"""Live spectator feed fanned out to many viewers.
+
+The game loop publishes every tick once, as the frame of the network
+protocol (see :mod:`game.network`), into a ring buffer shared by every
+viewer, together with a keyframe of the whole state every
+``keyframe_ticks`` ticks. Publishing only stores the frame, without any
+lock or system call: its cost does not depend on the number of viewers.
+
+The feed thread runs its own event loop and polls the ring buffer every
+``poll_interval`` seconds. It accepts viewers with the hello
+of :mod:`game.network` as player :data:`~game.network.SPECTATOR` and
+writes them the frames they have not seen yet, always the same bytes
+objects. A viewer joining, or one whose frames were overwritten in the ring,
+starts again from the latest keyframe. A viewer whose socket does not
+drain, i.e. whose write buffer is above ``write_buffer_limit``, is either
+dropped or skipped until it drains and then resynced from a keyframe.
+
+Usage::
+
+    python -m game.network --difficulty 1 --spectator-port 7462
+    python -m game.main --connect 127.0.0.1:7462 --player spectator
+    python -m game.spectator bench --viewers 200 --slow 20 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from time import perf_counter, sleep
+
+from game.domain.difficulty import Difficulty
+from game.headless import HeadlessGame
+from game.network import (
+    CLIENT_HELLO,
+    SERVER_HELLO,
+    KEYFRAME,
+    MAGIC,
+    SPECTATOR,
+    VERSION,
+    StateEncoder,
+    encode_frame,
+)
+
+DROP = "drop"
+RESYNC = "resync"
+
+
+class _Viewer:
+    """A connected spectator.
+
+    Attributes:
+        writer (asyncio.StreamWriter): Stream to the viewer.
+        next_tick (int | None): Next tick to send, None until a keyframe was sent.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        """Registers a viewer waiting for its first keyframe.
+
+        :param writer: asyncio.StreamWriter, stream to the viewer.
+        """
+        self.writer = writer
+        self.next_tick: int | None = None
+
+
+class SpectatorFeed:
+    """Shared buffer of the ticks of a game, fanned out to viewers.
+
+    :meth:`publish` may be called from any thread, the viewers are served by
+    the thread started with :meth:`start`.
+
+    Attributes:
+        selected_difficulty (Difficulty): Difficulty of the watched game.
+        capacity (int): Number of ticks kept in the ring buffer.
+        keyframe_ticks (int): Ticks between two keyframes, below ``capacity``.
+        slow_viewers (str): :data:`DROP` or :data:`RESYNC` viewers that do
+            not keep up.
+        write_buffer_limit (int): Unsent bytes above which a viewer is slow.
+        poll_interval (float): Seconds between two fan-outs of new ticks.
+        published (int): Ticks published.
+        publish_time (float): Seconds spent in :meth:`publish`.
+        max_publish_time (float): Longest :meth:`publish` call, in seconds.
+        viewers (int): Viewers connected.
+        dropped (int): Viewers dropped for being slow.
+        resyncs (int): Keyframes sent to viewers that fell behind.
+    """
+
+    def __init__(
+        self,
+        selected_difficulty: Difficulty,
+        capacity: int = 256,
+        keyframe_ticks: int = 120,
+        slow_viewers: str = RESYNC,
+        write_buffer_limit: int = 64 * 1024,
+        poll_interval: float = 1 / 120,
+    ) -> None:
+        """Initializes an empty feed.
+
+        :param selected_difficulty: Difficulty, difficulty of the watched game.
+        :param capacity: int, number of ticks kept in the ring buffer.
+        :param keyframe_ticks: int, ticks between two keyframes.
+        :param slow_viewers: str, :data:`DROP` or :data:`RESYNC`.
+        :param write_buffer_limit: int, unsent bytes above which a viewer is slow.
+        :param poll_interval: float, seconds between two fan-outs of new ticks.
+        :raises ValueError: if keyframes are not more frequent than the ring
+            wraps, or the slow viewer policy is unknown.
+        """
+        if not 0 < keyframe_ticks < capacity:
+            raise ValueError("keyframe_ticks must be between 1 and capacity - 1")
+        if slow_viewers not in (DROP, RESYNC):
+            raise ValueError(f"slow_viewers must be {DROP!r} or {RESYNC!r}")
+        self.selected_difficulty = selected_difficulty
+        self.capacity = capacity
+        self.keyframe_ticks = keyframe_ticks
+        self.slow_viewers = slow_viewers
+        self.write_buffer_limit = write_buffer_limit
+        self.poll_interval = poll_interval
+        # Slot tick % capacity holds (tick, frame); single assignments keep
+        # it consistent for the feed thread without a lock
+        self._ring: list[tuple[int, bytes] | None] = [None] * capacity
+        self._latest_tick = 0
+        self._keyframe: tuple[int, bytes] | None = None
+        self._viewers: list[_Viewer] = []
+        self._handlers: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopped: asyncio.Event | None = None
+        self._thread: threading.Thread | None = None
+        self.published = 0
+        self.publish_time = 0.0
+        self.max_publish_time = 0.0
+        self.viewers = 0
+        self.dropped = 0
+        self.resyncs = 0
+
+    def wants_keyframe(self, tick: int) -> bool:
+        """Returns whether the tick should be published with a keyframe.
+
+        :param tick: int, the tick about to be published.
+        :return: bool, True every ``keyframe_ticks`` ticks and for the first one.
+        """
+        return self._keyframe is None or tick - self._keyframe[0] >= self.keyframe_ticks
+
+    def publish(
+        self,
+        tick: int,
+        sections: int,
+        body: bytes,
+        keyframe: tuple[int, bytes] | None = None,
+    ) -> None:
+        """Publishes the changes of a tick, encoded by a :class:`StateEncoder`.
+
+        :param tick: int, the tick, one more than the previous one.
+        :param sections: int, the sections present in the body.
+        :param body: bytes, the encoded changes.
+        :param keyframe: tuple[int, bytes] | None, sections and body of
+            :meth:`StateEncoder.keyframe` after this tick, if any.
+        """
+        started_at = perf_counter()
+        self._ring[tick % self.capacity] = (tick, encode_frame(tick, 0, sections, body))
+        if keyframe is not None:
+            key_sections, key_body = keyframe
+            self._keyframe = (tick, encode_frame(tick, 0, key_sections, key_body))
+        self._latest_tick = tick
+        elapsed = perf_counter() - started_at
+        self.published += 1
+        self.publish_time += elapsed
+        self.max_publish_time = max(self.max_publish_time, elapsed)
+
+    @property
+    def mean_publish_time(self) -> float:
+        """Returns the mean duration of :meth:`publish`.
+
+        :return: float, seconds per published tick, 0 before the first one.
+        """
+        return self.publish_time / self.published if self.published else 0.0
+
+    def start(self, host: str, port: int) -> None:
+        """Starts accepting viewers on a thread of its own.
+
+        :param host: str, address to listen on.
+        :param port: int, TCP port to listen on.
+        :raises OSError: if the port cannot be listened on.
+        """
+        started = threading.Event()
+        errors: list[OSError] = []
+
+        def run() -> None:
+            try:
+                asyncio.run(self._serve(host, port, started))
+            except OSError as error:
+                errors.append(error)
+                started.set()
+
+        self._thread = threading.Thread(target=run, name="spectators", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+
+    def stop(self) -> None:
+        """Disconnects the viewers and stops the feed thread."""
+        loop = self._loop
+        if loop is not None and self._stopped is not None:
+            loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _serve(self, host: str, port: int, started: threading.Event) -> None:
+        """Accepts viewers and fans the ticks out until stopped.
+
+        :param host: str, address to listen on.
+        :param port: int, TCP port to listen on.
+        :param started: threading.Event, set once viewers can connect.
+        """
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle_viewer, host, port)
+        self._loop = asyncio.get_running_loop()
+        started.set()
+        pump = asyncio.create_task(self._pump())
+        async with server:
+            await self._stopped.wait()
+        pump.cancel()
+        for viewer in self._viewers:
+            viewer.writer.transport.abort()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        self._loop = None
+
+    async def _handle_viewer(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Registers a viewer and waits for it to disconnect.
+
+        :param reader: asyncio.StreamReader, stream from the viewer.
+        :param writer: asyncio.StreamWriter, stream to the viewer.
+        """
+        try:
+            magic, version, player = CLIENT_HELLO.unpack(
+                await reader.readexactly(CLIENT_HELLO.size)
+            )
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        if magic != MAGIC or version != VERSION or player != SPECTATOR:
+            writer.close()
+            return
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        difficulty = self.selected_difficulty.difficulty
+        writer.write(SERVER_HELLO.pack(MAGIC, VERSION, difficulty, SPECTATOR))
+        viewer = _Viewer(writer)
+        handler = asyncio.current_task()
+        if handler is not None:
+            self._handlers.add(handler)
+        self._viewers.append(viewer)
+        self.viewers += 1
+        self._send(viewer)
+        try:
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        if viewer in self._viewers:
+            self._viewers.remove(viewer)
+            self.viewers -= 1
+        writer.close()
+        if handler is not None:
+            self._handlers.discard(handler)
+
+    async def _pump(self) -> None:
+        """Writes the new ticks to every viewer whenever some were published."""
+        sent_tick = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._latest_tick == sent_tick:
+                continue
+            sent_tick = self._latest_tick
+            for viewer in list(self._viewers):
+                self._send(viewer)
+
+    def _send(self, viewer: _Viewer) -> None:
+        """Writes a viewer the ticks it has not seen yet.
+
+        :param viewer: _Viewer, the viewer.
+        """
+        writer = viewer.writer
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > self.write_buffer_limit:
+            if self.slow_viewers == DROP:
+                self._viewers.remove(viewer)
+                self.viewers -= 1
+                self.dropped += 1
+                writer.transport.abort()
+            elif viewer.next_tick is not None:
+                # Skipped until it drains, then resynced from a keyframe
+                viewer.next_tick = None
+                self.resyncs += 1
+            return
+
+        latest = self._latest_tick
+        if viewer.next_tick is None or latest - viewer.next_tick >= self.capacity:
+            keyframe = self._keyframe
+            if keyframe is None or latest - keyframe[0] >= self.capacity:
+                return
+            writer.write(keyframe[1])
+            viewer.next_tick = keyframe[0] + 1
+        while viewer.next_tick <= latest:
+            entry = self._ring[viewer.next_tick % self.capacity]
+            if entry is None or entry[0] != viewer.next_tick:
+                viewer.next_tick = None
+                self.resyncs += 1
+                return
+            writer.write(entry[1])
+            viewer.next_tick += 1
+
+
+def _bench(options: argparse.Namespace) -> None:
+    """Plays an autopiloted game in real time while viewers watch it.
+
+    :param options: argparse.Namespace, the parsed ``bench`` options.
+    """
+    difficulty = Difficulty(options.difficulty)
+    feed = SpectatorFeed(difficulty, slow_viewers=options.slow_viewers)
+    feed.start("127.0.0.1", options.port)
+    watchers = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "game.spectator",
+            "watch",
+            "--port",
+            str(options.port),
+            "--viewers",
+            str(options.viewers),
+            "--slow",
+            str(options.slow),
+            "--seconds",
+            str(options.seconds + 2),
+        ],
+        cwd=Path(__file__).resolve().parents[1],
+        env=os.environ,
+    )
+    while feed.viewers < options.viewers:
+        sleep(0.05)
+
+    headless = HeadlessGame(difficulty, seed=options.seed, autopilot=("mario", "luigi"))
+    encoder = StateEncoder(headless.game, headless.session)
+    step = headless.clock.step
+    deadline = perf_counter()
+    for _ in range(int(options.seconds / step)):
+        deadline += step
+        sleep(max(deadline - perf_counter(), 0.0))
+        if not headless.step():
+            break
+        tick = headless.ticks
+        sections, body = encoder.encode()
+        keyframe = encoder.keyframe() if feed.wants_keyframe(tick) else None
+        feed.publish(tick, sections, body, keyframe)
+
+    print(
+        f"{feed.published} ticks published to {feed.viewers} viewers: "
+        f"mean {feed.mean_publish_time * 1e6:.1f} us, "
+        f"max {feed.max_publish_time * 1e6:.1f} us per tick; "
+        f"{feed.dropped} dropped, {feed.resyncs} resyncs"
+    )
+    feed.stop()
+    watchers.wait()
+
+
+async def _watch(port: int, slow: bool, seconds: float, ticks: list[int]) -> None:
+    """Watches a feed as one viewer, counting the ticks received.
+
+    :param port: int, TCP port of the feed.
+    :param slow: bool, whether the viewer stops reading after the hello.
+    :param seconds: float, how long to watch.
+    :param ticks: list[int], the count of ticks, appended to on return.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if slow:
+        writer.get_extra_info("socket").setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, 4096
+        )
+    writer.write(CLIENT_HELLO.pack(MAGIC, VERSION, SPECTATOR))
+    received = keyframes = 0
+    loop = asyncio.get_running_loop()
+    ends_at = loop.time() + seconds
+    try:
+        await reader.readexactly(SERVER_HELLO.size)
+        if slow:
+            await asyncio.sleep(seconds)
+        while loop.time() < ends_at:
+            header = await asyncio.wait_for(
+                reader.readexactly(9), ends_at - loop.time()
+            )
+            length = int.from_bytes(header[:2], "little")
+            if header[8] & KEYFRAME:
+                keyframes += 1
+            await reader.readexactly(length - 7)
+            received += 1
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        pass
+    writer.close()
+    ticks.append(received)
+
+
+async def _watch_all(options: argparse.Namespace) -> None:
+    """Watches a feed with many viewers and prints what they received.
+
+    :param options: argparse.Namespace, the parsed ``watch`` options.
+    """
+    ticks: list[int] = []
+    await asyncio.gather(
+        *(
+            _watch(options.port, index < options.slow, options.seconds, ticks)
+            for index in range(options.viewers)
+        )
+    )
+    if ticks:
+        print(f"viewers received {min(ticks)} to {max(ticks)} ticks")
+
+
+def main(argv: list[str]) -> None:
+    """Runs the spectator benchmark from the command line.
+
+    :param argv: list[str], command line arguments without the program name.
+    """
+    parser = argparse.ArgumentParser(prog="python -m game.spectator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="publish a game to many viewers")
+    bench.add_argument("--difficulty", type=int, default=1, choices=range(4))
+    bench.add_argument("--seed", type=int, default=1)
+    bench.add_argument("--port", type=int, default=7462)
+    bench.add_argument("--viewers", type=int, default=100)
+    bench.add_argument("--slow", type=int, default=10)
+    bench.add_argument("--slow-viewers", choices=(DROP, RESYNC), default=RESYNC)
+    bench.add_argument("--seconds", type=float, default=10.0)
+    watch = commands.add_parser("watch", help="connect viewers to a feed")
+    watch.add_argument("--port", type=int, default=7462)
+    watch.add_argument("--viewers", type=int, default=100)
+    watch.add_argument("--slow", type=int, default=0)
+    watch.add_argument("--seconds", type=float, default=10.0)
+    options = parser.parse_args(argv)
+    if options.command == "bench":
+        _bench(options)
+    else:
+        asyncio.run(_watch_all(options))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
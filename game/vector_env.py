@@ -0,0 +1,529 @@
+"""Vectorized environment advancing many independent games in lockstep.
+
+The rules of :class:`game.domain.session.GameSession` and
+:class:`game.domain.game.Game` are reimplemented over NumPy arrays holding
+the state of every game at once: package positions, stages and conveyors,
+player floors, lives, points and timers. Conveyor movement, pickups,
+drops and truck loading are computed for all games with array operations;
+the only Python loops are over the conveyors and the two players.
+
+The layout of the floors and conveyors is read from a game built by
+:func:`game.headless.create_game`, and games run on the same fixed 60 Hz
+clock as :class:`game.headless.HeadlessGame`, so for the same actions both
+produce the same points, lives, player floors and packages.
+
+Two simplifications do not affect the gameplay: packages leave the state as
+soon as they start falling or are loaded on the truck, and the truck and
+boss animations are not simulated.
+
+NumPy is only needed for this module: ``pip install numpy``.
+"""
+
+try:
+    import numpy as np
+except ImportError as error:  # pragma: no cover - depends on the environment
+    raise ImportError(
+        "game.vector_env needs NumPy, install it with 'pip install numpy'"
+    ) from error
+
+from game.domain.conveyor import Direction
+from game.domain.difficulty import Difficulty
+from game.domain.fixed_point import FRACTION_BITS, ONE
+from game.domain.package_stages import stage_table
+from game.domain.truck import Truck
+from game.headless import create_game
+
+NOOP = 0
+UP = 1
+DOWN = 2
+
+FREE = 0
+ON_CONVEYOR = 1
+PICKED = 2
+
+_STEP = 1 / 60
+_TICK_SECOND = 1.0
+_MOVE_PACKAGE_TICK = 0.09
+_CREATE_PACKAGE_TICK = 5.0
+_TRUCK_CAPACITY = 8
+_NO_CONVEYOR = -1
+_TO_TRUCK = -1
+
+
+class VectorEnv:
+    """Gym-style ``reset()`` / ``step(actions)`` API over many games.
+
+    Actions are an array of shape ``(num_games, 2)`` with one of
+    :data:`NOOP`, :data:`UP` or :data:`DOWN` per game for Mario and Luigi.
+    Observations are read-only views of the internal arrays, so they are
+    not copied; they change on the next step.
+
+    Games that end are reset automatically: :meth:`step` reports them as
+    done and returns the first state of their next game.
+
+    Attributes:
+        num_games (int): Number of games advanced by every step.
+        difficulty (Difficulty): Difficulty of every game.
+        max_packages (int): Package slots per game.
+        observation (dict[str, np.ndarray]): Read-only views of the state:
+            ``package_state`` (FREE, ON_CONVEYOR or PICKED), ``package_x``,
+            ``package_y``, ``package_stage``, ``package_conveyor`` of shape
+            ``(num_games, max_packages)``; ``player_floor`` of shape
+            ``(num_games, 2)``; ``lives``, ``points`` and ``ticks`` of shape
+            ``(num_games,)``.
+    """
+
+    def __init__(
+        self,
+        num_games: int,
+        difficulty: Difficulty | None = None,
+        max_packages: int = 64,
+        seed: int | None = None,
+    ) -> None:
+        """Initializes the environment and resets every game.
+
+        :param num_games: int, number of games. Must be > 0.
+        :param difficulty: Difficulty | None, difficulty of the games, the
+            easiest if None.
+        :param max_packages: int, package slots per game. Must be > 0.
+        :param seed: int | None, seed of the random conveyor speeds of the
+            difficulties that have them.
+        :raises ValueError: if num_games or max_packages is not positive.
+        """
+        if num_games <= 0:
+            raise ValueError("num_games must be a positive integer")
+        if max_packages <= 0:
+            raise ValueError("max_packages must be a positive integer")
+        self.num_games = num_games
+        self.difficulty = difficulty if difficulty is not None else Difficulty(0)
+        self.max_packages = max_packages
+        self._random = np.random.default_rng(seed)
+        self._read_layout()
+        self._allocate()
+        self.observation = {
+            name: self._read_only(array)
+            for name, array in (
+                ("package_state", self.package_state),
+                ("package_x", self.package_x),
+                ("package_y", self.package_y),
+                ("package_stage", self.package_stage),
+                ("package_conveyor", self.package_conveyor),
+                ("player_floor", self.player_floor),
+                ("lives", self.lives),
+                ("points", self.points),
+                ("ticks", self.ticks),
+            )
+        }
+        self.reset()
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        """Returns a read-only view sharing the memory of an array.
+
+        :param array: np.ndarray, the array to expose.
+        :return: np.ndarray, the view.
+        """
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def _read_layout(self) -> None:
+        """Reads the geometry of the floors and conveyors from a built game."""
+        values = self.difficulty.difficulty_values()
+        self._belts = values["belts"]
+        self._increase = values["increase"]
+        self._eliminates = values["eliminates"]
+        self._speeds = values["conveyor_speed"]
+
+        game = create_game(self.difficulty)
+        players = game.players
+        conveyors = game.conveyors
+        floors = [game.players_positions[player] for player in players]
+        count = len(conveyors)
+        self._conveyor_ids = [conveyor.conveyor_id for conveyor in conveyors]
+        self._conveyor_x = np.array([conveyor.x for conveyor in conveyors])
+        self._conveyor_end = np.array(
+            [conveyor.x + conveyor.length for conveyor in conveyors]
+        )
+        self._conveyor_sign = np.array(
+            [
+                -1 if conveyor.direction == Direction.LEFT else 1
+                for conveyor in conveyors
+            ]
+        )
+        self._conveyor_origin = np.array(
+            [conveyor.start_position[0] for conveyor in conveyors]
+        )
+        # Stage transitions keyed by (conveyor, stage), -1 where none happens
+        rows = {conveyor.conveyor_id: row for row, conveyor in enumerate(conveyors)}
+        stages = max(conveyor.final_stage for conveyor in conveyors) + 1
+        self._next_stage = np.full((count, stages), -1, dtype=np.int8)
+        self._stage_threshold = np.zeros((count, stages), dtype=np.int64)
+        self._stage_leading_edge = np.zeros((count, stages), dtype=bool)
+        for (conveyor_id, stage), transition in stage_table(conveyors).items():
+            row = rows[conveyor_id]
+            self._next_stage[row, stage] = transition.next_stage
+            self._stage_threshold[row, stage] = transition.threshold
+            self._stage_leading_edge[row, stage] = transition.leading_edge
+        self._start_x = np.array([conveyor.start_position[0] for conveyor in conveyors])
+        self._start_y = np.array([conveyor.start_position[1] for conveyor in conveyors])
+        self._next_conveyor = np.array(
+            [
+                _TO_TRUCK
+                if isinstance(conveyor.next_step, Truck)
+                else next(
+                    index
+                    for index, other in enumerate(conveyors)
+                    if other is conveyor.next_step
+                )
+                for conveyor in conveyors
+            ]
+        )
+        # Player and floor at the end of every conveyor
+        self._finish_player = np.zeros(count, dtype=np.int64)
+        self._finish_floor = np.zeros(count, dtype=np.int64)
+        # Conveyor ending at every floor of every player
+        self._floor_conveyor = np.full(
+            (2, max(len(player_floors) for player_floors in floors)), _NO_CONVEYOR
+        )
+        for index, conveyor in enumerate(conveyors):
+            for player_index, player_floors in enumerate(floors):
+                for floor_index, floor in enumerate(player_floors):
+                    if floor is conveyor.finish_floor:
+                        self._finish_player[index] = player_index
+                        self._finish_floor[index] = floor_index
+                        self._floor_conveyor[player_index, floor_index] = index
+        self._floor_count = np.array([len(player_floors) for player_floors in floors])
+        self._start_floor = np.array(
+            [
+                next(
+                    i for i, floor in enumerate(player_floors) if floor.player is player
+                )
+                for player, player_floors in zip(players, floors)
+            ]
+        )
+        self._player_x = np.array([player.x for player in players])
+        self._floor_y = np.full((2, self._floor_conveyor.shape[1]), 0)
+        for player_index, player_floors in enumerate(floors):
+            for floor_index, floor in enumerate(player_floors):
+                self._floor_y[player_index, floor_index] = floor.y
+        self._player_size = (players[0].length, players[0].height)
+        factory = game.factories[0]
+        self._package_size = (factory.new_package_length, factory.new_package_height)
+        self._factory_conveyor = conveyors.index(factory.conveyor)
+
+    def _allocate(self) -> None:
+        """Creates the state arrays."""
+        games, slots = self.num_games, self.max_packages
+        self.package_state = np.zeros((games, slots), dtype=np.int8)
+        self.package_x = np.zeros((games, slots), dtype=np.int64)
+        self.package_y = np.zeros((games, slots), dtype=np.int64)
+        self.package_stage = np.zeros((games, slots), dtype=np.int8)
+        self.package_conveyor = np.zeros((games, slots), dtype=np.int64)
+        self._package_order = np.zeros((games, slots), dtype=np.int64)
+        self.player_floor = np.zeros((games, 2), dtype=np.int64)
+        self._carried = np.full((games, 2), -1, dtype=np.int64)
+        self._picked_up_at = np.zeros((games, 2))
+        self.velocity = np.zeros((games, len(self._conveyor_ids)))
+        # Fixed-point pixels per move, as in Conveyor.steps
+        self._speed = np.full((games, len(self._conveyor_ids)), ONE, dtype=np.int64)
+        self.lives = np.zeros(games, dtype=np.int64)
+        self.points = np.zeros(games, dtype=np.int64)
+        self.ticks = np.zeros(games, dtype=np.int64)
+        self._stored_deliveries = np.zeros(games, dtype=np.int64)
+        self._minimum_packages = np.zeros(games, dtype=np.int64)
+        self._packages_at_play = np.zeros(games, dtype=np.int64)
+        self._first_package_moved = np.zeros(games, dtype=bool)
+        self._truck_load = np.zeros(games, dtype=np.int64)
+        self._has_lost = np.zeros(games, dtype=bool)
+        self._has_lost_at = np.zeros(games)
+        self._break_until = np.zeros(games)
+        self._last_move = np.zeros(games)
+        self._last_create = np.zeros(games)
+        self._create_tick = np.zeros(games)
+        self._next_order = np.zeros(games, dtype=np.int64)
+
+    def _reset_games(self, games: np.ndarray) -> None:
+        """Puts the selected games back in their initial state.
+
+        :param games: np.ndarray, boolean mask of the games to reset.
+        """
+        count = int(games.sum())
+        self.package_state[games] = FREE
+        self.player_floor[games] = self._start_floor
+        self._carried[games] = -1
+        self._picked_up_at[games] = 0.0
+        self.lives[games] = 3
+        self.points[games] = 0
+        self.ticks[games] = 0
+        self._stored_deliveries[games] = 0
+        self._minimum_packages[games] = 1
+        self._packages_at_play[games] = 0
+        self._first_package_moved[games] = False
+        self._truck_load[games] = 0
+        self._has_lost[games] = False
+        self._has_lost_at[games] = 0.0
+        self._break_until[games] = 0.0
+        self._last_move[games] = 0.0
+        self._last_create[games] = 0.0
+        self._create_tick[games] = _CREATE_PACKAGE_TICK
+        self._next_order[games] = 0
+
+        speeds = np.empty((count, 3))
+        for index, speed in enumerate(self._speeds):
+            speeds[:, index] = speed
+        if self.difficulty.difficulty == 3:
+            # The hardest difficulty draws its speeds for every game
+            speeds[:, 1:] = self._random.uniform(1, 2, size=(count, 2))
+        preset = [
+            0 if conveyor_id == 0 else (1 if conveyor_id % 2 == 0 else 2)
+            for conveyor_id in self._conveyor_ids
+        ]
+        self.velocity[games] = speeds[:, preset]
+        self._speed[games] = np.rint(self.velocity[games] * (4 * ONE))
+
+    def reset(self, seed: int | None = None) -> dict[str, np.ndarray]:
+        """Starts a new game in every environment.
+
+        :param seed: int | None, new seed of the random conveyor speeds.
+        :return: dict[str, np.ndarray], the observation views.
+        """
+        if seed is not None:
+            self._random = np.random.default_rng(seed)
+        self._reset_games(np.ones(self.num_games, dtype=bool))
+        return self.observation
+
+    def _place(
+        self, games: np.ndarray, slots: np.ndarray, conveyors: np.ndarray
+    ) -> None:
+        """Puts packages at the start of conveyors.
+
+        :param games: np.ndarray, game indices.
+        :param slots: np.ndarray, package slot in each game.
+        :param conveyors: np.ndarray, conveyor index for each package.
+        """
+        self.package_state[games, slots] = ON_CONVEYOR
+        self.package_conveyor[games, slots] = conveyors
+        self.package_x[games, slots] = self._start_x[conveyors]
+        self.package_y[games, slots] = self._start_y[conveyors] - self._package_size[1]
+        self._package_order[games, slots] = self._next_order[games]
+        self._next_order[games] += 1
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+        """Advances every game by one tick.
+
+        :param actions: np.ndarray, shape ``(num_games, 2)``, the action of
+            Mario and Luigi in every game.
+        :return: tuple of the observation views, the points earned during the
+            tick, the games that ended (and were reset) and an info dict with
+            the ``final_points`` and ``final_ticks`` of every game.
+        :raises ValueError: if actions does not have the expected shape.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_games, 2):
+            raise ValueError(f"actions must have shape ({self.num_games}, 2)")
+        points_before = self.points.copy()
+        self.ticks += 1
+        now = self.ticks * _STEP
+
+        # Player input, ignored during breaks, after losing and while carrying
+        accepts_input = (self._break_until < now) & ~self._has_lost
+        for player in range(2):
+            free = accepts_input & (self._carried[:, player] < 0)
+            floor = self.player_floor[:, player]
+            up = free & (actions[:, player] == UP)
+            down = free & (actions[:, player] == DOWN)
+            floor[up] = np.minimum(floor[up] + 1, self._floor_count[player] - 1)
+            floor[down] = np.maximum(floor[down] - 1, 0)
+
+        # Ramps up the number of packages and regenerates lives
+        ramp = self.points % self._increase == 0
+        self._minimum_packages[ramp] = 1 + self.points[ramp] // self._increase
+        if self._eliminates:
+            regenerates = (
+                (self._stored_deliveries >= self._eliminates)
+                & (self._stored_deliveries % self._eliminates == 0)
+                & (self.lives < 3)
+            )
+            self.lives[regenerates] += 1
+            self._stored_deliveries[regenerates] -= self._eliminates
+
+        # Full trucks leave and the players take a break
+        full = self._truck_load >= _TRUCK_CAPACITY
+        if full.any():
+            self._truck_load[full] = 0
+            self._break_until[full] = now[full] + 8
+            self._last_create[full] += 8
+            self.points[full] += 10
+            if self._eliminates:
+                self._stored_deliveries[full & (self._stored_deliveries < 9)] += 1
+
+        lost = (self.lives <= 0) & ~self._has_lost
+        self._has_lost_at[lost] = now[lost]
+        self._has_lost |= lost
+
+        active = (self._break_until < now) & ~self._has_lost
+        self._put_down(active, now)
+        moving = active & (now - self._last_move >= _TICK_SECOND * _MOVE_PACKAGE_TICK)
+        if moving.any():
+            self._last_move[moving] = now[moving]
+            self._move_packages(moving, now)
+        self._spawn(active, now)
+
+        rewards = self.points - points_before
+        dones = self._has_lost & (self._has_lost_at + 1.6 < now)
+        info = {
+            "final_points": np.where(dones, self.points, 0),
+            "final_ticks": np.where(dones, self.ticks, 0),
+        }
+        if dones.any():
+            self._reset_games(dones)
+        return self.observation, rewards, dones, info
+
+    def _put_down(self, active: np.ndarray, now: np.ndarray) -> None:
+        """Puts down the packages carried long enough.
+
+        :param active: np.ndarray, games that are not on a break nor lost.
+        :param now: np.ndarray, game time of every game.
+        """
+        for player in range(2):
+            carried = self._carried[:, player]
+            games = np.flatnonzero(
+                active
+                & (carried >= 0)
+                & (self._picked_up_at[:, player] + _MOVE_PACKAGE_TICK * 3 <= now)
+            )
+            if not games.size:
+                continue
+            slots = carried[games]
+            conveyors = self._floor_conveyor[player, self.player_floor[games, player]]
+            carried[games] = -1
+            targets = self._next_conveyor[conveyors]
+            to_truck = targets == _TO_TRUCK
+
+            truck_games = games[to_truck]
+            self.package_state[truck_games, slots[to_truck]] = FREE
+            self._truck_load[truck_games] += 1
+            self._packages_at_play[truck_games] -= 1
+            self.points[truck_games] += 2
+
+            belt_games = games[~to_truck]
+            self._place(belt_games, slots[~to_truck], targets[~to_truck])
+            self._first_package_moved[belt_games] = True
+            self.points[belt_games] += 1
+
+    def _move_packages(self, moving: np.ndarray, now: np.ndarray) -> None:
+        """Lets players pick packages up, then moves and drops packages.
+
+        :param moving: np.ndarray, games whose packages move on this tick.
+        :param now: np.ndarray, game time of every game.
+        """
+        width, height = self._package_size
+        on_belt = (self.package_state == ON_CONVEYOR) & moving[:, None]
+        conveyor = self.package_conveyor
+        x = self.package_x
+        start = self._conveyor_x[conveyor]
+        end = self._conveyor_end[conveyor]
+        # Where every package lands after its move: the next point of the
+        # fixed-point trajectory of its conveyor, as in fixed_point.next_step
+        sign = self._conveyor_sign[conveyor]
+        speed = self._speed[np.arange(self.num_games)[:, None], conveyor]
+        distance = (x - self._conveyor_origin[conveyor]) * sign
+        moves = -(-(distance + 1) * ONE // speed)
+        moved_x = x + sign * (((moves * speed) >> FRACTION_BITS) - distance)
+
+        # Pickups: the player at the end of a conveyor takes the first
+        # package about to fall, if their hands are free
+        about_to_fall = on_belt & (
+            (x <= start - 1)
+            | (end + 1 <= x + width)
+            | ((sign < 0) & (moved_x + (width // 2) + 1 < start))
+            | ((sign > 0) & (moved_x + (width // 2) + 1 > end))
+        )
+        for index in range(len(self._conveyor_ids)):
+            player = self._finish_player[index]
+            candidates = (
+                about_to_fall
+                & (conveyor == index)
+                & (
+                    (self.player_floor[:, player] == self._finish_floor[index])
+                    & (self._carried[:, player] < 0)
+                )[:, None]
+            )
+            games = np.flatnonzero(candidates.any(axis=1))
+            if not games.size:
+                continue
+            order = np.where(
+                candidates[games], self._package_order[games], np.iinfo(np.int64).max
+            )
+            slots = order.argmin(axis=1)
+            self.package_state[games, slots] = PICKED
+            self.package_x[games, slots] = (
+                self._player_x[player] + (self._player_size[0] - width) // 2
+            )
+            self.package_y[games, slots] = (
+                self._floor_y[player, self._finish_floor[index]]
+                + (self._player_size[1] - height) // 2
+            )
+            self._carried[games, player] = slots
+            self._picked_up_at[games, player] = now[games]
+            on_belt[games, slots] = False
+
+        # Stages change when packages cross the middle of their conveyor
+        stage = self.package_stage
+        next_stage = self._next_stage[conveyor, stage]
+        threshold = self._stage_threshold[conveyor, stage]
+        crosses = np.where(
+            self._stage_leading_edge[conveyor, stage],
+            x + width >= threshold,
+            x <= threshold,
+        )
+        changes = on_belt & (next_stage >= 0) & crosses
+        stage[changes] = next_stage[changes]
+
+        # Conveyors move their packages, those leaving a conveyor fall
+        x[on_belt] = moved_x[on_belt]
+        centre = x + width // 2 + 1
+        falls = on_belt & ~((start <= centre) & (centre <= end))
+        dropped = falls.sum(axis=1)
+        if dropped.any():
+            self.package_state[falls] = FREE
+            self._packages_at_play -= dropped
+            self.lives[:] = np.maximum(self.lives - dropped, 0)
+
+    def _spawn(self, active: np.ndarray, now: np.ndarray) -> None:
+        """Creates packages on the factory conveyor when needed.
+
+        :param active: np.ndarray, games that are not on a break nor lost.
+        :param now: np.ndarray, game time of every game.
+        """
+        create_tick = (_MOVE_PACKAGE_TICK * 100) * (
+            self._belts / (self._minimum_packages + 1)
+        )
+        self._create_tick = np.where(
+            active & self._first_package_moved, create_tick, self._create_tick
+        )
+        spawns = active & (
+            (
+                (self._packages_at_play < self._minimum_packages + 1)
+                & (now - self._last_create >= _TICK_SECOND * self._create_tick)
+            )
+            | (
+                (self._packages_at_play < self._minimum_packages)
+                & self._first_package_moved
+            )
+        )
+        games = np.flatnonzero(spawns)
+        if not games.size:
+            return
+        free = self.package_state[games] == FREE
+        has_slot = free.any(axis=1)
+        games = games[has_slot]
+        slots = free[has_slot].argmax(axis=1)
+        self._last_create[games] = now[games]
+        conveyors = np.full(games.size, self._factory_conveyor)
+        self.package_stage[games, slots] = 0
+        self._place(games, slots, conveyors)
+        self._packages_at_play[games] += 1